@@ -0,0 +1,106 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from telethon import TelegramClient
+from telethon.sessions import StringSession
+import config
+
+logger = logging.getLogger(__name__)
+
+HEALTH_OK = "ok"
+HEALTH_UNAUTHORIZED = "unauthorized"
+HEALTH_ERROR = "error"
+
+
+class AccountHealthChecker:
+    """Periodically validates hosted account sessions in the background.
+
+    Each check records ``health_status``, ``health_checked_at`` and
+    ``health_error`` on the account document, so campaign start-up can trust
+    a recent result instead of performing its own authorization handshake.
+    Revoked sessions are deactivated; connection errors are only recorded.
+    Accounts with a client already connected in ``client_pool`` are checked
+    on that client, so a session is never connected twice at once.
+    """
+
+    def __init__(self, db, cipher_suite, interval: float = 900.0, max_age: float = 1800.0,
+                 concurrency: int = 5, batch_size: int = 200, client_pool=None):
+        self.db = db
+        self.cipher_suite = cipher_suite
+        self.client_pool = client_pool
+        self.interval = interval
+        self.max_age = max_age
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+
+    def is_fresh(self, account) -> bool:
+        """True if the account's last health check is recent enough to trust."""
+        checked_at = account.get("health_checked_at")
+        return bool(checked_at) and datetime.now() - checked_at < timedelta(seconds=self.max_age)
+
+    def is_trusted_healthy(self, account) -> bool:
+        return self.is_fresh(account) and account.get("health_status") == HEALTH_OK
+
+    def is_known_unauthorized(self, account) -> bool:
+        return self.is_fresh(account) and account.get("health_status") == HEALTH_UNAUTHORIZED
+
+    async def check_account(self, account) -> str:
+        """Check authorization on a live or freshly connected client and record the outcome."""
+        client = None
+        status, error = HEALTH_ERROR, None
+        # A campaign's or the pool's live client is reused and left connected
+        live = self.client_pool.connected_client(account.get("user_id"), account["_id"]) if self.client_pool else None
+        try:
+            if live is None:
+                session_str = self.cipher_suite.decrypt(account["session_string"].encode()).decode()
+                client = TelegramClient(StringSession(session_str), config.API_ID, config.API_HASH)
+                await client.connect()
+            if await (live or client).is_user_authorized():
+                status = HEALTH_OK
+            else:
+                status, error = HEALTH_UNAUTHORIZED, "Session is no longer authorized"
+        except Exception as e:
+            error = str(e)
+            logger.error(f"Health check failed for account {account.get('phone_number')}: {e}")
+        finally:
+            if client:
+                try:
+                    await client.disconnect()
+                except Exception:
+                    pass
+        return self._record(account, status, error)
+
+    def _record(self, account, status: str, error) -> str:
+        self.db.update_account_health(account["_id"], status, error)
+        if status == HEALTH_UNAUTHORIZED:
+            self.db.deactivate_account(account["_id"])
+            logger.warning(f"Deactivated invalid session for {account.get('phone_number')}")
+        return status
+
+    async def run_once(self) -> int:
+        """Check every active account whose last result is older than the interval."""
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def guarded(account):
+            async with semaphore:
+                try:
+                    await self.check_account(account)
+                except Exception as e:
+                    logger.error(f"Failed to record health for account {account.get('phone_number')}: {e}")
+
+        checked = 0
+        checked_before = datetime.now() - timedelta(seconds=self.interval)
+        for accounts in self.db.iter_accounts_due_for_health_check(checked_before, self.batch_size):
+            await asyncio.gather(*(guarded(acc) for acc in accounts))
+            checked += len(accounts)
+        if checked:
+            logger.info(f"Health-checked {checked} hosted accounts")
+        return checked
+
+    async def run(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error(f"Account health check pass failed: {e}")
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,73 @@
+import logging
+from typing import Dict, List, Optional
+from telethon.extensions import markdown
+
+logger = logging.getLogger(__name__)
+
+
+class AdPayload:
+    """An ad message parsed once into plain text plus Telethon formatting entities."""
+
+    __slots__ = ("text", "entities", "version")
+
+    def __init__(self, text: str, entities: List, version: int):
+        self.text = text
+        self.entities = entities
+        self.version = version
+
+    @classmethod
+    def parse(cls, message: str, version: int = 0) -> "AdPayload":
+        # Same markdown flavour TelegramClient.send_message applies by default
+        text, entities = markdown.parse(message)
+        return cls(text, entities, version)
+
+
+class AdPayloadHub:
+    """Latest parsed ad payload per user, shared with that user's running campaign.
+
+    Campaigns look the payload up before every send, so an edit published
+    here is picked up by the next send without restarting the campaign.
+    Payloads are held only while in use and discarded when the campaign ends.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._payloads: Dict[int, AdPayload] = {}
+        self._version = 0
+
+    def __len__(self):
+        return len(self._payloads)
+
+    def get(self, user_id: int) -> Optional[AdPayload]:
+        """Return the user's payload, loading and parsing the stored ad on first use."""
+        payload = self._payloads.get(user_id)
+        if payload is None:
+            message = self.db.get_latest_ad_message(user_id)
+            if not message:
+                return None
+            payload = self._store(user_id, message)
+        return payload
+
+    def publish(self, user_id: int, message: str) -> Optional[AdPayload]:
+        """Swap in an edited ad for a user whose payload is in use; others load it on demand."""
+        if user_id not in self._payloads:
+            return None
+        payload = self._store(user_id, message)
+        logger.info(f"Hot-reloaded ad payload v{payload.version} for user {user_id}")
+        return payload
+
+    def discard(self, user_id: int):
+        self._payloads.pop(user_id, None)
+
+    def invalidate(self, user_id: Optional[int] = None):
+        """Drop stale payloads (all when user_id is None); in-use ones reload on the next get."""
+        if user_id is None:
+            self._payloads.clear()
+        else:
+            self._payloads.pop(user_id, None)
+
+    def _store(self, user_id: int, message: str) -> AdPayload:
+        self._version += 1
+        payload = AdPayload.parse(message, self._version)
+        self._payloads[user_id] = payload
+        return payload
@@ -1,6 +1,6 @@
 import asyncio
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime
 from typing import Dict, List, Optional
 import json
 from pyrogram import Client
@@ -19,13 +19,13 @@ class AnalyticsManager:
     async def generate_user_report(self, user_id: int) -> Dict:
         """Generate comprehensive user analytics report asynchronously."""
         try:
-            user = await self.db.get_user(user_id)
+            user = await asyncio.to_thread(self.db.get_user, user_id)
             if not user:
                 logger.error(f"User {user_id} not found for report generation")
                 return {}
             
-            analytics = await self.db.get_user_analytics(user_id)
-            accounts = await self.db.get_user_accounts(user_id)
+            analytics = await asyncio.to_thread(self.db.get_user_analytics, user_id)
+            account_counts = await asyncio.to_thread(self.db.get_account_status_counts, user_id)
             premium_info = await self.db.get_user_premium_info(user_id)
             
             # Calculate success rate
@@ -34,9 +34,6 @@ class AnalyticsManager:
             total_messages = total_sent + total_failed
             success_rate = (total_sent / total_messages * 100) if total_messages > 0 else 0
             
-            # Calculate account performance
-            active_accounts = len([acc for acc in accounts if acc.get('is_active', False)])
-            
             report = {
                 'user_info': {
                     'user_id': user_id,
@@ -60,8 +57,8 @@ class AnalyticsManager:
                     'performance_grade': self.calculate_performance_grade(success_rate, total_sent)
                 },
                 'accounts': {
-                    'total_accounts': len(accounts),
-                    'active_accounts': active_accounts
+                    'total_accounts': account_counts['total'],
+                    'active_accounts': account_counts['active']
                 },
                 'generated_at': datetime.now().isoformat()
             }
@@ -95,7 +92,7 @@ class AnalyticsManager:
         """Generate comprehensive admin dashboard data asynchronously."""
         try:
             # Use existing DB methods; add new ones if needed (e.g., get_total_users via get_admin_stats)
-            admin_stats = await self.db.get_admin_stats()
+            admin_stats = await asyncio.to_thread(self.db.get_admin_stats)
             total_users = admin_stats.get('total_users', 0)
             premium_users = admin_stats.get('premium_users', 0)
             trial_users = admin_stats.get('trial_users', 0)
@@ -132,8 +129,8 @@ class AnalyticsManager:
     async def generate_performance_insights(self, user_id: int) -> List[str]:
         """Generate performance insights and recommendations asynchronously."""
         try:
-            analytics = await self.db.get_user_analytics(user_id)
-            accounts = await self.db.get_user_accounts(user_id)
+            analytics = await asyncio.to_thread(self.db.get_user_analytics, user_id)
+            account_counts = await asyncio.to_thread(self.db.get_account_status_counts, user_id)
             
             insights = []
             total_sent = analytics.get('total_sent', 0)
@@ -147,9 +144,9 @@ class AnalyticsManager:
                 insights.append("Excellent success rate. Your settings are optimized")
             
             # Account insights
-            if len(accounts) == 1:
+            if account_counts['total'] == 1:
                 insights.append("Consider hosting additional accounts for better distribution")
-            elif len(accounts) > 5:
+            elif account_counts['total'] > 5:
                 insights.append("Great account diversity. This improves delivery reliability")
             
             # Volume insights
@@ -234,19 +231,11 @@ class AnalyticsManager:
             return ""
     
     async def schedule_analytics_cleanup(self):
-        """Schedule cleanup of old analytics data using Postgres queries."""
+        """Purge expired broadcast logs through the database retention policies."""
         try:
-            cutoff_date = datetime.now() - timedelta(days=90)
-            async with self.db.pool.acquire() as conn:  # Direct pool access for cleanup
-                await conn.execute("""
-                    DELETE FROM user_analytics 
-                    WHERE date < $1
-                """, cutoff_date.date())
-                await conn.execute("""
-                    DELETE FROM broadcast_logs 
-                    WHERE started_at < $1
-                """, cutoff_date)
-            await self.log_tech("Analytics cleanup completed: Removed data older than 90 days")
+            deleted = await self.db.purge_expired()
+            summary = ", ".join(f"{name}: {count}" for name, count in deleted.items())
+            await self.log_tech(f"Analytics cleanup completed: Removed expired documents ({summary})")
             
         except Exception as e:
             logger.error(f"Analytics cleanup error: {e}")
@@ -0,0 +1,146 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# A step performs one unit of campaign work and returns the seconds until the
+# next step, or None when the campaign is finished.
+Step = Callable[[], Awaitable[Optional[float]]]
+
+
+class ScheduledJob:
+    __slots__ = ("key", "step", "cancelled", "running", "idle", "done")
+
+    def __init__(self, key: Hashable, step: Step):
+        self.key = key
+        self.step = step
+        self.cancelled = False
+        self.running = False
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self.done = asyncio.get_running_loop().create_future()
+
+    def finish(self, error: Optional[BaseException] = None):
+        if self.done.done():
+            return
+        if error is None:
+            self.done.set_result(None)
+        else:
+            self.done.set_exception(error)
+
+
+class BroadcastScheduler:
+    """One timer heap and a bounded worker pool driving every running campaign.
+
+    Campaigns do not sleep in their own tasks: each registers a step function
+    and the scheduler fires it when due, on one of ``workers`` coroutines, so
+    the total number of concurrent sends is fixed regardless of how many
+    campaigns are running.
+    """
+
+    def __init__(self, workers: int = 50):
+        self.workers = workers
+        self._heap: List[Tuple[float, int, ScheduledJob]] = []
+        self._seq = itertools.count()
+        self._jobs: Dict[Hashable, ScheduledJob] = {}
+        self._ready: Optional[asyncio.Queue] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def active(self) -> int:
+        return len(self._jobs)
+
+    @property
+    def timers(self) -> int:
+        return len(self._heap)
+
+    @property
+    def ready(self) -> int:
+        return self._ready.qsize() if self._ready else 0
+
+    def _ensure_started(self):
+        if self._tasks:
+            return
+        self._ready = asyncio.Queue()
+        self._wakeup = asyncio.Event()
+        self._tasks.append(asyncio.create_task(self._dispatch()))
+        self._tasks.extend(asyncio.create_task(self._worker()) for _ in range(self.workers))
+        logger.info(f"Broadcast scheduler started with {self.workers} workers")
+
+    async def run(self, key: Hashable, step: Step, first_delay: float = 0.0):
+        """Schedule a campaign's steps and wait until it finishes.
+
+        Cancelling the waiting task cancels the campaign; any step already
+        executing is allowed to finish first so its client stays usable.
+        """
+        self._ensure_started()
+        if key in self._jobs:
+            raise RuntimeError(f"A campaign is already scheduled for {key}")
+        job = ScheduledJob(key, step)
+        self._jobs[key] = job
+        self._push(job, first_delay)
+        try:
+            await asyncio.shield(job.done)
+        except asyncio.CancelledError:
+            job.cancelled = True
+            await job.idle.wait()
+            raise
+        finally:
+            job.cancelled = True
+            if self._jobs.get(key) is job:
+                del self._jobs[key]
+
+    def _push(self, job: ScheduledJob, delay: float):
+        due = time.monotonic() + max(delay, 0.0)
+        heapq.heappush(self._heap, (due, next(self._seq), job))
+        if self._heap[0][2] is job:
+            self._wakeup.set()
+
+    async def _dispatch(self):
+        while True:
+            now = time.monotonic()
+            while self._heap and self._heap[0][0] <= now:
+                _, _, job = heapq.heappop(self._heap)
+                if not job.cancelled:
+                    self._ready.put_nowait(job)
+            timeout = self._heap[0][0] - now if self._heap else None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _worker(self):
+        while True:
+            job = await self._ready.get()
+            if job.cancelled:
+                continue
+            job.running = True
+            job.idle.clear()
+            try:
+                delay = await job.step()
+            except Exception as e:
+                logger.error(f"Broadcast step failed for {job.key}: {e}")
+                job.finish(e)
+                continue
+            finally:
+                job.running = False
+                job.idle.set()
+            if job.cancelled or delay is None:
+                job.finish()
+            else:
+                self._push(job, delay)
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for job in list(self._jobs.values()):
+            job.cancelled = True
+            job.finish()
@@ -0,0 +1,90 @@
+import logging
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from keyed_executor import COALESCED, REJECTED
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[..., Awaitable]
+
+
+class CallbackData:
+    """Parsed callback_data: ``<namespace>_<action>`` route key plus trailing args."""
+
+    __slots__ = ("raw", "namespace", "action", "args")
+
+    def __init__(self, raw: str, key: str, args: Tuple[str, ...]):
+        self.raw = raw
+        self.namespace, _, self.action = key.partition("_")
+        self.args = args
+
+    @property
+    def key(self) -> str:
+        return f"{self.namespace}_{self.action}" if self.action else self.namespace
+
+
+class CallbackRouter:
+    """Routes callback queries to handlers with dict lookups instead of regex filters.
+
+    Handlers register an exact route key (``menu_main``) or a prefix key whose
+    remaining ``_``-separated tokens become args (``delacc`` handles
+    ``delacc_<id>``). The most specific registered key wins, so lookup cost
+    depends on the number of tokens in the data, not the number of routes.
+
+    With an executor, handlers run serialized per user and identical taps
+    already queued behind a running handler are coalesced, unless the route
+    was registered with ``coalesce=False`` (e.g. keypads where repeats matter).
+    Coalesced taps are answered right away so their button spinner clears;
+    taps rejected because too many are already queued get a short notice.
+    """
+
+    def __init__(self, executor=None):
+        self.executor = executor
+        self._routes: Dict[str, Handler] = {}
+        self._no_coalesce = set()
+
+    def route(self, *keys: str, coalesce: bool = True):
+        """Decorator registering a handler for one or more route keys."""
+        def decorator(func: Handler) -> Handler:
+            for key in keys:
+                if key in self._routes:
+                    raise ValueError(f"Callback route {key!r} is already registered")
+                self._routes[key] = func
+                if not coalesce:
+                    self._no_coalesce.add(key)
+            return func
+        return decorator
+
+    def resolve(self, data: str) -> Tuple[Optional[Handler], Optional[CallbackData]]:
+        handler = self._routes.get(data)
+        if handler:
+            return handler, CallbackData(data, data, ())
+        parts = data.split("_")
+        for i in range(len(parts) - 1, 0, -1):
+            key = "_".join(parts[:i])
+            handler = self._routes.get(key)
+            if handler:
+                return handler, CallbackData(data, key, tuple(parts[i:]))
+        return None, None
+
+    async def dispatch(self, client, cb):
+        """Parse cb.data once, attach it as ``cb.route`` and call the matching handler."""
+        handler, parsed = self.resolve(cb.data or "")
+        if handler is None:
+            logger.warning(f"No callback route for data {cb.data!r}")
+            await cb.answer()
+            return
+        cb.route = parsed
+        if self.executor is None or cb.from_user is None:
+            return await handler(client, cb)
+        token = None if parsed.key in self._no_coalesce else cb.data
+        result = await self.executor.run(cb.from_user.id, handler, client, cb, coalesce_token=token)
+        if result is COALESCED or result is REJECTED:
+            try:
+                if result is REJECTED:
+                    await cb.answer("Still working on your previous taps, please wait a moment ⏳")
+                else:
+                    await cb.answer()
+            except Exception as e:
+                logger.error(f"Failed to answer dropped callback {cb.data!r}: {e}")
+            return None
+        return result
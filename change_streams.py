@@ -0,0 +1,197 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Callable, Dict, Hashable, List, Optional
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+# Server error codes: change streams need a replica set / history no longer in the oplog
+CHANGE_STREAMS_UNSUPPORTED = 40573
+CHANGE_STREAM_HISTORY_LOST = (280, 286)
+# Longest a read blocks on the server, and so how long a stop request can take to be noticed
+STREAM_POLL_MS = 1000
+
+Invalidate = Callable[[Optional[Hashable]], None]
+
+
+class ChangeStreamListener:
+    """Publishes per-user invalidations from one database change stream to registered caches.
+
+    A single ``watch`` cursor covers every listed collection. Subscribers are
+    called with the changed document's ``user_id``, or with None when the
+    affected users are unknown (deletes, drops, a lost resume point) and
+    everything they hold for that collection must go. The resume token is
+    saved every ``token_save_interval`` seconds so a restart continues where
+    the previous run stopped.
+
+    Standalone servers have no change streams; the listener then stays
+    inactive and caches fall back to their short TTL.
+
+    The stream is read and closed on one worker thread. Cancelling ``run``
+    sets a stop flag and waits for that thread to finish, so the cursor is
+    never closed while a read is still in progress.
+    """
+
+    def __init__(self, db, collections: List[str], name: str, token_save_interval: float = 5.0):
+        self.db = db
+        self.collections = list(collections)
+        self.name = name
+        self.token_save_interval = token_save_interval
+        self.active = False
+        self.events = 0
+        self._subscribers: Dict[str, List[Invalidate]] = {}
+
+    def register(self, collection: str, invalidate: Invalidate):
+        if collection not in self.collections:
+            raise ValueError(f"{collection!r} is not watched by this listener")
+        self._subscribers.setdefault(collection, []).append(invalidate)
+
+    def _publish(self, collection: str, key: Optional[Hashable]):
+        for invalidate in self._subscribers.get(collection, ()):
+            try:
+                invalidate(key)
+            except Exception as e:
+                logger.error(f"Cache invalidation failed for {collection}: {e}")
+
+    def _invalidate_all(self):
+        for collection in self._subscribers:
+            self._publish(collection, None)
+
+    def _open(self, resume_token):
+        pipeline = [
+            {"$match": {"ns.coll": {"$in": self.collections}}},
+            # Only the fields needed to route an invalidation; _id (the resume token) is kept
+            {"$project": {"operationType": 1, "ns": 1, "fullDocument.user_id": 1}}
+        ]
+        return self.db.db.watch(
+            pipeline, full_document="updateLookup", resume_after=resume_token, max_await_time_ms=STREAM_POLL_MS
+        )
+
+    async def run(self):
+        if not hasattr(type(self.db.db), "watch"):
+            # In-process stand-ins such as mongomock
+            logger.warning("MongoDB client does not support change streams; caches use their fallback TTL")
+            return
+        retry_delay = 1
+        while True:
+            try:
+                await self._consume()
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                self._deactivate()
+                if e.code == CHANGE_STREAMS_UNSUPPORTED:
+                    logger.warning("MongoDB deployment has no change streams; caches use their fallback TTL")
+                    return
+                if e.code in CHANGE_STREAM_HISTORY_LOST:
+                    logger.warning(f"Change stream resume point lost, restarting from now: {e}")
+                    await asyncio.to_thread(self.db.save_resume_token, self.name, None)
+                    continue
+                logger.error(f"Change stream failed: {e}")
+            except Exception as e:
+                self._deactivate()
+                logger.error(f"Change stream failed: {e}")
+            await asyncio.sleep(retry_delay)
+            retry_delay = min(retry_delay * 2, 60)
+
+    def _deactivate(self):
+        if self.active:
+            self.active = False
+            # Events may be missed until the stream is back; nothing cached can be trusted
+            self._invalidate_all()
+
+    async def _consume(self):
+        token = await asyncio.to_thread(self.db.get_resume_token, self.name)
+        stream = await asyncio.to_thread(self._open, token)
+        self.active = True
+        if token is None:
+            # Changes made before this point were never seen
+            self._invalidate_all()
+        logger.info(f"Change stream listening on {', '.join(self.collections)}")
+        stop = threading.Event()
+        worker = asyncio.ensure_future(asyncio.to_thread(self._pump, stream, token, stop, asyncio.get_running_loop()))
+        try:
+            await asyncio.shield(worker)
+        except asyncio.CancelledError:
+            stop.set()
+            await asyncio.wait({worker})
+            raise
+
+    def _pump(self, stream, saved_token, stop: threading.Event, loop):
+        """Read changes on a worker thread until stop is set; the stream is closed on this thread."""
+        saved_at = time.monotonic()
+        try:
+            while not stop.is_set():
+                change = stream.try_next()
+                if change is not None:
+                    # Subscribers are not thread-safe; deliver on the event loop
+                    loop.call_soon_threadsafe(self._deliver, change)
+                if time.monotonic() - saved_at >= self.token_save_interval:
+                    saved_token = self._save_token(stream, saved_token)
+                    saved_at = time.monotonic()
+        finally:
+            try:
+                self._save_token(stream, saved_token)
+            finally:
+                stream.close()
+
+    def _save_token(self, stream, saved_token):
+        current = stream.resume_token
+        if current is not None and current != saved_token:
+            self.db.save_resume_token(self.name, current)
+            return current
+        return saved_token
+
+    def _deliver(self, change):
+        self.events += 1
+        collection = change.get("ns", {}).get("coll")
+        key = (change.get("fullDocument") or {}).get("user_id")
+        self._publish(collection, key)
+
+
+class InvalidatingCache:
+    """Per-user values loaded on demand and dropped when the listener reports a change.
+
+    Entries live for ``ttl`` seconds while the change stream is active and for
+    ``fallback_ttl`` seconds otherwise, bounding staleness across instances
+    either way.
+    """
+
+    def __init__(self, listener: Optional[ChangeStreamListener], collection: str,
+                 ttl: float, fallback_ttl: float, max_entries: int = 10000):
+        self.listener = listener
+        self.ttl = ttl
+        self.fallback_ttl = fallback_ttl
+        self.max_entries = max_entries
+        self._entries: Dict[Hashable, tuple] = {}
+        self.hits = 0
+        self.misses = 0
+        if listener is not None:
+            listener.register(collection, self.invalidate)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key: Hashable, loader: Callable):
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None and entry[1] > now:
+            self.hits += 1
+            return entry[0]
+        self.misses += 1
+        value = loader(key)
+        streaming = self.listener is not None and self.listener.active
+        self._entries.pop(key, None)
+        if len(self._entries) >= self.max_entries:
+            # Oldest insertion first
+            self._entries.pop(next(iter(self._entries)))
+        self._entries[key] = (value, now + (self.ttl if streaming else self.fallback_ttl))
+        return value
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
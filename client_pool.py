@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Optional, Tuple
+from telethon import TelegramClient
+import config
+from entity_session import MongoEntitySession
+from records import POOL_ACCOUNT_FIELDS
+
+logger = logging.getLogger(__name__)
+
+
+class HostedClientPool:
+    """Connected Telethon clients for hosted accounts, shared by short-lived tasks.
+
+    Running campaigns lend their already-connected clients via ``register``;
+    otherwise the pool connects one of the user's active accounts on demand
+    and keeps it until it has been idle for ``idle_timeout`` seconds.
+    """
+
+    def __init__(self, db, cipher_suite, idle_timeout: float = 600.0):
+        self.db = db
+        self.cipher_suite = cipher_suite
+        self.idle_timeout = idle_timeout
+        self._borrowed: Dict[int, Dict[str, TelegramClient]] = {}
+        # user_id -> (client, last_used, account_id)
+        self._owned: Dict[int, Tuple[TelegramClient, float, str]] = {}
+        self._locks: Dict[int, asyncio.Lock] = {}
+
+    def register(self, user_id: int, account_id, client: TelegramClient):
+        """Lend a campaign's connected client to the pool."""
+        self._borrowed.setdefault(user_id, {})[str(account_id)] = client
+
+    def unregister(self, user_id: int, account_id):
+        clients = self._borrowed.get(user_id)
+        if clients:
+            clients.pop(str(account_id), None)
+            if not clients:
+                del self._borrowed[user_id]
+
+    def connected_client(self, user_id: int, account_id) -> Optional[TelegramClient]:
+        """The live client already connected for an account, lent or pool-owned, if any."""
+        client = self._borrowed.get(user_id, {}).get(str(account_id))
+        if client is None:
+            owned = self._owned.get(user_id)
+            if owned and owned[2] == str(account_id):
+                client = owned[0]
+        return client if client is not None and client.is_connected() else None
+
+    async def acquire(self, user_id: int) -> Optional[TelegramClient]:
+        """Return a connected, authorized client for one of the user's accounts."""
+        for client in self._borrowed.get(user_id, {}).values():
+            if client.is_connected():
+                return client
+
+        lock = self._locks.setdefault(user_id, asyncio.Lock())
+        async with lock:
+            owned = self._owned.get(user_id)
+            if owned and owned[0].is_connected():
+                self._owned[user_id] = (owned[0], time.monotonic(), owned[2])
+                return owned[0]
+            if owned:
+                del self._owned[user_id]
+
+            for acc in self.db.get_user_accounts(user_id, POOL_ACCOUNT_FIELDS):
+                if not acc.get("is_active", False):
+                    continue
+                client = None
+                try:
+                    session_str = self.cipher_suite.decrypt(acc["session_string"].encode()).decode()
+                    client = TelegramClient(MongoEntitySession(session_str, self.db, acc["_id"]), config.API_ID, config.API_HASH)
+                    await client.connect()
+                    if not await client.is_user_authorized():
+                        logger.warning(f"Pooled account {acc['phone_number']} is not authorized")
+                        await client.disconnect()
+                        continue
+                    self._owned[user_id] = (client, time.monotonic(), str(acc["_id"]))
+                    logger.info(f"Pooled client connected for user {user_id} using {acc['phone_number']}")
+                    return client
+                except Exception as e:
+                    logger.error(f"Failed to connect pooled client {acc.get('phone_number')} for {user_id}: {e}")
+                    if client:
+                        try:
+                            await client.disconnect()
+                        except Exception:
+                            pass
+            return None
+
+    async def close_idle(self):
+        """Disconnect pool-owned clients that have not been used recently."""
+        now = time.monotonic()
+        for user_id, (client, last_used, _) in list(self._owned.items()):
+            if now - last_used < self.idle_timeout:
+                continue
+            self._owned.pop(user_id, None)
+            self._locks.pop(user_id, None)
+            try:
+                await client.disconnect()
+                logger.info(f"Disconnected idle pooled client for user {user_id}")
+            except Exception as e:
+                logger.error(f"Failed to disconnect pooled client for {user_id}: {e}")
+
+    async def close_all(self):
+        """Disconnect every pool-owned client concurrently."""
+        owned, self._owned = self._owned, {}
+        results = await asyncio.gather(*(client.disconnect() for client, _, _ in owned.values()), return_exceptions=True)
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"Failed to disconnect pooled client: {result}")
+
+    async def run_reaper(self, interval: float = 60.0):
+        while True:
+            await asyncio.sleep(interval)
+            await self.close_idle()
@@ -13,6 +13,8 @@ LOGGER_BOT_USERNAME = "ToxicVPSBot"
 ADMIN_ID = 8233966309
 ADMIN_USERNAME = "szxns"
 ADMIN_IDS = [8233966309]
+ADMIN_USERS_PAGE_SIZE = 10  # users per page in the /admin user browser
+ADMIN_BROADCAST_BATCH_SIZE = 500  # users loaded per query during /bd
 
 # Image URLs
 START_IMAGE = "https://i.ibb.co/mVRtxk9g/x.jpg"
@@ -50,6 +52,34 @@ MONGO_URI = os.getenv(
 )
 DB_NAME = "adsbot_db"
 
+# Read Routing
+# Reporting reads use a separate pool and may be served by a secondary; URI defaults to MONGO_URI
+ANALYTICS_MONGO_URI = os.getenv("ANALYTICS_MONGO_URI", MONGO_URI)
+ANALYTICS_POOL_SIZE = 10
+SECONDARY_MAX_STALENESS = 120  # seconds; MongoDB requires at least 90
+# EnhancedDatabaseManager read method -> "primary", "secondary" or "analytics";
+# unlisted methods (state, conversation and campaign reads) stay on the primary
+READ_ROUTES = {
+    "get_admin_stats": "analytics",
+    "get_user_analytics": "analytics",
+    "get_account_status_counts": "analytics",
+    "count_users": "analytics",
+    "get_users_page": "analytics",
+    "search_users": "analytics",
+    "iter_users": "secondary",
+}
+
+# MongoDB Query Profiler
+ENABLE_QUERY_PROFILER = True
+MONGO_SLOW_QUERY_MS = 100
+QUERY_PROFILER_TOP_N = 10
+QUERY_EXPLAIN_INTERVAL = 600  # seconds between explain passes over the heaviest query shapes
+
+# On-demand Sampling Profiler (/profile)
+PROFILER_SAMPLE_INTERVAL = 0.005
+PROFILER_DEFAULT_SECONDS = 30
+PROFILER_MAX_SECONDS = 120
+
 # Guide Text
 GUIDE_TEXT = """
 > *Quatum Bot Guide*
@@ -81,8 +111,12 @@ GUIDE_TEXT = """
 DEFAULT_DELAY = 30
 MIN_DELAY = 10
 MAX_DELAY = 3600
-MAX_BROADCASTS_PER_DAY = 50
-MAX_GROUPS_PER_BROADCAST = 20
+# The daily unit is a cycle, not a send: at most 50 * 20 group sends per user a day.
+# Short delays use the cycles up early and the campaign then waits for the window to free up.
+MAX_BROADCASTS_PER_DAY = 50  # broadcast cycles per user in any rolling 24 hours
+MAX_GROUPS_PER_BROADCAST = 20  # group sends per cycle across the user's accounts; the next cycle continues from there
+QUOTA_SYNC_INTERVAL = 30  # seconds between writing quota usage to MongoDB and reloading it
+QUOTA_USAGE_RETENTION_DAYS = 2
 
 # OTP Settings
 OTP_LENGTH = 5
@@ -92,6 +126,22 @@ OTP_EXPIRY = 300
 LOG_LEVEL = "INFO"
 LOG_FILE = "logs/luxxad_bot.log"
 
+# Metrics Endpoint (Prometheus text format, bind locally)
+ENABLE_METRICS = True
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9108
+# /livez, /readyz and /status are served on the same port
+LIVENESS_MAX_HEARTBEAT_AGE = 10  # seconds without a loop heartbeat before /livez fails
+READINESS_PING_TIMEOUT = 2  # seconds allowed for the MongoDB ping in /readyz
+
+# Event Loop Watchdog
+ENABLE_LOOP_MONITOR = True
+LOOP_MONITOR_INTERVAL = 0.5
+LOOP_LAG_THRESHOLD = 0.5  # seconds; also used as asyncio slow_callback_duration
+LOOP_STALL_REPORT_COOLDOWN = 300  # seconds between stall reports to the tech log channel
+# asyncio debug mode adds per-callback overhead; enable only while diagnosing stalls
+ENABLE_SLOW_CALLBACK_DEBUG = os.getenv("ENABLE_SLOW_CALLBACK_DEBUG", "0") == "1"
+
 # Feature Toggles
 ENABLE_FORCE_JOIN = False
 ENABLE_OTP_VERIFICATION = True
@@ -124,5 +174,48 @@ ERROR_MESSAGES = {
 AUTO_REPLY_DEFAULT_MESSAGE = "Thank you for your message! Our team will get back to you soon."
 AUTO_REPLY_MAX_LENGTH = 200
 
+# Hosted Account Client Pool & Group Link Resolution
+CLIENT_POOL_IDLE_TIMEOUT = 600  # seconds before an unused pooled client is disconnected
+GROUP_RESOLVE_CACHE_TTL = 86400
+GROUP_RESOLVE_CACHE_SIZE = 5000  # resolved links kept, least recently used evicted first
+GROUP_RESOLVE_CONCURRENCY = 4
+GROUP_RESOLVE_MIN_INTERVAL = 0.3  # seconds between resolution requests
+GROUP_LINKS_PER_MESSAGE = 200
+
+# Bot Concurrency
+BOT_WORKERS = 32  # Pyrogram update workers; handlers are serialized per user
+HANDLER_MAX_PENDING_PER_USER = 5  # queued updates per user beyond the running one; more are rejected
+
+BROADCAST_WORKERS = 50  # concurrent sends across all running campaigns
+
+# Bot UI
+UI_RENDER_CACHE_SIZE = 512  # rendered captions memoized per (template, inputs)
+
+# Hosted Account Health Checks
+ACCOUNT_HEALTH_CHECK_INTERVAL = 900  # seconds between background session checks
+ACCOUNT_HEALTH_MAX_AGE = 1800  # campaigns trust a healthy result this recent
+ACCOUNT_HEALTH_CONCURRENCY = 5
+
+# Data Retention
+TEMP_LOGIN_DATA_TTL = 86400  # seconds; abandoned login scratch data in temp_data
+LOGGER_FAILURE_RETENTION_DAYS = 30
+BROADCAST_ACTIVITY_RETENTION_DAYS = 90
+BROADCAST_LOG_RETENTION_DAYS = 90
+RETENTION_PURGE_INTERVAL = 3600
+RETENTION_BATCH_SIZE = 500
+RETENTION_BATCH_PAUSE = 0.5  # seconds between purge batches
+
+# Multi-instance Cache Invalidation (MongoDB change streams; needs a replica set)
+ENABLE_CHANGE_STREAMS = True
+INSTANCE_ID = os.getenv("INSTANCE_ID", "default")  # resume token key; unique per running instance
+CHANGE_STREAM_COLLECTIONS = ["users", "broadcast_states", "ad_messages", "ad_delays", "logger_status", "accounts"]
+CHANGE_STREAM_TOKEN_SAVE_INTERVAL = 5  # seconds between resume token saves
+CACHE_TTL = 600  # seconds an entry lives while change streams are delivering invalidations
+CACHE_FALLBACK_TTL = 5  # seconds an entry lives without change streams
+CACHE_MAX_ENTRIES = 10000
+
+# Shutdown
+SHUTDOWN_TIMEOUT = 25  # seconds for the whole drain; keep below the deploy's kill grace period
+
 # Session Storage
 SESSION_STORAGE_PATH = "sessions/"
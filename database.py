@@ -1,11 +1,16 @@
+import asyncio
 import logging
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import pymongo
+from pymongo import UpdateOne
 from pymongo.errors import ConnectionFailure, OperationFailure
+from pymongo.read_preferences import SecondaryPreferred
 import config
 from bson.objectid import ObjectId
 import time
 import json
+import re
+from mongo_profiler import query_profiler
 
 # Logging setup - INFO only, no DEBUG spam for clean logs
 logging.basicConfig(
@@ -18,10 +23,53 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+
+def utc_now():
+    """Aware UTC time for fields read by TTL indexes, which compare against UTC."""
+    return datetime.now(timezone.utc)
+
+
+class RetentionPolicy:
+    """How long documents in a collection are kept, measured on a date field.
+
+    TTL policies are enforced by a MongoDB TTL index, so their field must be
+    written with ``utc_now()``; the others are purged by ``purge_expired`` in
+    small, paced batches.
+    """
+
+    __slots__ = ("collection", "field", "max_age", "ttl", "filter")
+
+    def __init__(self, collection, field, max_age, ttl=False, filter=None):
+        self.collection = collection
+        self.field = field
+        self.max_age = max_age
+        self.ttl = ttl
+        self.filter = filter or {}
+
+
+RETENTION_POLICIES = [
+    # Only login scratch data expires; admin keys in temp_data are kept
+    RetentionPolicy("temp_data", "updated_at", config.TEMP_LOGIN_DATA_TTL, ttl=True, filter={"key": "session"}),
+    RetentionPolicy("logger_failures", "timestamp", config.LOGGER_FAILURE_RETENTION_DAYS * 86400, ttl=True),
+    RetentionPolicy("broadcast_activity", "timestamp", config.BROADCAST_ACTIVITY_RETENTION_DAYS * 86400, ttl=True),
+    RetentionPolicy("quota_usage", "hour_start", config.QUOTA_USAGE_RETENTION_DAYS * 86400, ttl=True),
+    # Running broadcasts are still updated in place, so they are never purged
+    RetentionPolicy("broadcast_logs", "created_at", config.BROADCAST_LOG_RETENTION_DAYS * 86400,
+                    filter={"status": {"$ne": "running"}}),
+]
+
+
 class EnhancedDatabaseManager:
-    def __init__(self):
+    def __init__(self, connect=True):
         self.client = None
         self.db = None
+        self.analytics_client = None
+        self._route_dbs = {}
+        if connect:
+            self.connect()
+
+    def connect(self):
+        """Connect, ensure indexes and log a summary; blocking, so startup runs it in a thread."""
         self._init_db()
         self._load_persistent_globals()
 
@@ -31,9 +79,11 @@ class EnhancedDatabaseManager:
         retry_delay = 1
         for attempt in range(max_retries):
             try:
-                self.client = pymongo.MongoClient(config.MONGO_URI, serverSelectionTimeoutMS=5000)
+                listeners = [query_profiler] if config.ENABLE_QUERY_PROFILER else []
+                self.client = pymongo.MongoClient(config.MONGO_URI, serverSelectionTimeoutMS=5000, event_listeners=listeners)
                 self.client.admin.command('ping')
                 self.db = self.client[config.DB_NAME]
+                self._init_read_routes(listeners)
                 logger.info("MongoDB initialized successfully")
 
                 # Helper function to ensure index with specific options
@@ -71,7 +121,16 @@ class EnhancedDatabaseManager:
                 ensure_index(self.db.broadcast_activity, "user_id")
                 ensure_index(self.db.temp_data, [("user_id", pymongo.ASCENDING), ("key", pymongo.ASCENDING)], unique=True)
                 ensure_index(self.db.logger_status, "user_id", unique=True)
-                ensure_index(self.db.logger_failures, "user_id")
+                ensure_index(self.db.logger_failures, [("user_id", pymongo.ASCENDING), ("timestamp", pymongo.ASCENDING)])
+                ensure_index(self.db.logger_failure_stats, "user_id", unique=True)
+                ensure_index(self.db.accounts, [("is_active", pymongo.ASCENDING), ("health_checked_at", pymongo.ASCENDING)])
+                ensure_index(self.db.entity_cache, [("account_id", pymongo.ASCENDING), ("id", pymongo.ASCENDING)], unique=True)
+                ensure_index(self.db.broadcast_logs, "created_at")
+                ensure_index(self.db.users, "username_lc")
+                ensure_index(self.db.quota_usage, [("user_id", pymongo.ASCENDING), ("hour", pymongo.ASCENDING)], unique=True)
+                self._backfill_username_lc()
+                self._backfill_logger_failure_summaries()
+                self.ensure_retention_indexes()
                 return
             except ConnectionFailure as e:
                 logger.error(f"MongoDB connection attempt {attempt + 1}/{max_retries} failed: {e}")
@@ -88,21 +147,51 @@ class EnhancedDatabaseManager:
                 logger.error(f"Unexpected error during MongoDB init: {e}")
                 raise
 
+    def _init_read_routes(self, listeners):
+        """Build the database handle for each read route named in config.READ_ROUTES.
+
+        "primary" reads see every write; "secondary" reads may lag by up to
+        SECONDARY_MAX_STALENESS seconds; "analytics" reads additionally use
+        their own connection pool so reporting cannot starve the write path.
+        """
+        staleness = config.SECONDARY_MAX_STALENESS
+        self.analytics_client = pymongo.MongoClient(
+            config.ANALYTICS_MONGO_URI,
+            serverSelectionTimeoutMS=5000,
+            maxPoolSize=config.ANALYTICS_POOL_SIZE,
+            readPreference="secondaryPreferred",
+            maxStalenessSeconds=staleness,
+            event_listeners=listeners
+        )
+        self._route_dbs = {
+            "primary": self.db,
+            "secondary": self.db.with_options(read_preference=SecondaryPreferred(max_staleness=staleness)),
+            "analytics": self.analytics_client[config.DB_NAME]
+        }
+
+    def ping(self):
+        """Return True if the primary answers a ping; False before connect or on failure."""
+        if self.client is None:
+            return False
+        try:
+            self.client.admin.command('ping')
+            return True
+        except Exception as e:
+            logger.error(f"MongoDB ping failed: {e}")
+            return False
+
+    def _reads(self, method):
+        """Database handle for a read method's configured route (primary by default)."""
+        return self._route_dbs.get(config.READ_ROUTES.get(method, "primary"), self.db)
+
     def _load_persistent_globals(self):
-        """Load persistent user data like ad messages, delays, broadcast states from DB."""
-        try:
-            ad_msgs = self.db.ad_messages.find({}, {"user_id": 1, "message": 1})
-            for doc in ad_msgs:
-                logger.info(f"Loaded ad msg for {doc['user_id']}")
-            delays = self.db.ad_delays.find({}, {"user_id": 1, "delay": 1})
-            for doc in delays:
-                logger.info(f"Loaded delay {doc['delay']}s for {doc['user_id']}")
-            states = self.db.broadcast_states.find({}, {"user_id": 1, "paused": 1, "running": 1})
-            for doc in states:
-                logger.info(f"Loaded broadcast state for {doc['user_id']}: running={doc.get('running', False)}")
-            logger_statuses = self.db.logger_status.find({}, {"user_id": 1, "is_active": 1})
-            for doc in logger_statuses:
-                logger.info(f"Loaded logger status for {doc['user_id']}: is_active={doc.get('is_active', False)}")
+        """Log how much persistent user data exists; values are read on demand, not preloaded."""
+        try:
+            counts = {
+                name: self.db[name].estimated_document_count()
+                for name in ("ad_messages", "ad_delays", "broadcast_states", "logger_status")
+            }
+            logger.info("Persistent data: " + ", ".join(f"{name}={count}" for name, count in counts.items()))
         except Exception as e:
             logger.error(f"Failed to load persistent globals: {e}")
 
@@ -114,6 +203,7 @@ class EnhancedDatabaseManager:
                 {
                     "$set": {
                         "username": username or "Unknown",
+                        "username_lc": (username or "").lower(),
                         "first_name": first_name or "User",
                         "last_interaction": datetime.now()
                     },
@@ -172,14 +262,33 @@ class EnhancedDatabaseManager:
             logger.error(f"Failed to set vouch sent for {user_id}: {e}")
             raise
 
-    def get_user_accounts(self, user_id):
-        """Fetch all accounts for a user."""
+    def get_user_accounts(self, user_id, projection=None):
+        """Fetch all accounts for a user, optionally limited to the projected fields."""
         try:
-            return list(self.db.accounts.find({"user_id": user_id}))
+            return list(self.db.accounts.find({"user_id": user_id}, projection))
         except Exception as e:
             logger.error(f"Failed to get accounts for {user_id}: {e}")
             return []
 
+    def get_account_status_counts(self, user_id):
+        """Count a user's accounts by active state with a single aggregation."""
+        reads = self._reads("get_account_status_counts")
+        try:
+            result = list(reads.accounts.aggregate([
+                {"$match": {"user_id": user_id}},
+                {"$group": {
+                    "_id": None,
+                    "total": {"$sum": 1},
+                    "active": {"$sum": {"$cond": [{"$eq": ["$is_active", True]}, 1, 0]}}
+                }}
+            ]))
+            total = result[0]["total"] if result else 0
+            active = result[0]["active"] if result else 0
+            return {"total": total, "active": active, "inactive": total - active}
+        except Exception as e:
+            logger.error(f"Failed to count account statuses for {user_id}: {e}")
+            return {"total": 0, "active": 0, "inactive": 0}
+
     def get_user_accounts_count(self, user_id):
         """Count user's accounts."""
         try:
@@ -224,13 +333,36 @@ class EnhancedDatabaseManager:
             logger.error(f"Failed to deactivate account {account_id}: {e}")
             raise
 
-    def get_user_ad_messages(self, user_id):
-        """Fetch user's ad messages."""
+    def iter_accounts_due_for_health_check(self, checked_before, batch_size=200):
+        """Iterate, in batches, active accounts not health-checked since checked_before."""
+        query = {
+            "is_active": True,
+            "$or": [
+                {"health_checked_at": {"$lt": checked_before}},
+                {"health_checked_at": {"$exists": False}}
+            ]
+        }
+        return self.iter_accounts(query, {"session_string": 1, "phone_number": 1, "user_id": 1}, batch_size)
+
+    def update_account_health(self, account_id, status, error=None):
+        """Record the outcome of a background session health check."""
         try:
-            return list(self.db.ad_messages.find({"user_id": user_id}, sort=[("created_at", -1)]))
+            self.db.accounts.update_one(
+                {"_id": ObjectId(account_id)},
+                {"$set": {"health_status": status, "health_error": error, "health_checked_at": datetime.now()}}
+            )
         except Exception as e:
-            logger.error(f"Failed to get ad messages for {user_id}: {e}")
-            return []
+            logger.error(f"Failed to update health for account {account_id}: {e}")
+            raise
+
+    def get_latest_ad_message(self, user_id):
+        """Fetch the text of the user's most recent ad message, or None."""
+        try:
+            doc = self.db.ad_messages.find_one({"user_id": user_id}, {"message": 1}, sort=[("created_at", -1)])
+            return doc.get("message") if doc else None
+        except Exception as e:
+            logger.error(f"Failed to get latest ad message for {user_id}: {e}")
+            return None
 
     def add_user_ad_message(self, user_id, message, created_at):
         """Add an ad message for a user."""
@@ -281,7 +413,7 @@ class EnhancedDatabaseManager:
         try:
             self.db.broadcast_states.update_one(
                 {"user_id": user_id},
-                {"$set": {"running": running, "paused": paused, "updated_at": datetime.now()}},
+                {"$set": {"running": running, "paused": paused, "interrupted": False, "updated_at": datetime.now()}},
                 upsert=True
             )
             logger.info(f"Broadcast state updated for {user_id}: running={running}, paused={paused}")
@@ -289,6 +421,31 @@ class EnhancedDatabaseManager:
             logger.error(f"Failed to set broadcast state for {user_id}: {e}")
             raise
 
+    def save_broadcast_progress(self, user_id, progress):
+        """Record a campaign stopped by shutdown so the next start can resume it."""
+        try:
+            self.db.broadcast_states.update_one(
+                {"user_id": user_id},
+                {"$set": {
+                    "running": False,
+                    "interrupted": True,
+                    "progress": progress,
+                    "updated_at": datetime.now()
+                }},
+                upsert=True
+            )
+            logger.info(f"Broadcast progress saved for {user_id}: {progress}")
+        except Exception as e:
+            logger.error(f"Failed to save broadcast progress for {user_id}: {e}")
+
+    def get_interrupted_broadcasts(self):
+        """Fetch campaigns that were running when the bot last shut down."""
+        try:
+            return list(self.db.broadcast_states.find({"interrupted": True}, {"user_id": 1, "progress": 1}))
+        except Exception as e:
+            logger.error(f"Failed to get interrupted broadcasts: {e}")
+            return []
+
     def increment_broadcast_cycle(self, user_id):
         """Increment the broadcast cycle count for a user."""
         try:
@@ -305,10 +462,10 @@ class EnhancedDatabaseManager:
             logger.error(f"Failed to increment broadcast cycle for {user_id}: {e}")
             raise
 
-    def get_target_groups(self, user_id):
-        """Fetch user's target groups."""
+    def get_target_groups(self, user_id, projection=None):
+        """Fetch user's target groups, optionally limited to the projected fields."""
         try:
-            return list(self.db.target_groups.find({"user_id": user_id}))
+            return list(self.db.target_groups.find({"user_id": user_id}, projection))
         except Exception as e:
             logger.error(f"Failed to get target groups for {user_id}: {e}")
             return []
@@ -332,10 +489,30 @@ class EnhancedDatabaseManager:
             logger.error(f"Failed to add target group for {user_id}: {e}")
             raise
 
+    def add_target_groups(self, user_id, groups):
+        """Add many (group_id, group_name) target groups for a user in one round-trip."""
+        try:
+            now = datetime.now()
+            operations = [
+                UpdateOne(
+                    {"user_id": user_id, "group_id": group_id},
+                    {"$set": {"group_name": group_name, "updated_at": now}, "$setOnInsert": {"created_at": now}},
+                    upsert=True
+                )
+                for group_id, group_name in groups
+            ]
+            if operations:
+                self.db.target_groups.bulk_write(operations, ordered=False)
+            logger.info(f"{len(operations)} target groups added for user {user_id}")
+        except Exception as e:
+            logger.error(f"Failed to add target groups for {user_id}: {e}")
+            raise
+
     def get_user_analytics(self, user_id):
         """Fetch analytics for a user."""
+        reads = self._reads("get_user_analytics")
         try:
-            stats = self.db.analytics.find_one({"user_id": user_id})
+            stats = reads.analytics.find_one({"user_id": user_id})
             return stats if stats else {
                 "total_broadcasts": 0,
                 "total_sent": 0,
@@ -449,35 +626,122 @@ class EnhancedDatabaseManager:
                 "user_id": user_id,
                 "sent_count": sent_count,
                 "failed_count": failed_count,
-                "timestamp": datetime.now()
+                "timestamp": utc_now()
             })
             logger.info(f"Broadcast activity logged for user {user_id}")
         except Exception as e:
             logger.error(f"Failed to log broadcast activity for {user_id}: {e}")
             raise
 
-    def get_all_users(self, page=0, limit=100):
-        """Fetch all users with pagination."""
+    def _iter_keyset(self, collection, query=None, projection=None, batch_size=500):
+        """Yield lists of documents matching query in _id order, one indexed range query per batch."""
+        query = dict(query or {})
+        last_id = None
+        while True:
+            if last_id is not None:
+                query["_id"] = {"$gt": last_id}
+            try:
+                batch = list(collection.find(query, projection).sort("_id", pymongo.ASCENDING).limit(batch_size))
+            except Exception as e:
+                logger.error(f"Failed to iterate {collection.name}: {e}")
+                return
+            if not batch:
+                return
+            yield batch
+            if len(batch) < batch_size:
+                return
+            last_id = batch[-1]["_id"]
+
+    def iter_users(self, projection=None, batch_size=500):
+        """Iterate every user in batches without skip-based paging."""
+        reads = self._reads("iter_users")
+        return self._iter_keyset(reads.users, None, projection, batch_size)
+
+    def iter_accounts(self, query=None, projection=None, batch_size=500):
+        """Iterate accounts matching query in batches."""
+        return self._iter_keyset(self.db.accounts, query, projection, batch_size)
+
+    def count_users(self, exact=False):
+        """Count users; the default estimate reads collection metadata instead of scanning."""
+        reads = self._reads("count_users")
         try:
-            skip = page * limit
-            return list(self.db.users.find({}).skip(skip).limit(limit))
+            if exact:
+                return reads.users.count_documents({})
+            return reads.users.estimated_document_count()
         except Exception as e:
-            logger.error(f"Failed to get all users: {e}")
+            logger.error(f"Failed to count users: {e}")
+            return 0
+
+    def get_users_page(self, after_id=None, before_id=None, limit=10, projection=None):
+        """Fetch one page of users next to a cursor.
+
+        Returns (users, has_more) where users are in _id order and has_more tells
+        whether another page exists in the direction travelled (before_id pages
+        backwards).
+        """
+        reads = self._reads("get_users_page")
+        try:
+            if before_id is not None:
+                cursor = reads.users.find({"_id": {"$lt": before_id}}, projection).sort("_id", pymongo.DESCENDING)
+            else:
+                query = {"_id": {"$gt": after_id}} if after_id is not None else {}
+                cursor = reads.users.find(query, projection).sort("_id", pymongo.ASCENDING)
+            users = list(cursor.limit(limit + 1))
+            has_more = len(users) > limit
+            users = users[:limit]
+            if before_id is not None:
+                users.reverse()
+            return users, has_more
+        except Exception as e:
+            logger.error(f"Failed to get users page: {e}")
+            return [], False
+
+    def search_users(self, term, limit=10, projection=None):
+        """Find users by exact numeric ID or case-insensitive username prefix."""
+        reads = self._reads("search_users")
+        term = term.strip().lstrip("@")
+        if not term:
+            return []
+        try:
+            if term.isdigit():
+                return list(reads.users.find({"user_id": int(term)}, projection).limit(limit))
+            # An anchored prefix regex on the lowercased copy can use the username_lc index
+            query = {"username_lc": {"$regex": f"^{re.escape(term.lower())}"}}
+            return list(reads.users.find(query, projection).sort("username_lc", pymongo.ASCENDING).limit(limit))
+        except Exception as e:
+            logger.error(f"Failed to search users for {term!r}: {e}")
             return []
 
+    def _backfill_username_lc(self):
+        """Add username_lc to users created before username search existed."""
+        updated = 0
+        for batch in self._iter_keyset(self.db.users, {"username_lc": {"$exists": False}}, {"username": 1}):
+            requests = [
+                UpdateOne({"_id": doc["_id"]}, {"$set": {"username_lc": (doc.get("username") or "").lower()}})
+                for doc in batch
+            ]
+            try:
+                updated += self.db.users.bulk_write(requests, ordered=False).modified_count
+            except Exception as e:
+                logger.error(f"Failed to backfill username_lc: {e}")
+                return
+        if updated:
+            logger.info(f"Backfilled username_lc for {updated} users")
+
     def get_admin_stats(self):
         """Fetch admin statistics."""
+        reads = self._reads("get_admin_stats")
         try:
-            total_users = self.db.users.count_documents({})
-            total_accounts = self.db.accounts.count_documents({})
+            total_users = reads.users.count_documents({})
+            total_accounts = reads.accounts.count_documents({})
             forwards_pipeline = [{"$group": {"_id": None, "total": {"$sum": "$total_sent"}}}]
-            forwards_doc = list(self.db.analytics.aggregate(forwards_pipeline))
+            forwards_doc = list(reads.analytics.aggregate(forwards_pipeline))
             total_forwards = forwards_doc[0]["total"] if forwards_doc else 0
-            logger_stats = self.db.logger_status.count_documents({"is_active": True})
-            vouch_stats = self.db.analytics.aggregate([
+            logger_stats = reads.logger_status.count_documents({"is_active": True})
+            vouch_stats = list(reads.analytics.aggregate([
                 {"$group": {"_id": None, "vouch_successes": {"$sum": "$vouch_successes"}, "vouch_failures": {"$sum": "$vouch_failures"}}}
-            ])
-            vouch_data = list(vouch_stats)[0] if list(vouch_stats) else {"vouch_successes": 0, "vouch_failures": 0}
+            ]))
+            vouch_data = vouch_stats[0] if vouch_stats else {"vouch_successes": 0, "vouch_failures": 0}
             return {
                 "total_users": total_users,
                 "total_forwards": total_forwards,
@@ -516,7 +780,7 @@ class EnhancedDatabaseManager:
         try:
             self.db.temp_data.update_one(
                 {"user_id": user_id, "key": "session"},
-                {"$set": {"value": data, "updated_at": datetime.now()}},
+                {"$set": {"value": data, "updated_at": utc_now()}},
                 upsert=True
             )
             logger.info(f"Set temp data for user {user_id}")
@@ -577,30 +841,244 @@ class EnhancedDatabaseManager:
             logger.error(f"Failed to get logger status for {user_id}: {e}")
             return False
 
+    @staticmethod
+    def _failure_class(error):
+        """Name the kind of failure: the exception type, or the 'Name:' prefix of a message."""
+        if isinstance(error, BaseException):
+            name = type(error).__name__
+        else:
+            prefix, sep, _ = str(error).partition(":")
+            name = prefix if sep and prefix.isidentifier() else "Other"
+        # Used as a field name inside by_class
+        return name.replace(".", "_").lstrip("$") or "Other"
+
     def log_logger_failure(self, user_id, error):
-        """Log a failure when sending a DM via logger bot."""
+        """Log a failure when sending a DM via logger bot and fold it into the user's summary."""
         try:
+            now = utc_now()
+            error_class = self._failure_class(error)
+            self.db.logger_failure_stats.update_one(
+                {"user_id": user_id},
+                {
+                    "$inc": {"count": 1, f"by_class.{error_class}": 1},
+                    "$set": {"last_error": str(error), "last_at": now}
+                },
+                upsert=True
+            )
+            # Raw documents only back the summary backfill and expire via TTL
             self.db.logger_failures.insert_one({
                 "user_id": user_id,
                 "error": str(error),
-                "timestamp": datetime.now()
+                "error_class": error_class,
+                "timestamp": now
             })
             logger.info(f"Logged logger failure for user {user_id}: {error}")
         except Exception as e:
             logger.error(f"Failed to log logger failure for {user_id}: {e}")
             raise
 
-    def get_logger_failures(self, user_id):
-        """Fetch logger failure stats for a user."""
+    def get_logger_failure_summary(self, user_id):
+        """Fetch a user's failure summary: count, last_error, last_at and by_class counts."""
+        try:
+            summary = self.db.logger_failure_stats.find_one({"user_id": user_id}, {"_id": 0})
+        except Exception as e:
+            logger.error(f"Failed to get logger failure summary for {user_id}: {e}")
+            summary = None
+        # Users without a summary have no failures; summaries for older raw failures are built at startup
+        return summary or {"user_id": user_id, "count": 0, "last_error": None, "last_at": None, "by_class": {}}
+
+    def _backfill_logger_failure_summaries(self):
+        """Build summaries once for users whose retained raw failures predate the summary collection."""
+        try:
+            missing = set(self.db.logger_failures.distinct("user_id"))
+            if missing:
+                missing -= set(self.db.logger_failure_stats.distinct("user_id"))
+            for user_id in missing:
+                summary = self._build_logger_failure_summary(user_id)
+                # $setOnInsert keeps any summary a concurrent log_logger_failure created meanwhile
+                self.db.logger_failure_stats.update_one({"user_id": user_id}, {"$setOnInsert": summary}, upsert=True)
+            if missing:
+                logger.info(f"Backfilled logger failure summaries for {len(missing)} users")
+        except Exception as e:
+            logger.error(f"Failed to backfill logger failure summaries: {e}")
+
+    def _build_logger_failure_summary(self, user_id):
+        """Compute a user's failure summary from the retained raw failures."""
+        groups = list(self.db.logger_failures.aggregate([
+            {"$match": {"user_id": user_id}},
+            {"$sort": {"timestamp": pymongo.DESCENDING}},
+            {"$group": {
+                # Failures logged before error_class existed are grouped by message and classed below
+                "_id": {
+                    "error_class": "$error_class",
+                    "legacy_error": {"$cond": [{"$ifNull": ["$error_class", False]}, None, "$error"]}
+                },
+                "count": {"$sum": 1},
+                "last_error": {"$first": "$error"},
+                "last_at": {"$first": "$timestamp"}
+            }}
+        ]))
+        latest = max(groups, key=lambda g: g["last_at"], default=None)
+        summary = {
+            "count": sum(g["count"] for g in groups),
+            "last_error": latest["last_error"] if latest else None,
+            "last_at": latest["last_at"] if latest else None,
+            "by_class": {}
+        }
+        for g in groups:
+            error_class = g["_id"].get("error_class") or self._failure_class(g["_id"].get("legacy_error"))
+            summary["by_class"][error_class] = summary["by_class"].get(error_class, 0) + g["count"]
+        return summary
+
+    def get_resume_token(self, name):
+        """Fetch the persisted change stream resume token for a listener, or None."""
+        try:
+            doc = self.db.change_stream_tokens.find_one({"_id": name}, {"token": 1})
+            return doc.get("token") if doc else None
+        except Exception as e:
+            logger.error(f"Failed to get resume token for {name}: {e}")
+            return None
+
+    def save_resume_token(self, name, token):
+        """Persist a listener's change stream resume token; None forgets it."""
+        try:
+            self.db.change_stream_tokens.update_one(
+                {"_id": name},
+                {"$set": {"token": token, "updated_at": datetime.now()}},
+                upsert=True
+            )
+        except Exception as e:
+            logger.error(f"Failed to save resume token for {name}: {e}")
+
+    def get_quota_usage(self, user_id, since_hour):
+        """Broadcast cycles per hour number for a user since since_hour."""
         try:
-            return list(self.db.logger_failures.find({"user_id": user_id}))
+            return self.get_quota_usage_bulk([user_id], since_hour).get(user_id, {})
         except Exception as e:
-            logger.error(f"Failed to get logger failures for {user_id}: {e}")
+            logger.error(f"Failed to get quota usage for {user_id}: {e}")
+            return {}
+
+    def get_quota_usage_bulk(self, user_ids, since_hour):
+        """Broadcast cycles per hour number since since_hour, keyed by user ID."""
+        usage = {}
+        for doc in self.db.quota_usage.find(
+            {"user_id": {"$in": list(user_ids)}, "hour": {"$gte": since_hour}},
+            {"_id": 0, "user_id": 1, "hour": 1, "cycles": 1}
+        ):
+            usage.setdefault(doc["user_id"], {})[doc["hour"]] = doc.get("cycles", 0)
+        return usage
+
+    def add_quota_usage(self, increments):
+        """Atomically add (user_id, hour, cycles) increments to the shared hourly counters."""
+        operations = [
+            UpdateOne(
+                {"user_id": user_id, "hour": hour},
+                {"$inc": {"cycles": cycles}, "$setOnInsert": {"hour_start": datetime.fromtimestamp(hour * 3600, timezone.utc)}},
+                upsert=True
+            )
+            for user_id, hour, cycles in increments
+        ]
+        if operations:
+            self.db.quota_usage.bulk_write(operations, ordered=False)
+
+    def get_cached_entities(self, account_id):
+        """Fetch persisted Telethon entity rows for a hosted account."""
+        try:
+            return list(self.db.entity_cache.find(
+                {"account_id": account_id},
+                {"_id": 0, "id": 1, "hash": 1, "username": 1, "phone": 1, "name": 1}
+            ))
+        except Exception as e:
+            logger.error(f"Failed to get cached entities for account {account_id}: {e}")
             return []
 
+    def save_cached_entities(self, account_id, rows):
+        """Upsert Telethon entity rows (id, hash, username, phone, name) for a hosted account."""
+        try:
+            now = datetime.now()
+            operations = [
+                UpdateOne(
+                    {"account_id": account_id, "id": entity_id},
+                    {"$set": {"hash": entity_hash, "username": username, "phone": phone, "name": name, "updated_at": now}},
+                    upsert=True
+                )
+                for entity_id, entity_hash, username, phone, name in rows
+            ]
+            if operations:
+                self.db.entity_cache.bulk_write(operations, ordered=False)
+                logger.info(f"Cached {len(operations)} entities for account {account_id}")
+        except Exception as e:
+            logger.error(f"Failed to cache entities for account {account_id}: {e}")
+            raise
+
+    def ensure_retention_indexes(self):
+        """Create or update the TTL index of every TTL retention policy."""
+        for policy in RETENTION_POLICIES:
+            if not policy.ttl:
+                continue
+            collection = self.db[policy.collection]
+            index_name = f"{policy.field}_ttl"
+            try:
+                existing = collection.index_information().get(index_name)
+                if existing and existing.get("expireAfterSeconds") != policy.max_age:
+                    self.db.command("collMod", policy.collection, index={"name": index_name, "expireAfterSeconds": policy.max_age})
+                    logger.info(f"Updated TTL index {index_name} on {policy.collection} to {policy.max_age}s")
+                elif not existing:
+                    options = {"partialFilterExpression": policy.filter} if policy.filter else {}
+                    collection.create_index(policy.field, name=index_name, expireAfterSeconds=policy.max_age, **options)
+                    logger.info(f"Created TTL index {index_name} on {policy.collection}")
+            except OperationFailure as e:
+                logger.error(f"Failed to ensure TTL index {index_name} on {policy.collection}: {e}")
+
+    def purge_expired_batch(self, policy, batch_size):
+        """Delete up to batch_size expired documents for a policy; returns the number deleted."""
+        cutoff = datetime.now() - timedelta(seconds=policy.max_age)
+        collection = self.db[policy.collection]
+        query = {**policy.filter, policy.field: {"$lt": cutoff}}
+        try:
+            ids = [doc["_id"] for doc in collection.find(query, {"_id": 1}).limit(batch_size)]
+            if not ids:
+                return 0
+            return collection.delete_many({"_id": {"$in": ids}}).deleted_count
+        except Exception as e:
+            logger.error(f"Failed to purge expired documents from {policy.collection}: {e}")
+            return 0
+
+    async def purge_expired(self, batch_size=None, pause=None):
+        """Purge every non-TTL retention policy in paced batches off the event loop."""
+        batch_size = batch_size or config.RETENTION_BATCH_SIZE
+        pause = config.RETENTION_BATCH_PAUSE if pause is None else pause
+        totals = {}
+        for policy in RETENTION_POLICIES:
+            if policy.ttl:
+                continue
+            total = 0
+            while True:
+                deleted = await asyncio.to_thread(self.purge_expired_batch, policy, batch_size)
+                total += deleted
+                if deleted < batch_size:
+                    break
+                await asyncio.sleep(pause)
+            totals[policy.collection] = total
+            if total:
+                logger.info(f"Purged {total} expired documents from {policy.collection}")
+        return totals
+
+    async def run_retention(self, interval=None):
+        """Periodically purge collections that are not covered by a TTL index."""
+        interval = interval or config.RETENTION_PURGE_INTERVAL
+        while True:
+            try:
+                await self.purge_expired()
+            except Exception as e:
+                logger.error(f"Retention pass failed: {e}")
+            await asyncio.sleep(interval)
+
     def close(self):
-        """Close MongoDB connection."""
+        """Close MongoDB connections."""
         try:
+            if self.analytics_client:
+                self.analytics_client.close()
             if self.client:
                 self.client.close()
                 logger.info("MongoDB connection closed")
@@ -0,0 +1,62 @@
+import logging
+from telethon.sessions import StringSession
+
+logger = logging.getLogger(__name__)
+
+
+class MongoEntitySession(StringSession):
+    """StringSession whose entity cache is persisted per hosted account in MongoDB.
+
+    Auth key and DC still come from the encrypted session string; entities
+    (id, access_hash, username, phone, name) are loaded lazily from the
+    ``entity_cache`` collection on first lookup and only new or changed rows
+    are written back, so after a restart sends to known peers need no
+    resolution calls.
+    """
+
+    def __init__(self, string, db, account_id):
+        super().__init__(string)
+        self._db = db
+        self._account_id = str(account_id)
+        self._loaded = False
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        rows = self._db.get_cached_entities(self._account_id)
+        self._entities |= {
+            (row["id"], row["hash"], row.get("username"), row.get("phone"), row.get("name"))
+            for row in rows
+        }
+        logger.info(f"Loaded {len(rows)} cached entities for account {self._account_id}")
+
+    def process_entities(self, tlo):
+        self._ensure_loaded()
+        rows = set(self._entities_to_rows(tlo))
+        new_rows = rows - self._entities
+        if not new_rows:
+            return
+        # Drop stale rows for the same peers (e.g. a changed username) before adding
+        changed_ids = {row[0] for row in new_rows}
+        self._entities = {row for row in self._entities if row[0] not in changed_ids} | new_rows
+        try:
+            self._db.save_cached_entities(self._account_id, new_rows)
+        except Exception as e:
+            logger.error(f"Failed to persist entities for account {self._account_id}: {e}")
+
+    def get_entity_rows_by_phone(self, phone):
+        self._ensure_loaded()
+        return super().get_entity_rows_by_phone(phone)
+
+    def get_entity_rows_by_username(self, username):
+        self._ensure_loaded()
+        return super().get_entity_rows_by_username(username)
+
+    def get_entity_rows_by_name(self, name):
+        self._ensure_loaded()
+        return super().get_entity_rows_by_name(name)
+
+    def get_entity_rows_by_id(self, id, exact=True):
+        self._ensure_loaded()
+        return super().get_entity_rows_by_id(id, exact)
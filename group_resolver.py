@@ -0,0 +1,144 @@
+import asyncio
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+from telethon import utils as telethon_utils
+from telethon.errors import FloodWaitError
+
+logger = logging.getLogger(__name__)
+
+GROUP_LINK_PATTERN = re.compile(r"(?:https?://)?(?:t|telegram)\.me/[\w+\-/]+", re.IGNORECASE)
+
+
+def extract_group_links(text: str) -> List[str]:
+    """Return the distinct t.me links in a message, preserving order."""
+    seen = set()
+    links = []
+    for link in GROUP_LINK_PATTERN.findall(text or ""):
+        key = normalize_link(link)
+        if key not in seen:
+            seen.add(key)
+            links.append(link)
+    return links
+
+
+def normalize_link(link: str) -> str:
+    """Canonical cache key: scheme and trailing slash removed, public usernames lower-cased."""
+    key = re.sub(r"^(?:https?://)?(?:t|telegram)\.me/", "", link.strip(), flags=re.IGNORECASE).rstrip("/")
+    # Invite hashes are case-sensitive; usernames are not
+    if key.startswith("+") or key.lower().startswith("joinchat/"):
+        return key
+    return key.lower()
+
+
+class ResolvedGroup:
+    __slots__ = ("link", "chat_id", "title", "error")
+
+    def __init__(self, link: str, chat_id: Optional[int] = None, title: Optional[str] = None, error: Optional[str] = None):
+        self.link = link
+        self.chat_id = chat_id
+        self.title = title
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+class GroupResolver:
+    """Resolves group links through a user's pooled hosted account with caching and rate limiting.
+
+    The cache is an LRU of at most ``max_entries`` links; expired entries at
+    the old end are pruned whenever a new one is stored.
+    """
+
+    def __init__(self, pool, cache_ttl: float = 86400.0, concurrency: int = 4,
+                 min_interval: float = 0.3, max_flood_wait: int = 30, max_entries: int = 5000):
+        self.pool = pool
+        self.cache_ttl = cache_ttl
+        self.concurrency = concurrency
+        self.min_interval = min_interval
+        self.max_flood_wait = max_flood_wait
+        self.max_entries = max_entries
+        self._cache: "OrderedDict[str, Tuple[float, int, str]]" = OrderedDict()
+
+    def _cached(self, key: str) -> Optional[Tuple[int, str]]:
+        entry = self._cache.get(key)
+        if not entry:
+            return None
+        expires, chat_id, title = entry
+        if expires < time.monotonic():
+            self._cache.pop(key, None)
+            return None
+        self._cache.move_to_end(key)
+        return chat_id, title
+
+    def _store(self, key: str, chat_id: int, title: str):
+        now = time.monotonic()
+        self._cache[key] = (now + self.cache_ttl, chat_id, title)
+        self._cache.move_to_end(key)
+        while self._cache:
+            oldest_key, (expires, _, _) = next(iter(self._cache.items()))
+            if expires >= now and len(self._cache) <= self.max_entries:
+                break
+            del self._cache[oldest_key]
+
+    async def resolve_many(self, user_id: int, links: List[str]) -> List[ResolvedGroup]:
+        """Resolve links concurrently; cached links cost no API calls."""
+        results: List[Optional[ResolvedGroup]] = [None] * len(links)
+        pending = []
+        for i, link in enumerate(links):
+            cached = self._cached(normalize_link(link))
+            if cached:
+                results[i] = ResolvedGroup(link, *cached)
+            else:
+                pending.append(i)
+
+        if pending:
+            client = await self.pool.acquire(user_id)
+            if client is None:
+                for i in pending:
+                    results[i] = ResolvedGroup(links[i], error="No active hosted account to resolve with")
+                return results
+
+            semaphore = asyncio.Semaphore(self.concurrency)
+            pace_lock = asyncio.Lock()
+            last_start = [0.0]
+
+            async def pace():
+                async with pace_lock:
+                    wait = last_start[0] + self.min_interval - time.monotonic()
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                    last_start[0] = time.monotonic()
+
+            async def worker(i):
+                async with semaphore:
+                    await pace()
+                    results[i] = await self._resolve_one(client, links[i])
+
+            await asyncio.gather(*(worker(i) for i in pending))
+        return results
+
+    async def _resolve_one(self, client, link: str) -> ResolvedGroup:
+        for attempt in range(2):
+            try:
+                entity = await client.get_entity(link.strip())
+                title = getattr(entity, "title", None)
+                if title is None:
+                    return ResolvedGroup(link, error="Link does not point to a group or channel")
+                chat_id = telethon_utils.get_peer_id(entity)
+                self._store(normalize_link(link), chat_id, title)
+                return ResolvedGroup(link, chat_id, title)
+            except FloodWaitError as e:
+                if attempt == 0 and e.seconds <= self.max_flood_wait:
+                    logger.warning(f"Flood wait resolving {link}: waiting {e.seconds}s")
+                    await asyncio.sleep(e.seconds)
+                    continue
+                return ResolvedGroup(link, error=f"Flood wait {e.seconds}s")
+            except Exception as e:
+                logger.error(f"Failed to resolve group link {link}: {e}")
+                return ResolvedGroup(link, error=str(e))
+        return ResolvedGroup(link, error="Resolution failed")
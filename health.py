@@ -0,0 +1,67 @@
+import asyncio
+import json
+import logging
+import time
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def _json(status: int, document: dict):
+    return status, "application/json", json.dumps(document, default=str) + "\n"
+
+
+class HealthEndpoints:
+    """Liveness, readiness and status routes served by the metrics HTTP server.
+
+    ``/livez`` only checks that the event loop keeps running its heartbeat;
+    ``/readyz`` checks MongoDB and every bot client and fails during
+    shutdown so orchestrators stop routing to a draining instance;
+    ``/status`` is a JSON snapshot of campaigns and queue depths.
+    """
+
+    def __init__(self, db, clients: Dict[str, object], loop_monitor=None,
+                 max_heartbeat_age: float = 10.0, ping_timeout: float = 2.0,
+                 is_stopping: Callable[[], bool] = lambda: False,
+                 status_fields: Optional[Dict[str, Callable[[], object]]] = None):
+        self.db = db
+        self.clients = clients
+        self.loop_monitor = loop_monitor
+        self.max_heartbeat_age = max_heartbeat_age
+        self.ping_timeout = ping_timeout
+        self.is_stopping = is_stopping
+        self.status_fields = dict(status_fields or {})
+        self.started = time.monotonic()
+
+    def register(self, server):
+        server.add_route("/livez", self.livez)
+        server.add_route("/readyz", self.readyz)
+        server.add_route("/status", self.status)
+
+    def livez(self):
+        age = self.loop_monitor.seconds_since_heartbeat() if self.loop_monitor else 0.0
+        if age > self.max_heartbeat_age:
+            return 503, "text/plain", f"event loop heartbeat is {age:.1f}s old\n"
+        return 200, "text/plain", "ok\n"
+
+    async def readyz(self):
+        checks = {}
+        try:
+            checks["mongo"] = await asyncio.wait_for(asyncio.to_thread(self.db.ping), self.ping_timeout)
+        except asyncio.TimeoutError:
+            checks["mongo"] = False
+        for name, client in self.clients.items():
+            checks[name] = bool(getattr(client, "is_connected", False))
+        checks["accepting_work"] = not self.is_stopping()
+        ready = all(checks.values())
+        return _json(200 if ready else 503, {"ready": ready, "checks": checks})
+
+    def status(self):
+        document = {"uptime_seconds": round(time.monotonic() - self.started, 1)}
+        for name, field in self.status_fields.items():
+            try:
+                document[name] = field()
+            except Exception as e:
+                logger.error(f"Status field {name} failed: {e}")
+                document[name] = None
+        return _json(200, document)
@@ -0,0 +1,106 @@
+import asyncio
+import contextvars
+import functools
+import logging
+from typing import Any, Callable, Dict, Hashable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Set while a serialized handler runs, so handlers calling each other directly run inline
+_inside_serialized = contextvars.ContextVar("inside_serialized", default=False)
+
+# Returned by KeyedExecutor.run for a dropped duplicate, so callers can still acknowledge it
+COALESCED = object()
+# Returned by KeyedExecutor.run when the key already has max_pending calls waiting
+REJECTED = object()
+
+
+def create_detached_task(coro) -> asyncio.Task:
+    """Start a task that outlives the current handler and does not inherit its serialization.
+
+    Tasks copy the caller's context; without this, a long-running task started
+    by a serialized handler would run every serialized call it makes inline.
+    """
+    context = contextvars.copy_context()
+    context.run(_inside_serialized.set, False)
+    return asyncio.create_task(coro, context=context)
+
+
+class KeyedExecutor:
+    """Runs at most one coroutine at a time per key; different keys run in parallel.
+
+    Calls for a busy key wait in FIFO order. A call carrying a coalesce token
+    that matches one already waiting for the same key is dropped and returns
+    ``COALESCED``, so rapid duplicate taps collapse into a single queued run.
+
+    Every waiting call occupies the caller's update worker, so at most
+    ``max_pending`` calls may wait per key; further calls return ``REJECTED``
+    at once, and one user can never hold more than ``max_pending + 1`` workers.
+    """
+
+    def __init__(self, max_pending: int = 5):
+        self.max_pending = max_pending
+        self._locks: Dict[Hashable, asyncio.Lock] = {}
+        self._users: Dict[Hashable, int] = {}
+        self._queued_tokens: Dict[Hashable, Set[Hashable]] = {}
+        self.coalesced = 0
+        self.rejected = 0
+
+    @property
+    def pending(self) -> int:
+        """Calls currently waiting behind another call for the same key."""
+        return sum(count - 1 for count in self._users.values() if count > 1)
+
+    async def run(self, key: Hashable, func: Callable, *args, coalesce_token: Optional[Hashable] = None) -> Any:
+        if self._users.get(key, 0) > self.max_pending:
+            self.rejected += 1
+            logger.warning(f"Rejected call for {key}: {self.max_pending} calls already waiting")
+            return REJECTED
+        if coalesce_token is not None:
+            tokens = self._queued_tokens.setdefault(key, set())
+            if coalesce_token in tokens:
+                self.coalesced += 1
+                logger.info(f"Coalesced duplicate {coalesce_token!r} for {key}")
+                return COALESCED
+            tokens.add(coalesce_token)
+
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._users[key] = self._users.get(key, 0) + 1
+        try:
+            async with lock:
+                if coalesce_token is not None:
+                    self._queued_tokens[key].discard(coalesce_token)
+                token = _inside_serialized.set(True)
+                try:
+                    return await func(*args)
+                finally:
+                    _inside_serialized.reset(token)
+        finally:
+            if coalesce_token is not None and key in self._queued_tokens:
+                self._queued_tokens[key].discard(coalesce_token)
+            self._users[key] -= 1
+            if not self._users[key]:
+                del self._users[key]
+                self._locks.pop(key, None)
+                self._queued_tokens.pop(key, None)
+
+    def serialized(self, key_func: Callable[..., Optional[Hashable]],
+                   coalesce_func: Optional[Callable[..., Optional[Hashable]]] = None):
+        """Decorator serializing a handler per ``key_func(*args)``.
+
+        Calls made from inside another serialized handler run inline, and a
+        key of None disables serialization for that call.
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            async def wrapper(*args):
+                key = key_func(*args)
+                if key is None or _inside_serialized.get():
+                    return await func(*args)
+                token = coalesce_func(*args) if coalesce_func else None
+                result = await self.run(key, func, *args, coalesce_token=token)
+                return None if result is COALESCED or result is REJECTED else result
+            return wrapper
+        return decorator
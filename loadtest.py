@@ -0,0 +1,435 @@
+"""Load-test driver for the QUANTUM bot handlers.
+
+Replays scripted user journeys (start -> dashboard -> set message -> set delay ->
+start/stop broadcast -> analytics) against the real handler functions in
+``main.py`` using fake Telegram transports and a local MongoDB stand-in, then
+reports throughput, per-step latency percentiles and event-loop lag.
+
+Usage:
+    python loadtest.py --users 2000 --iterations 2
+    python loadtest.py --users 500 --mongomock
+    python loadtest.py --mongomock --check-rotation
+"""
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+import config
+
+logger = logging.getLogger("loadtest")
+
+USER_ID_BASE = 9_000_000_000
+
+
+class FakeTransport:
+    """Simulated Telegram round-trip used by every fake API call."""
+
+    def __init__(self, rtt_ms: float = 40.0, jitter_ms: float = 20.0):
+        self.rtt = rtt_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.calls = 0
+
+    async def roundtrip(self):
+        self.calls += 1
+        await asyncio.sleep(max(0.0, self.rtt + random.uniform(-self.jitter, self.jitter)))
+
+
+class FakeMessage:
+    """Stand-in for a pyrogram Message owned by a virtual user."""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, transport, from_user, text=None):
+        self._transport = transport
+        self.id = next(self._ids)
+        self.from_user = from_user
+        self.chat = SimpleNamespace(id=from_user.id)
+        self.text = text
+        self.caption = None
+        self.media = None
+        self.reply_to_message = None
+        self.forward_from = self.forward_from_chat = None
+        self.forward_sender_name = self.forward_from_message_id = None
+
+    async def _respond(self, *args, **kwargs):
+        await self._transport.roundtrip()
+        return FakeMessage(self._transport, self.from_user)
+
+    reply = reply_photo = reply_document = _respond
+    edit = edit_text = edit_caption = edit_media = _respond
+
+    async def delete(self, *args, **kwargs):
+        await self._transport.roundtrip()
+        return True
+
+
+class FakeCallbackQuery:
+    """Stand-in for a pyrogram CallbackQuery pressed by a virtual user."""
+
+    def __init__(self, transport, from_user, message, data):
+        self._transport = transport
+        self.id = str(random.getrandbits(63))
+        self.from_user = from_user
+        self.message = message
+        self.data = data
+
+    async def answer(self, *args, **kwargs):
+        await self._transport.roundtrip()
+        return True
+
+
+class FakeBotClient:
+    """Stand-in for the pyrogram bot clients (main bot and logger bot)."""
+
+    def __init__(self, transport):
+        self._transport = transport
+        self.is_connected = True
+
+    async def _call(self, *args, **kwargs):
+        await self._transport.roundtrip()
+        return SimpleNamespace(id=random.getrandbits(31))
+
+    send_message = send_photo = send_document = resolve_peer = get_chat_member = _call
+    forward_messages = _call
+
+
+class FakeSession:
+    """Minimal Telethon session replacement."""
+
+    def __init__(self, string=None):
+        self._string = string or "fake-session"
+
+    def save(self):
+        return self._string
+
+
+class FakeTelegramClient:
+    """Stand-in for a Telethon TelegramClient of a hosted account."""
+
+    transport = None
+    groups_per_account = 5
+
+    def __init__(self, session=None, api_id=None, api_hash=None, **kwargs):
+        self.session = session if isinstance(session, FakeSession) else FakeSession()
+        self._connected = False
+
+    async def connect(self):
+        await self.transport.roundtrip()
+        self._connected = True
+
+    async def start(self, *args, **kwargs):
+        await self.connect()
+        return self
+
+    async def disconnect(self):
+        self._connected = False
+
+    def is_connected(self):
+        return self._connected
+
+    async def is_user_authorized(self):
+        await self.transport.roundtrip()
+        return True
+
+    async def get_me(self):
+        await self.transport.roundtrip()
+        import main
+        return SimpleNamespace(id=random.getrandbits(31), about=main.DESIRED_BIO, last_name=main.NAME_SUFFIX)
+
+    async def __call__(self, request):
+        await self.transport.roundtrip()
+
+    async def send_code_request(self, phone):
+        await self.transport.roundtrip()
+        return SimpleNamespace(phone_code_hash="fakehash")
+
+    async def sign_in(self, *args, **kwargs):
+        await self.transport.roundtrip()
+        return SimpleNamespace(id=random.getrandbits(31))
+
+    async def get_entity(self, link):
+        await self.transport.roundtrip()
+        return SimpleNamespace(id=-100 * random.getrandbits(24), title=str(link))
+
+    async def iter_dialogs(self, *args, **kwargs):
+        await self.transport.roundtrip()
+        for i in range(self.groups_per_account):
+            yield SimpleNamespace(id=-1000 - i, name=f"Group {i}", is_group=True)
+
+    async def get_dialogs(self, *args, **kwargs):
+        return [dialog async for dialog in self.iter_dialogs()]
+
+    async def send_message(self, *args, **kwargs):
+        await self.transport.roundtrip()
+        return SimpleNamespace(id=random.getrandbits(31))
+
+
+class LagProbe:
+    """Samples event-loop scheduling lag while the test runs."""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.samples = []
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - start - self.interval))
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+
+def percentile(values, pct):
+    """Return the pct-th percentile of values (nearest-rank)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+class LoadTest:
+    """Drives many virtual users through scripted journeys concurrently."""
+
+    def __init__(self, main_module, args):
+        self.main = main_module
+        self.args = args
+        self.transport = FakeTransport(args.rtt_ms, args.jitter_ms)
+        self.bot = FakeBotClient(self.transport)
+        self.latencies = {}
+        self.errors = {}
+        self.completed_journeys = 0
+
+    def patch_transports(self):
+        """Swap every network-facing object in main for a fake one."""
+        FakeTelegramClient.transport = self.transport
+        FakeTelegramClient.groups_per_account = self.args.groups
+        self.main.TelegramClient = FakeTelegramClient
+        self.main.StringSession = FakeSession
+        self.main.MongoEntitySession = lambda string, db, account_id: FakeSession(string)
+        import client_pool
+        client_pool.TelegramClient = FakeTelegramClient
+        client_pool.MongoEntitySession = self.main.MongoEntitySession
+        import login_manager
+        login_manager.TelegramClient = FakeTelegramClient
+        login_manager.StringSession = FakeSession
+        import account_health
+        account_health.TelegramClient = FakeTelegramClient
+        account_health.StringSession = FakeSession
+        self.main.pyro = self.bot
+        self.main.logger_client = FakeBotClient(self.transport)
+
+    def seed_user(self, uid):
+        """Create the documents a journey expects to already exist."""
+        db = self.main.db
+        db.create_user(uid, f"load{uid}", "Load")
+        db.set_logger_status(uid, is_active=True)
+        if db.get_user_accounts_count(uid) == 0:
+            session_encrypted = self.main.cipher_suite.encrypt(b"fake-session").decode()
+            db.add_user_account(uid, f"+1555{uid % 10_000_000:07d}", session_encrypted)
+
+    async def step(self, name, coro):
+        start = time.perf_counter()
+        try:
+            await coro
+        except Exception as e:
+            self.errors[name] = self.errors.get(name, 0) + 1
+            logger.debug(f"Step {name} failed: {e}")
+        finally:
+            self.latencies.setdefault(name, []).append(time.perf_counter() - start)
+
+    async def think(self):
+        if self.args.think > 0:
+            await asyncio.sleep(random.uniform(0, self.args.think))
+
+    async def journey(self, uid):
+        m = self.main
+        user = SimpleNamespace(id=uid, username=f"load{uid}", first_name="Load")
+        panel = FakeMessage(self.transport, user)
+
+        def tap(data):
+            return FakeCallbackQuery(self.transport, user, panel, data)
+
+        def say(text):
+            return FakeMessage(self.transport, user, text=text)
+
+        await self.step("start", m.start(self.bot, say("/start")))
+        await self.think()
+        await self.step("menu_main", m.dispatch_callback(self.bot, tap("menu_main")))
+        await self.think()
+        await self.step("set_msg", m.dispatch_callback(self.bot, tap("set_msg")))
+        await self.step("handle_text_message", m.handle_text_message(self.bot, say(f"Load test ad #{uid}")))
+        await self.think()
+        await self.step("set_delay", m.dispatch_callback(self.bot, tap("set_delay")))
+        await self.step("handle_text_message", m.handle_text_message(self.bot, say(str(config.DEFAULT_DELAY * 10))))
+        await self.think()
+        await self.step("start_broadcast", m.dispatch_callback(self.bot, tap("start_broadcast")))
+        await asyncio.sleep(self.args.broadcast_hold)
+        await self.step("stop_broadcast", m.dispatch_callback(self.bot, tap("stop_broadcast")))
+        await self.think()
+        await self.step("analytics", m.dispatch_callback(self.bot, tap("analytics")))
+        await self.step("detailed_report", m.dispatch_callback(self.bot, tap("detailed_report")))
+        for otp_key in ("otp_1", "otp_2", "otp_back"):
+            await self.step("otp_callback", m.dispatch_callback(self.bot, tap(otp_key)))
+        self.completed_journeys += 1
+
+    async def virtual_user(self, index):
+        uid = USER_ID_BASE + index
+        if self.args.ramp > 0:
+            await asyncio.sleep(self.args.ramp * index / self.args.users)
+        self.seed_user(uid)
+        for _ in range(self.args.iterations):
+            await self.journey(uid)
+
+    async def run(self):
+        self.patch_transports()
+        probe = LagProbe()
+        probe.start()
+        started = time.perf_counter()
+        await asyncio.gather(*(self.virtual_user(i) for i in range(self.args.users)))
+        # Let cancelled broadcast tasks finish their cleanup before measuring
+        while self.main.user_tasks:
+            await asyncio.sleep(0.1)
+        elapsed = time.perf_counter() - started
+        await probe.stop()
+        self.report(elapsed, probe.samples)
+
+    def report(self, elapsed, lag_samples):
+        total_calls = sum(len(v) for v in self.latencies.values())
+        print()
+        print(f"Virtual users:      {self.args.users}")
+        print(f"Journeys completed: {self.completed_journeys}")
+        print(f"Wall time:          {elapsed:.2f}s")
+        print(f"Handler calls:      {total_calls} ({total_calls / elapsed:.1f}/s)")
+        print(f"Fake API calls:     {self.transport.calls}")
+        print()
+        print(f"{'step':<22}{'count':>8}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        for name, values in self.latencies.items():
+            print(
+                f"{name:<22}{len(values):>8}{self.errors.get(name, 0):>8}"
+                f"{percentile(values, 50) * 1000:>10.1f}{percentile(values, 95) * 1000:>10.1f}"
+                f"{percentile(values, 99) * 1000:>10.1f}{max(values) * 1000:>10.1f}"
+            )
+        print()
+        print(
+            f"Event-loop lag: p50={percentile(lag_samples, 50) * 1000:.1f}ms "
+            f"p99={percentile(lag_samples, 99) * 1000:.1f}ms "
+            f"max={max(lag_samples, default=0) * 1000:.1f}ms ({len(lag_samples)} samples)"
+        )
+
+
+async def check_rotation(main_module, accounts=3, groups=30):
+    """Run one campaign over accounts x groups dialogs and check every group is sent to.
+
+    Cycles are capped at MAX_GROUPS_PER_BROADCAST sends, so every group must
+    be reached within ceil(accounts * groups / cap) cycles.
+    """
+    m = main_module
+    from ad_payloads import AdPayload
+    from records import AccountRecord, CampaignStats
+
+    uid = USER_ID_BASE - 1
+    sent = set()
+
+    class RecordingClient(FakeTelegramClient):
+        async def send_message(self, peer, *args, **kwargs):
+            sent.add((id(self), peer))
+            return SimpleNamespace(id=random.getrandbits(31))
+
+        async def iter_dialogs(self, *args, **kwargs):
+            for i in range(groups):
+                yield SimpleNamespace(id=-1000 - i, name=f"Group {i}", is_group=True)
+
+    records = [AccountRecord(i, f"+1555000{i:04d}", RecordingClient()) for i in range(accounts)]
+    m.db.set_broadcast_state(uid, running=True)
+    campaign = m.BroadcastCampaign(uid, AdPayload.parse("rotation check"), 0, records, [], CampaignStats())
+    cap = m.quota.max_groups_per_cycle
+    max_cycles = -(-accounts * groups // cap)
+    try:
+        while campaign.stats.cycles < max_cycles:
+            await campaign.step()
+    finally:
+        m.db.set_broadcast_state(uid, running=False)
+    expected = accounts * groups
+    print(f"Rotation check: {len(sent)}/{expected} groups reached in {campaign.stats.cycles} cycles of up to {cap} sends")
+    return len(sent) == expected
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate concurrent bot users against the real handlers.")
+    parser.add_argument("--users", type=int, default=1000, help="number of concurrent virtual users")
+    parser.add_argument("--iterations", type=int, default=1, help="journeys per virtual user")
+    parser.add_argument("--ramp", type=float, default=5.0, help="seconds over which users are started")
+    parser.add_argument("--think", type=float, default=0.5, help="max think time between taps (seconds)")
+    parser.add_argument("--broadcast-hold", type=float, default=2.0, help="seconds a broadcast runs before stop")
+    parser.add_argument("--groups", type=int, default=5, help="fake groups per hosted account")
+    parser.add_argument("--rtt-ms", type=float, default=40.0, help="simulated Telegram round-trip time")
+    parser.add_argument("--jitter-ms", type=float, default=20.0, help="simulated round-trip jitter")
+    parser.add_argument("--mongo-uri", default="mongodb://127.0.0.1:27017", help="local MongoDB to test against")
+    parser.add_argument("--db-name", default="adsbot_loadtest", help="scratch database name")
+    parser.add_argument("--mongomock", action="store_true", help="use in-process mongomock instead of a server")
+    parser.add_argument("--keep-data", action="store_true", help="do not drop the scratch database afterwards")
+    parser.add_argument("--log-level", default="WARNING", help="bot log level during the run")
+    parser.add_argument("--check-rotation", action="store_true",
+                        help="check that capped broadcast cycles reach every group (3 accounts x 30 groups), then exit")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.db_name == config.DB_NAME:
+        sys.exit(f"Refusing to load-test against the production database '{config.DB_NAME}'")
+
+    # Point the bot at the local stand-in before main.py builds its database manager
+    os.environ["MONGO_URI"] = args.mongo_uri
+    config.MONGO_URI = args.mongo_uri
+    config.ANALYTICS_MONGO_URI = args.mongo_uri
+    config.DB_NAME = args.db_name
+    if args.mongomock:
+        try:
+            import mongomock
+        except ImportError:
+            sys.exit("--mongomock requires the 'mongomock' package")
+        import functools
+        import database
+        from mongomock.store import ServerStore
+        # The primary and analytics pools must see the same in-process data
+        database.pymongo.MongoClient = functools.partial(mongomock.MongoClient, _store=ServerStore())
+
+    import main as bot_main
+    bot_main.db.connect()
+    logging.getLogger().setLevel(args.log_level.upper())
+
+    test = LoadTest(bot_main, args)
+    try:
+        if args.check_rotation:
+            test.patch_transports()
+            if not asyncio.run(check_rotation(bot_main)):
+                sys.exit("Rotation check failed: some groups were never sent to")
+            return
+        asyncio.run(test.run())
+    finally:
+        if not args.keep_data:
+            bot_main.db.client.drop_database(config.DB_NAME)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Optional, Set
+from telethon import TelegramClient
+from telethon.sessions import StringSession
+import config
+from keyed_executor import create_detached_task
+
+logger = logging.getLogger(__name__)
+
+
+class PendingLogin:
+    """Connected client and code metadata for one in-progress account login."""
+
+    __slots__ = ("client", "phone", "phone_code_hash", "created_at")
+
+    def __init__(self, client: TelegramClient, phone: str, phone_code_hash: str):
+        self.client = client
+        self.phone = phone
+        self.phone_code_hash = phone_code_hash
+        self.created_at = time.monotonic()
+
+
+class LoginManager:
+    """Holds the connected TelegramClient of each in-progress phone/OTP/2FA login.
+
+    The code request, sign-in and 2FA steps reuse the same MTProto connection
+    instead of reconnecting from the serialized session at every step. Logins
+    expire after ``expiry`` seconds and are disconnected by the reaper.
+    """
+
+    def __init__(self, expiry: float):
+        self.expiry = expiry
+        self._logins: Dict[int, PendingLogin] = {}
+        # Disconnects started by get(); held so they are not collected and close_all can await them
+        self._closing: Set[asyncio.Task] = set()
+
+    def __len__(self):
+        return len(self._logins)
+
+    async def begin(self, user_id: int, phone: str) -> PendingLogin:
+        """Connect a fresh client and request a login code, replacing any previous login."""
+        await self.finish(user_id)
+        client = TelegramClient(StringSession(), config.API_ID, config.API_HASH)
+        try:
+            await client.connect()
+            sent_code = await client.send_code_request(phone)
+        except Exception:
+            await client.disconnect()
+            raise
+        login = PendingLogin(client, phone, sent_code.phone_code_hash)
+        self._logins[user_id] = login
+        logger.info(f"Login started for user {user_id}")
+        return login
+
+    def get(self, user_id: int) -> Optional[PendingLogin]:
+        """Return the live login for a user, or None if missing, expired or disconnected."""
+        login = self._logins.get(user_id)
+        if login is None:
+            return None
+        if time.monotonic() - login.created_at > self.expiry or not login.client.is_connected():
+            self._logins.pop(user_id, None)
+            task = create_detached_task(self._disconnect(user_id, login))
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+            return None
+        return login
+
+    async def finish(self, user_id: int):
+        """Forget a user's login and close its connection."""
+        login = self._logins.pop(user_id, None)
+        if login:
+            await self._disconnect(user_id, login)
+
+    async def _disconnect(self, user_id: int, login: PendingLogin):
+        try:
+            await login.client.disconnect()
+        except Exception as e:
+            logger.error(f"Failed to disconnect login client for {user_id}: {e}")
+
+    async def close_all(self):
+        await asyncio.gather(*(self.finish(user_id) for user_id in list(self._logins)), *self._closing)
+
+    async def run_reaper(self, interval: float = 60.0):
+        """Periodically disconnect logins older than the OTP expiry."""
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            for user_id, login in list(self._logins.items()):
+                if now - login.created_at > self.expiry:
+                    logger.info(f"Login for user {user_id} expired")
+                    await self.finish(user_id)
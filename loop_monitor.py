@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from typing import Awaitable, Callable, Optional
+import config
+import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class _SlowCallbackHandler(logging.Handler):
+    """Counts asyncio debug-mode 'Executing <Handle ...> took N seconds' warnings."""
+
+    def emit(self, record):
+        if "took" in record.getMessage():
+            metrics.LOOP_SLOW_CALLBACKS.inc()
+
+
+class LoopLagMonitor:
+    """Watchdog measuring event-loop scheduling lag and capturing the stack of stalls.
+
+    A heartbeat coroutine sleeps for a fixed interval and records how late it
+    wakes up. A daemon thread watches the heartbeat; when it goes stale for
+    longer than the threshold the thread snapshots the loop thread's current
+    stack, which is reported once the loop recovers.
+    """
+
+    def __init__(self, interval: float, threshold: float,
+                 reporter: Optional[Callable[[str], Awaitable[None]]] = None,
+                 report_cooldown: float = 300.0):
+        self.interval = interval
+        self.threshold = threshold
+        self.reporter = reporter
+        self.report_cooldown = report_cooldown
+        self.last_lag = 0.0
+        self.max_lag = 0.0
+        self.stalls = 0
+        self._loop = None
+        self._loop_thread_id = None
+        self._last_beat = time.monotonic()
+        self._captured_stack = None
+        self._last_report = 0.0
+        self._task = None
+        self._report_task = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self, enable_debug: bool = False):
+        """Start the heartbeat task and watchdog thread on the running loop."""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._loop.slow_callback_duration = self.threshold
+        if enable_debug:
+            self._loop.set_debug(True)
+            logging.getLogger("asyncio").addHandler(_SlowCallbackHandler())
+        self._last_beat = time.monotonic()
+        self._task = asyncio.create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watchdog, name="loop-watchdog", daemon=True)
+        self._thread.start()
+        logger.info(f"Loop monitor started: interval={self.interval}s threshold={self.threshold}s debug={enable_debug}")
+
+    async def stop(self):
+        self._stop.set()
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._report_task:
+            self._report_task.cancel()
+
+    def seconds_since_heartbeat(self) -> float:
+        """Age of the last heartbeat; large values mean the loop is blocked."""
+        return time.monotonic() - self._last_beat
+
+    async def _heartbeat(self):
+        while True:
+            start = self._loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, self._loop.time() - start - self.interval)
+            self._last_beat = time.monotonic()
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            metrics.LOOP_LAG.observe(lag)
+            if lag > self.threshold:
+                self._on_stall(lag)
+
+    def _on_stall(self, lag: float):
+        with self._lock:
+            stack, self._captured_stack = self._captured_stack, None
+        self.stalls += 1
+        metrics.LOOP_STALLS.inc()
+        stack = stack or "<stack not captured: stall shorter than watchdog interval>\n"
+        logger.warning(f"Event loop stalled for {lag:.3f}s; loop thread was executing:\n{stack}")
+        now = time.monotonic()
+        if self.reporter and now - self._last_report >= self.report_cooldown:
+            self._last_report = now
+            # Sent in the background so a slow report does not delay the next heartbeat
+            self._report_task = asyncio.create_task(self._report(f"Event loop stalled for {lag:.3f}s\n\n{stack}"))
+
+    async def _report(self, text: str):
+        try:
+            await self.reporter(text)
+        except Exception as e:
+            logger.error(f"Failed to report loop stall: {e}")
+
+    def _watchdog(self):
+        while not self._stop.wait(self.interval):
+            age = self.seconds_since_heartbeat() - self.interval
+            if age <= self.threshold:
+                continue
+            with self._lock:
+                if self._captured_stack is not None:
+                    continue
+                frame = sys._current_frames().get(self._loop_thread_id)
+                if frame is None:
+                    continue
+                self._captured_stack = "".join(traceback.format_stack(frame))
+
+
+def create_loop_monitor(reporter=None) -> LoopLagMonitor:
+    """Build the loop monitor from config."""
+    return LoopLagMonitor(
+        config.LOOP_MONITOR_INTERVAL,
+        config.LOOP_LAG_THRESHOLD,
+        reporter=reporter,
+        report_cooldown=config.LOOP_STALL_REPORT_COOLDOWN,
+    )
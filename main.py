@@ -1,3 +1,5 @@
+import time
+STARTED_AT = time.perf_counter()
 import asyncio
 import random
 import string
@@ -16,16 +18,47 @@ from telethon.errors import (
     SessionExpiredError,
     PasswordHashInvalidError
 )
-from pyrogram import Client as PyroClient, filters, idle
+from pyrogram import Client as PyroClient, filters, idle, StopPropagation
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton, InputMediaPhoto, ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove
 from pyrogram.errors import UserNotParticipant, PeerIdInvalid, ChatWriteForbidden, FloodWait, MessageNotModified
 from pyrogram.enums import ParseMode, ChatType
+from pyrogram.raw import functions as raw_functions, types as raw_types
 import config
 from database import EnhancedDatabaseManager
 from utils import validate_phone_number, generate_progress_bar, format_duration
+import metrics
+from metrics import track_handler, instrument_db
+from loop_monitor import create_loop_monitor
+from mongo_profiler import query_profiler, run_explain_loop
+from entity_session import MongoEntitySession
+from client_pool import HostedClientPool
+from group_resolver import GroupResolver, extract_group_links
+from login_manager import LoginManager
+from callback_router import CallbackRouter
+from keyed_executor import KeyedExecutor, create_detached_task
+from broadcast_scheduler import BroadcastScheduler
+from ad_payloads import AdPayloadHub
+from change_streams import ChangeStreamListener, InvalidatingCache
+from shutdown import ShutdownCoordinator
+from startup import StartupSequencer
+from health import HealthEndpoints
+from quota import QuotaEngine
+from records import (
+    AccountRecord, TargetGroupRecord, CampaignStats,
+    BROADCAST_ACCOUNT_FIELDS, TARGET_GROUP_FIELDS, ACCOUNT_LIST_FIELDS, ACCOUNT_HEALTH_FIELDS,
+    USER_BROWSER_FIELDS, USER_ID_FIELDS
+)
+import ui
+from ui import kb
+from account_health import AccountHealthChecker, HEALTH_UNAUTHORIZED
+from sampling_profiler import SamplingProfiler, ProfilerBusyError, sampling_profiler
 import os
+import io
+import html
 import logging
 from cryptography.fernet import Fernet
+from bson.objectid import ObjectId
+from bson.errors import InvalidId
 
 # Logging setup
 os.makedirs('logs', exist_ok=True)
@@ -52,29 +85,61 @@ if not ENCRYPTION_KEY:
     ENCRYPTION_KEY = Fernet.generate_key().decode()
 cipher_suite = Fernet(ENCRYPTION_KEY.encode())
 
-# Initialize database
-db = EnhancedDatabaseManager()
+# Startup phases are timed from the first import
+startup = StartupSequencer(STARTED_AT)
+startup.record("imports", time.perf_counter() - STARTED_AT)
+database_ready = asyncio.Event()
+database_failed = False
+
+# Initialize database; main() connects it concurrently with the bot clients
+db = EnhancedDatabaseManager(connect=False)
+instrument_db(db)
 
 # Admin check
 ADMIN_IDS = [config.ADMIN_ID]
 def is_owner(uid):
     return uid in ADMIN_IDS
 
-# Inline keyboard helper
-def kb(rows):
-    if not isinstance(rows, list) or not all(isinstance(row, list) for row in rows):
-        logger.error("Invalid rows format for InlineKeyboardMarkup")
-        raise ValueError("Rows must be a list of lists")
-    return InlineKeyboardMarkup(rows)
-
 # Initialize Pyrogram clients
-pyro = PyroClient("QUANTUM_bot", api_id=config.API_ID, api_hash=config.API_HASH, bot_token=config.BOT_TOKEN)
+pyro = PyroClient("QUANTUM_bot", api_id=config.API_ID, api_hash=config.API_HASH, bot_token=config.BOT_TOKEN, workers=config.BOT_WORKERS)
 logger_client = PyroClient("logger_bot", api_id=config.API_ID, api_hash=config.API_HASH, bot_token=config.LOGGER_BOT_TOKEN)
 
+# Updates that arrive while the database is still connecting wait here before any handler runs;
+# once shutdown has begun every new update is dropped here instead
+@pyro.on_raw_update(group=-1)
+@logger_client.on_raw_update(group=-1)
+async def wait_for_database(client, update, users, chats):
+    if shutdown.stopping:
+        if isinstance(update, raw_types.UpdateBotCallbackQuery):
+            # Answer the tap so the button stops spinning
+            try:
+                await client.invoke(raw_functions.messages.SetBotCallbackAnswer(
+                    query_id=update.query_id, cache_time=0, alert=True,
+                    message="The bot is restarting, please try again in a moment. ⏳"))
+            except Exception:
+                pass
+        raise StopPropagation
+    await database_ready.wait()
+    if database_failed:
+        # The database phase failed and startup is aborting; drop the update
+        raise StopPropagation
+
+# Handlers for the same user run one at a time; different users run in parallel
+handler_executor = KeyedExecutor(config.HANDLER_MAX_PENDING_PER_USER)
+serialize_user = handler_executor.serialized(lambda client, update: update.from_user.id if update.from_user else None)
+metrics.QUEUE_DEPTH.labels("user_handlers").set_function(lambda: handler_executor.pending)
+callback_router = CallbackRouter(handler_executor)
+
+# Single entry point for every inline button; routes are registered with @callback_router.route
+@pyro.on_callback_query()
+async def dispatch_callback(client, cb):
+    await callback_router.dispatch(client, cb)
+
 
 # ---------------------- ADMIN PANEL / CALLBACKS ADDED ----------------------
 # Admin / Owner only command: shows stats and buttons for broadcast, ads, sessions etc.
 @pyro.on_message(filters.command(["admin"]) & filters.private)
+@track_handler
 async def admin_panel(client, m):
     uid = m.from_user.id
     if uid not in config.ADMIN_IDS:
@@ -98,25 +163,79 @@ async def admin_panel(client, m):
     await m.reply("<b>Admin Panel</b>\nChoose an action:", parse_mode=ParseMode.HTML, reply_markup=kb(rows))
 
 # Show detailed counts when pressing the simple stat buttons
-@pyro.on_callback_query(filters.regex(r"^admin_(users|accounts|active)$"))
+@callback_router.route("admin_accounts", "admin_active")
+@track_handler
 async def admin_stat_cb(client, cb):
     uid = cb.from_user.id
     if uid not in config.ADMIN_IDS:
         await cb.answer("Unauthorized", show_alert=True); return
-    key = cb.data.split("_")[1]
+    key = cb.route.action
     try:
         stats = db.get_admin_stats()
-        if key == "users":
-            await cb.answer(f"Total users: {stats.get('total_users',0)}", show_alert=True)
-        elif key == "accounts":
+        if key == "accounts":
             await cb.answer(f"Total accounts: {stats.get('total_accounts',0)}", show_alert=True)
         else:
             await cb.answer(f"Active loggers: {stats.get('logger_stats',0)}", show_alert=True)
     except Exception as e:
         await cb.answer("Error fetching stats", show_alert=True)
 
+# User browser - pages through users by _id cursor so every page costs the same
+def render_user_rows(users):
+    lines = []
+    for u in users:
+        username = html.escape(u.get("username") or "Unknown")
+        name = html.escape(u.get("first_name") or "User")
+        lines.append(f"• <code>{u.get('user_id')}</code> @{username} - {name}")
+    return "\n".join(lines)
+
+async def show_user_page(cb, after_id=None, before_id=None):
+    users, has_more = db.get_users_page(after_id, before_id, config.ADMIN_USERS_PAGE_SIZE, USER_BROWSER_FIELDS)
+    if not users and before_id is not None:
+        # Everything before the cursor was deleted; fall back to the first page
+        users, has_more = db.get_users_page(limit=config.ADMIN_USERS_PAGE_SIZE, projection=USER_BROWSER_FIELDS)
+        before_id = None
+    if before_id is not None:
+        has_prev, has_next = has_more, True
+    else:
+        has_prev, has_next = after_id is not None, has_more
+    nav = []
+    if has_prev and users:
+        nav.append(InlineKeyboardButton("« Prev", callback_data=f"users_prev_{users[0]['_id']}"))
+    if has_next and users:
+        nav.append(InlineKeyboardButton("Next »", callback_data=f"users_next_{users[-1]['_id']}"))
+    rows = [nav] if nav else []
+    rows.append([InlineKeyboardButton("Search 🔍", callback_data="users_search")])
+    body = render_user_rows(users) or "<i>No users yet.</i>"
+    await cb.message.edit(f"<b>👥 Users</b> (~{db.count_users()} total)\n\n{body}", parse_mode=ParseMode.HTML, reply_markup=kb(rows))
+    await cb.answer()
+
+@callback_router.route("admin_users", "users_next", "users_prev")
+@track_handler
+async def admin_users_cb(client, cb):
+    uid = cb.from_user.id
+    if uid not in config.ADMIN_IDS:
+        await cb.answer("Unauthorized", show_alert=True); return
+    try:
+        cursor = ObjectId(cb.route.args[0]) if cb.route.args else None
+    except InvalidId:
+        await cb.answer("Invalid page.", show_alert=True); return
+    if cb.route.action == "prev":
+        await show_user_page(cb, before_id=cursor)
+    else:
+        await show_user_page(cb, after_id=cursor)
+
+@callback_router.route("users_search")
+@track_handler
+async def users_search_cb(client, cb):
+    uid = cb.from_user.id
+    if uid not in config.ADMIN_IDS:
+        await cb.answer("Unauthorized", show_alert=True); return
+    db.set_user_temp_data(uid, "user_search_step", "waiting_term")
+    await cb.answer("Send a user ID or username to search for.", show_alert=True)
+
 # Developer button - shows developer IDs/links
-@pyro.on_callback_query(filters.regex(r"^admin_devs$"))
+@callback_router.route("admin_devs")
+@track_handler
 async def admin_devs_cb(client, cb):
     uid = cb.from_user.id
     if uid not in config.ADMIN_IDS:
@@ -130,7 +249,8 @@ async def admin_devs_cb(client, cb):
     await cb.answer()
 
 # BROADCAST flow
-@pyro.on_callback_query(filters.regex(r"^admin_broadcast$"))
+@callback_router.route("admin_broadcast")
+@track_handler
 async def admin_broadcast_cb(client, cb):
     uid = cb.from_user.id
     if uid not in config.ADMIN_IDS:
@@ -143,7 +263,8 @@ async def admin_broadcast_cb(client, cb):
     await cb.message.edit("<b>Broadcast Menu</b>\nChoose:", parse_mode=ParseMode.HTML, reply_markup=kb(rows))
     await cb.answer()
 
-@pyro.on_callback_query(filters.regex(r"^broadcast_set$"))
+@callback_router.route("broadcast_set")
+@track_handler
 async def broadcast_set_cb(client, cb):
     uid = cb.from_user.id
     if uid not in config.ADMIN_IDS:
@@ -153,8 +274,19 @@ async def broadcast_set_cb(client, cb):
     await cb.answer("Please send the message you want to save for broadcast.", show_alert=True)
 
 @pyro.on_message(filters.private)
+@serialize_user
+@track_handler
 async def admin_private_message_router(client, m):
     uid = m.from_user.id
+    # handle admin user search
+    if uid in config.ADMIN_IDS and db.get_user_temp_data(uid, "user_search_step") == "waiting_term":
+        db.set_user_temp_data(uid, "user_search_step", None)
+        users = db.search_users(m.text or "", config.ADMIN_USERS_PAGE_SIZE, USER_BROWSER_FIELDS)
+        rows = [[InlineKeyboardButton("Search again 🔍", callback_data="users_search"),
+                 InlineKeyboardButton("All users 👥", callback_data="admin_users")]]
+        body = render_user_rows(users) or "<i>No matching users.</i>"
+        await m.reply(f"<b>🔍 Search results</b>\n\n{body}", parse_mode=ParseMode.HTML, reply_markup=kb(rows))
+        return
     # handle broadcast message save
     try:
         step = db.get_user_temp_data(uid, "broadcast_step")
@@ -199,20 +331,20 @@ async def admin_private_message_router(client, m):
         return
 
 # send broadcast handlers
-@pyro.on_callback_query(filters.regex(r"^broadcast_send|broadcast_send_forward$"))
+@callback_router.route("broadcast_send", "broadcast_send_forward")
+@track_handler
 async def broadcast_send_cb(client, cb):
     uid = cb.from_user.id
     if uid not in config.ADMIN_IDS:
         await cb.answer("Unauthorized", show_alert=True); return
-    data = cb.data
     saved_text = db.get_user_temp_data(uid, "broadcast_saved_text")
     saved_forward = db.get_user_temp_data(uid, "broadcast_saved_forward")
-    if data.startswith("broadcast_send_forward"):
+    if cb.route.action == "send_forward":
         if not saved_forward:
             await cb.answer("No forwarded message saved. Set one first.", show_alert=True); return
         await cb.answer("Starting forward broadcast...", show_alert=True)
         # Very simple: iterate over target_groups and try to forward. (Best-effort; may need adjustments)
-        groups = db.get_target_groups(uid)
+        groups = db.get_target_groups(uid, TARGET_GROUP_FIELDS)
         sent = 0
         failed = 0
         for g in groups:
@@ -227,7 +359,7 @@ async def broadcast_send_cb(client, cb):
     if not saved_text:
         await cb.answer("No saved broadcast text. Set one first.", show_alert=True); return
     await cb.answer("Starting text broadcast...", show_alert=True)
-    groups = db.get_target_groups(uid)
+    groups = db.get_target_groups(uid, TARGET_GROUP_FIELDS)
     sent = 0; failed = 0
     for g in groups:
         try:
@@ -238,12 +370,13 @@ async def broadcast_send_cb(client, cb):
     await cb.message.reply(f"Broadcast completed. Sent: {sent}, Failed: {failed}")
 
 # ADS sender - list target groups and allow setting per-group delay
-@pyro.on_callback_query(filters.regex(r"^admin_ads$"))
+@callback_router.route("admin_ads")
+@track_handler
 async def admin_ads_cb(client, cb):
     uid = cb.from_user.id
     if uid not in config.ADMIN_IDS:
         await cb.answer("Unauthorized", show_alert=True); return
-    groups = db.get_target_groups(uid)
+    groups = db.get_target_groups(uid, TARGET_GROUP_FIELDS)
     if not groups:
         await cb.answer("No target groups defined for you yet.", show_alert=True); return
     rows = []
@@ -253,23 +386,25 @@ async def admin_ads_cb(client, cb):
     await cb.message.edit("<b>Ads Sender - choose a group to set delay</b>", parse_mode=ParseMode.HTML, reply_markup=kb(rows))
     await cb.answer()
 
-@pyro.on_callback_query(filters.regex(r"^ads_group_(.+)$"))
+@callback_router.route("ads_group")
+@track_handler
 async def ads_group_cb(client, cb):
     uid = cb.from_user.id
     if uid not in config.ADMIN_IDS:
         await cb.answer("Unauthorized", show_alert=True); return
-    group_id = cb.data.split("_",2)[2]
+    group_id = "_".join(cb.route.args)
     # ask for delay in minutes
     db.set_user_temp_data(uid, "ads_state", {"expect_delay": True, "group_id": group_id})
     await cb.answer("Send delay in minutes (number).", show_alert=True)
 
 # Manage sessions - list accounts and allow deletion
-@pyro.on_callback_query(filters.regex(r"^admin_sessions$"))
+@callback_router.route("admin_sessions")
+@track_handler
 async def admin_sessions_cb(client, cb):
     uid = cb.from_user.id
     if uid not in config.ADMIN_IDS:
         await cb.answer("Unauthorized", show_alert=True); return
-    accounts = db.get_user_accounts(uid)
+    accounts = db.get_user_accounts(uid, ACCOUNT_LIST_FIELDS)
     if not accounts:
         await cb.answer("No accounts found.", show_alert=True); return
     rows = []
@@ -280,12 +415,13 @@ async def admin_sessions_cb(client, cb):
     await cb.message.edit("<b>Your Accounts</b>\nClick to delete an account from sessions:", parse_mode=ParseMode.HTML, reply_markup=kb(rows))
     await cb.answer()
 
-@pyro.on_callback_query(filters.regex(r"^delacc_(.+)$"))
+@callback_router.route("delacc")
+@track_handler
 async def delacc_cb(client, cb):
     uid = cb.from_user.id
     if uid not in config.ADMIN_IDS:
         await cb.answer("Unauthorized", show_alert=True); return
-    acc_id = cb.data.split("_",1)[1]
+    acc_id = "_".join(cb.route.args)
     try:
         # deactivate_account expects account_id; attempt to convert to ObjectId if stored as such in DB
         ok = db.deactivate_account(acc_id)
@@ -303,10 +439,53 @@ async def delacc_cb(client, cb):
 
 # In-memory storage for broadcast tasks
 user_tasks = {}
+background_tasks = []
+shutdown = ShutdownCoordinator(config.SHUTDOWN_TIMEOUT)
+hosted_client_pool = HostedClientPool(db, cipher_suite, config.CLIENT_POOL_IDLE_TIMEOUT)
+broadcast_scheduler = BroadcastScheduler(config.BROADCAST_WORKERS)
+ad_payloads = AdPayloadHub(db)
+quota = QuotaEngine(db, config.MAX_BROADCASTS_PER_DAY, config.MAX_GROUPS_PER_BROADCAST, config.QUOTA_SYNC_INTERVAL)
+# Keeps per-user caches coherent when several bot instances share the database
+change_listener = ChangeStreamListener(
+    db, config.CHANGE_STREAM_COLLECTIONS, config.INSTANCE_ID, config.CHANGE_STREAM_TOKEN_SAVE_INTERVAL
+) if config.ENABLE_CHANGE_STREAMS else None
+logger_status_cache = InvalidatingCache(
+    change_listener, "logger_status", config.CACHE_TTL, config.CACHE_FALLBACK_TTL, config.CACHE_MAX_ENTRIES
+)
+if change_listener:
+    change_listener.register("ad_messages", ad_payloads.invalidate)
+metrics.QUEUE_DEPTH.labels("broadcast_timers").set_function(lambda: broadcast_scheduler.timers)
+metrics.QUEUE_DEPTH.labels("broadcast_ready").set_function(lambda: broadcast_scheduler.ready)
+group_resolver = GroupResolver(
+    hosted_client_pool,
+    cache_ttl=config.GROUP_RESOLVE_CACHE_TTL,
+    concurrency=config.GROUP_RESOLVE_CONCURRENCY,
+    min_interval=config.GROUP_RESOLVE_MIN_INTERVAL,
+    max_entries=config.GROUP_RESOLVE_CACHE_SIZE
+)
+login_manager = LoginManager(config.OTP_EXPIRY)
+account_health = AccountHealthChecker(
+    db,
+    cipher_suite,
+    interval=config.ACCOUNT_HEALTH_CHECK_INTERVAL,
+    max_age=config.ACCOUNT_HEALTH_MAX_AGE,
+    concurrency=config.ACCOUNT_HEALTH_CONCURRENCY,
+    client_pool=hosted_client_pool
+)
+metrics.LIVE_BROADCAST_TASKS.set_function(lambda: len(user_tasks))
+
+async def get_login_client(uid, session_str):
+    """Return the user's live login client, reconnecting from the saved session if it was lost."""
+    login = login_manager.get(uid)
+    if login:
+        return login.client, False
+    tg = TelegramClient(StringSession(session_str), config.API_ID, config.API_HASH)
+    await tg.connect()
+    return tg, True
 
 # Async function to send logs via logger bot to user DM
 async def send_dm_log(user_id, log_message):
-    if not db.get_logger_status(user_id):
+    if not logger_status_cache.get(user_id, db.get_logger_status):
         logger.info(f"User {user_id} has not started logger bot. Skipping DM log.")
         return
     try:
@@ -328,10 +507,46 @@ async def send_dm_log(user_id, log_message):
             logger.error(f"Failed to notify user {user_id} to start logger bot: {e}")
     except Exception as e:
         logger.error(f"DM log failed for {user_id}: {e} - Message: {log_message[:50]}...")
-        db.log_logger_failure(user_id, str(e))
+        db.log_logger_failure(user_id, e)
+
+async def send_tech_log(text):
+    """Send a diagnostic report to the tech log channel."""
+    try:
+        await pyro.send_message(
+            config.TECH_LOG_CHANNEL_ID,
+            f"<b>⚠️ TECH LOG</b>\n\n<pre>{html.escape(text[-3500:])}</pre>",
+            parse_mode=ParseMode.HTML
+        )
+    except Exception as e:
+        logger.error(f"Failed to send tech log: {e}")
+
+loop_monitor = create_loop_monitor(reporter=send_tech_log)
+health = HealthEndpoints(
+    db,
+    {"bot": pyro, "logger_bot": logger_client},
+    loop_monitor if config.ENABLE_LOOP_MONITOR else None,
+    max_heartbeat_age=config.LIVENESS_MAX_HEARTBEAT_AGE,
+    ping_timeout=config.READINESS_PING_TIMEOUT,
+    is_stopping=lambda: shutdown.stopping,
+    status_fields={
+        "campaigns": lambda: len(user_tasks),
+        "scheduled_campaigns": lambda: broadcast_scheduler.active,
+        "queue_depths": lambda: {
+            "user_handlers": handler_executor.pending,
+            "broadcast_timers": broadcast_scheduler.timers,
+            "broadcast_ready": broadcast_scheduler.ready
+        },
+        "pending_logins": lambda: len(login_manager),
+        "quota_tracked_users": lambda: len(quota),
+        "change_streams": lambda: change_listener.active if change_listener else False,
+        "stopping": lambda: shutdown.stopping,
+        "startup_seconds": lambda: {name: round(seconds, 3) for name, seconds in startup.timings.items()}
+    }
+)
 
 # Logger bot start command to mark user as active
 @logger_client.on_message(filters.command(["start"]))
+@track_handler
 async def logger_start(client, m):
     uid = m.from_user.id
     username = m.from_user.username or "Unknown"
@@ -339,6 +554,7 @@ async def logger_start(client, m):
     
     db.create_user(uid, username, first_name)
     db.set_logger_status(uid, is_active=True)
+    logger_status_cache.invalidate(uid)
     await m.reply(
         f"<b>🚀 Welcome to QUANTUM Logger Bot! ✨</b>\n\n"
         f"<u>Logs for your ad broadcasts will be sent here.</u>\n"
@@ -362,18 +578,6 @@ async def is_joined_all(client, uid):
     group_joined = await is_joined(client, uid, config.MUSTJOIN)
     return channel_joined and group_joined
 
-async def validate_session(session_str):
-    """Validate a Telegram session string."""
-    try:
-        tg_client = TelegramClient(StringSession(session_str), config.API_ID, config.API_HASH)
-        await tg_client.connect()
-        is_valid = await tg_client.is_user_authorized()
-        await tg_client.disconnect()
-        return is_valid
-    except Exception as e:
-        logger.error(f"Session validation failed: {e}")
-        return False
-
 async def stop_broadcast_task(uid):
     """Helper function to stop broadcast task and clean up."""
     state = db.get_broadcast_state(uid)
@@ -393,140 +597,322 @@ async def stop_broadcast_task(uid):
         except Exception as e:
             logger.error(f"Failed to cancel broadcast task for {uid}: {e}")
         finally:
-            del user_tasks[uid]
+            user_tasks.pop(uid, None)
     
     db.set_broadcast_state(uid, running=False)
     return True
 
-async def run_broadcast(client, uid):
+async def iter_broadcast_targets(tg_client):
+    """Yield a TargetGroupRecord for every group dialog; used when the user stored no targets."""
+    async for dialog in tg_client.iter_dialogs():
+        if dialog.is_group:
+            yield TargetGroupRecord(dialog.id, dialog.id, dialog.name)
+
+async def resolvable_targets(tg_client, targets):
+    """The stored targets one hosted account can reach, in their stored order.
+
+    Groups already in the account's persistent entity cache are kept without
+    any request; only when some are missing are the account's dialogs read
+    once, which also fills the cache. Groups the account is not in are left
+    out instead of failing every cycle.
+    """
+    session = tg_client.session
+    known = {t.group_id for t in targets if session.get_entity_rows_by_id(t.group_id, exact=t.group_id < 0)}
+    if len(known) < len(targets):
+        known |= {dialog.id async for dialog in tg_client.iter_dialogs() if dialog.is_group}
+    return [t for t in targets if t.group_id in known]
+
+async def send_to_group(tg_client, peer, payload, refreshed_clients):
+    """Send a pre-parsed AdPayload to peer, filling the entity cache with a single dialog fetch on a miss.
+
+    Targets come from resolvable_targets, so a miss here means a group the
+    account is in whose cached entry was lost, not a group it never joined.
+    """
     try:
-        sent_count = 0
-        failed_count = 0
-        cycle_count = 0
-        msg = db.get_user_ad_messages(uid)
-        msg = msg[0]["message"] if msg else None
-        if not msg:
-            await client.send_message(uid, "No ad message set! 😔", parse_mode=ParseMode.HTML)
-            return
-        delay = db.get_user_ad_delay(uid)
-        accounts = db.get_user_accounts(uid)
-        target_groups = db.get_target_groups(uid)
-        group_ids = [g['group_id'] for g in target_groups] if target_groups else None
-        clients = {}
-        error_summary = []
+        await tg_client.send_message(peer, payload.text, formatting_entities=payload.entities)
+    except ValueError:
+        if tg_client in refreshed_clients:
+            raise
+        refreshed_clients.add(tg_client)
+        await tg_client.get_dialogs()
+        await tg_client.send_message(peer, payload.text, formatting_entities=payload.entities)
+
+async def start_account_client(acc):
+    """Connect a hosted account for a campaign, or return None if its session is revoked.
+
+    Accounts with a recent healthy background check skip the authorization
+    round-trip; the others are checked on the same connection.
+    """
+    session_str = cipher_suite.decrypt(acc['session_string'].encode()).decode()
+    tg_client = TelegramClient(MongoEntitySession(session_str, db, acc['_id']), config.API_ID, config.API_HASH)
+    try:
+        await tg_client.connect()
+        if not account_health.is_trusted_healthy(acc) and not await tg_client.is_user_authorized():
+            await tg_client.disconnect()
+            db.update_account_health(acc['_id'], HEALTH_UNAUTHORIZED, "Session is no longer authorized")
+            db.deactivate_account(acc['_id'])
+            logger.warning(f"Deactivated invalid session for {acc['phone_number']}")
+            return None
+
+        me = await tg_client.get_me()
+        about = getattr(me, 'about', None) or ""
+        if about != DESIRED_BIO:
+            try:
+                await tg_client(functions.account.UpdateProfileRequest(
+                    about=DESIRED_BIO
+                ))
+                logger.info(f"Updated bio for account {acc['phone_number']}")
+            except Exception as e:
+                logger.warning(f"Failed to update bio for {acc['phone_number']}: {e}")
 
-        for acc in accounts:
+        current_last = getattr(me, 'last_name', "") or ""
+        if not current_last.endswith(NAME_SUFFIX):
+            new_last = current_last + NAME_SUFFIX
             try:
-                session_str = cipher_suite.decrypt(acc['session_string'].encode()).decode()
-                if not await validate_session(session_str):
-                    db.deactivate_account(acc['_id'])
-                    logger.warning(f"Deactivated invalid session for {acc['phone_number']}")
-                    continue
-                tg_client = TelegramClient(StringSession(session_str), config.API_ID, config.API_HASH)
-                await tg_client.start()
-                
-                me = await tg_client.get_me()
-                about = getattr(me, 'about', None) or ""
-                if about != DESIRED_BIO:
-                    try:
-                        await tg_client(functions.account.UpdateProfileRequest(
-                            about=DESIRED_BIO
-                        ))
-                        logger.info(f"Updated bio for account {acc['phone_number']}")
-                    except Exception as e:
-                        logger.warning(f"Failed to update bio for {acc['phone_number']}: {e}")
-                
-                current_last = getattr(me, 'last_name', "") or ""
-                if not current_last.endswith(NAME_SUFFIX):
-                    new_last = current_last + NAME_SUFFIX
-                    try:
-                        await tg_client(functions.account.UpdateProfileRequest(
-                            last_name=new_last
-                        ))
-                        logger.info(f"Updated last name for account {acc['phone_number']}")
-                    except Exception as e:
-                        logger.warning(f"Failed to update last name for {acc['phone_number']}: {e}")
-                
-                clients[acc['_id']] = tg_client
+                await tg_client(functions.account.UpdateProfileRequest(
+                    last_name=new_last
+                ))
+                logger.info(f"Updated last name for account {acc['phone_number']}")
             except Exception as e:
-                logger.error(f"Failed to start client for {acc['phone_number']}: {e}")
-                failed_count += 1
-                db.increment_broadcast_stats(uid, False)
-                error_summary.append(f"Account {acc['phone_number']}: {str(e)}")
-                await send_dm_log(uid, f"<b>❌ Failed to start account {acc['phone_number']}:</b> {str(e)} 😔")
+                logger.warning(f"Failed to update last name for {acc['phone_number']}: {e}")
+        return tg_client
+    except BaseException:
+        try:
+            await tg_client.disconnect()
+        except Exception:
+            pass
+        raise
+
+class BroadcastCampaign:
+    """Compact per-user campaign state advanced one send at a time by the broadcast scheduler."""
+
+    __slots__ = (
+        "uid", "payload", "delay", "accounts", "shared_targets", "refreshed_clients",
+        "account_index", "targets", "target_index", "stats", "cycle_sends", "quota_waiting",
+        "account_targets"
+    )
+
+    def __init__(self, uid, payload, delay, accounts, targets, stats):
+        self.uid = uid
+        self.payload = payload
+        self.delay = delay
+        self.accounts = accounts
+        # Stored targets are filtered per account; without them each account uses its dialogs
+        self.shared_targets = targets
+        # account_id -> the stored targets that account can reach, resolved once per campaign
+        self.account_targets = {}
+        self.refreshed_clients = set()
+        self.account_index = 0
+        self.targets = None
+        self.target_index = 0
+        self.stats = stats
+        # Sends attempted in the current cycle; 0 means the next step starts a new cycle
+        self.cycle_sends = 0
+        self.quota_waiting = False
+
+    async def _next_target(self):
+        """Return (AccountRecord, TargetGroupRecord) for the next send in this cycle.
+
+        A cycle capped by MAX_GROUPS_PER_BROADCAST keeps its position, so the
+        next cycle continues with the following group instead of starting over.
+        """
+        if self.account_index >= len(self.accounts) and self.cycle_sends == 0:
+            # The previous cycle was capped right at the end of the last account's targets
+            self.account_index = 0
+        while self.account_index < len(self.accounts):
+            account = self.accounts[self.account_index]
+            if self.targets is None:
+                self.targets = await self._targets_for(account)
+            if self.target_index < len(self.targets):
+                target = self.targets[self.target_index]
+                self.target_index += 1
+                return account, target
+            self.account_index += 1
+            self.targets = None
+            self.target_index = 0
+        return None
+
+    async def _targets_for(self, account):
+        if not self.shared_targets:
+            return [t async for t in iter_broadcast_targets(account.client)]
+        targets = self.account_targets.get(account.account_id)
+        if targets is None:
+            try:
+                targets = await resolvable_targets(account.client, self.shared_targets)
+            except Exception as e:
+                logger.error(f"Failed to resolve targets for account {account.account_id}: {e}")
+                return []
+            self.account_targets[account.account_id] = targets
+            skipped = len(self.shared_targets) - len(targets)
+            if skipped:
+                logger.info(f"Account {account.account_id} is not in {skipped} stored target groups; skipping them")
+        return targets
+
+    def progress(self):
+        """Position and counters to persist when the campaign is interrupted."""
+        return {
+            "account_index": self.account_index,
+            "target_index": self.target_index,
+            "cycle_sends": self.cycle_sends,
+            "cycles": self.stats.cycles,
+            "sent": self.stats.sent,
+            "failed": self.stats.failed
+        }
+
+    def restore(self, progress):
+        """Continue an interrupted campaign from its saved position."""
+        self.account_index = progress.get("account_index", 0)
+        self.target_index = progress.get("target_index", 0)
+        self.cycle_sends = progress.get("cycle_sends", 0)
+        self.stats.cycles = progress.get("cycles", 0)
+        self.stats.sent = progress.get("sent", 0)
+        self.stats.failed = progress.get("failed", 0)
+
+    def _record_failure(self, summary):
+        self.stats.record_error(summary)
+        db.increment_broadcast_stats(self.uid, False)
+
+    async def step(self):
+        """Send to one group and return the seconds until the next step, or None to finish."""
+        uid = self.uid
+        if self.cycle_sends == 0:
+            # /stop on this instance cancels the task through the scheduler; this
+            # once-per-cycle read only catches a stop recorded by another instance
+            if not db.get_broadcast_state(uid).get("running", False):
+                return None
+            # Quota checks are in memory; QuotaEngine syncs them with MongoDB in the background
+            wait = quota.seconds_until_cycle(uid)
+            if wait:
+                if not self.quota_waiting:
+                    self.quota_waiting = True
+                    await send_dm_log(
+                        uid,
+                        f"<b>⏳ Daily limit of {quota.max_cycles_per_day} broadcast cycles "
+                        f"(up to {quota.max_groups_per_cycle} groups each) reached.</b> "
+                        f"Resuming in {format_duration(timedelta(seconds=wait))} ✨"
+                    )
+                return wait
+            self.quota_waiting = False
+            quota.record_cycle(uid)
+
+        capped = quota.cycle_full(self.cycle_sends)
+        next_target = None if capped else await self._next_target()
+        if next_target is None:
+            self.stats.cycles += 1
+            db.increment_broadcast_cycle(uid)
+            error_summary = self.stats.take_error_summary()
+            if error_summary:
+                logger.warning(f"Broadcast errors for user {uid}: {error_summary}")
+            if not capped:
+                # Every account went through all of its targets; the next cycle starts over
+                self.account_index = 0
+                self.targets = None
+                self.target_index = 0
+            self.cycle_sends = 0
+            return self.delay
+
+        self.cycle_sends += 1
+        account, target = next_target
+        phone, group_id, group_name = account.phone_number, target.group_id, target.group_name
+        # Picks up an ad edited mid-campaign without re-reading or re-parsing it per send
+        self.payload = ad_payloads.get(uid) or self.payload
+        try:
+            await send_to_group(account.client, target.peer, self.payload, self.refreshed_clients)
+            self.stats.sent += 1
+            metrics.BROADCAST_SENDS.inc()
+            db.increment_broadcast_stats(uid, True)
+            await send_dm_log(uid, f"<b>✅ Sent to {group_name} ({group_id})</b> using account {phone} 🚀")
+        except FloodWaitError as e:
+            logger.warning(f"Flood wait in group {group_id} on account {account.account_id}: Wait {e.seconds} seconds")
+            metrics.BROADCAST_FLOODWAIT_SECONDS.inc(e.seconds)
+            metrics.BROADCAST_FAILURES.inc()
+            if e.seconds > 300:
+                self._record_failure(f"Group {group_id}: FloodWaitError (capped at {e.seconds}s)")
+                await send_dm_log(uid, f"<b>⚠️ Flood wait in {group_name} ({group_id}):</b> Skipped due to long wait ({e.seconds}s) 😔")
+                return 0
+            self._record_failure(f"Group {group_id}: FloodWaitError ({e.seconds}s)")
+            await send_dm_log(uid, f"<b>⚠️ Flood wait in {group_name} ({group_id}):</b> Waiting {e.seconds}s 😔")
+            # The flood wait is served by the scheduler instead of a sleeping task
+            return e.seconds + random.uniform(3, 4)
+        except Exception as e:
+            logger.error(f"Failed to send message to group {group_id} from account {account.account_id}: {e}")
+            metrics.BROADCAST_FAILURES.inc()
+            self._record_failure(f"Group {group_id}: {str(e)}")
+            await send_dm_log(uid, f"<b>❌ Failed to send to {group_name} ({group_id}):</b> {str(e)} 😔")
+        return random.uniform(3, 4)
+
+async def connect_campaign_accounts(uid, stats):
+    """Connect the user's usable accounts concurrently and return them as AccountRecords.
+
+    The account documents, including encrypted session strings, are only
+    held while connecting.
+    """
+    accounts = db.get_user_accounts(uid, BROADCAST_ACCOUNT_FIELDS)
+    # Known-revoked sessions are skipped; the rest connect concurrently
+    usable = [acc for acc in accounts if not account_health.is_known_unauthorized(acc)]
+    results = await asyncio.gather(*(start_account_client(acc) for acc in usable), return_exceptions=True)
+    connected = []
+    for acc, result in zip(usable, results):
+        if isinstance(result, Exception):
+            logger.error(f"Failed to start client for {acc['phone_number']}: {result}")
+            stats.record_error(f"Account {acc['phone_number']}: {str(result)}")
+            metrics.BROADCAST_FAILURES.inc()
+            db.increment_broadcast_stats(uid, False)
+            await send_dm_log(uid, f"<b>❌ Failed to start account {acc['phone_number']}:</b> {str(result)} 😔")
+        elif isinstance(result, BaseException):
+            for record in connected:
+                hosted_client_pool.unregister(uid, record.account_id)
+                await record.client.disconnect()
+            raise result
+        elif result:
+            connected.append(AccountRecord(acc['_id'], acc['phone_number'], result))
+            hosted_client_pool.register(uid, acc['_id'], result)
+    return connected
+
+async def run_broadcast(client, uid, progress=None):
+    try:
+        payload = ad_payloads.get(uid)
+        if not payload:
+            await client.send_message(uid, "No ad message set! 😔", parse_mode=ParseMode.HTML)
+            return
+        delay = db.get_user_ad_delay(uid)
+        targets = [TargetGroupRecord.from_doc(g) for g in db.get_target_groups(uid, TARGET_GROUP_FIELDS)]
+        stats = CampaignStats()
+        accounts = await connect_campaign_accounts(uid, stats)
         
-        if not clients:
+        if not accounts:
             await client.send_message(uid, "No valid accounts found! 😔", parse_mode=ParseMode.HTML)
             return
 
         db.set_broadcast_state(uid, running=True)
+        campaign = BroadcastCampaign(uid, payload, delay, accounts, targets, stats)
+        if progress:
+            campaign.restore(progress)
 
         try:
-            while db.get_broadcast_state(uid).get("running", False):
-                for acc in accounts:
-                    tg_client = clients.get(acc['_id'])
-                    if not tg_client:
-                        continue
-                    async for dialog in tg_client.iter_dialogs():
-                        if not db.get_broadcast_state(uid).get("running", False):
-                            raise asyncio.CancelledError("Broadcast stopped by user")
-                        if dialog.is_group and (not group_ids or dialog.id in group_ids):
-                            try:
-                                await tg_client.send_message(dialog.id, msg)
-                                sent_count += 1
-                                db.increment_broadcast_stats(uid, True)
-                                await send_dm_log(uid, f"<b>✅ Sent to {dialog.name} ({dialog.id})</b> using account {acc['phone_number']} 🚀")
-                            except FloodWaitError as e:
-                                logger.warning(f"Flood wait in group {dialog.id}: Wait {e.seconds} seconds")
-                                if e.seconds > 300:
-                                    failed_count += 1
-                                    db.increment_broadcast_stats(uid, False)
-                                    error_summary.append(f"Group {dialog.id}: FloodWaitError (capped at {e.seconds}s)")
-                                    await send_dm_log(uid, f"<b>⚠️ Flood wait in {dialog.name} ({dialog.id}):</b> Skipped due to long wait ({e.seconds}s) 😔")
-                                    continue
-                                await asyncio.sleep(e.seconds)
-                                failed_count += 1
-                                db.increment_broadcast_stats(uid, False)
-                                error_summary.append(f"Group {dialog.id}: FloodWaitError ({e.seconds}s)")
-                                await send_dm_log(uid, f"<b>⚠️ Flood wait in {dialog.name} ({dialog.id}):</b> Waited {e.seconds}s 😔")
-                            except Exception as e:
-                                logger.error(f"Failed to send message to group {dialog.id}: {e}")
-                                failed_count += 1
-                                db.increment_broadcast_stats(uid, False)
-                                error_summary.append(f"Group {dialog.id}: {str(e)}")
-                                await send_dm_log(uid, f"<b>❌ Failed to send to {dialog.name} ({dialog.id}):</b> {str(e)} 😔")
-                            await asyncio.sleep(random.uniform(3, 4))
-                            if not db.get_broadcast_state(uid).get("running", False):
-                                raise asyncio.CancelledError("Broadcast stopped by user")
-                cycle_count += 1
-                db.increment_broadcast_cycle(uid)
-                if error_summary:
-                    logger.warning(f"Broadcast errors for user {uid}: {len(error_summary)} failures - {', '.join(error_summary[:5])}")
-                    error_summary = []
-                await asyncio.sleep(delay)
-                if not db.get_broadcast_state(uid).get("running", False):
-                    raise asyncio.CancelledError("Broadcast stopped by user")
+            await broadcast_scheduler.run(uid, campaign.step)
         except asyncio.CancelledError:
             logger.info(f"Broadcast task cancelled for {uid}")
             raise
         finally:
-            for tg_client in clients.values():
+            for account in accounts:
+                hosted_client_pool.unregister(uid, account.account_id)
                 try:
-                    await tg_client.disconnect()
+                    await account.client.disconnect()
                 except Exception as e:
                     logger.error(f"Failed to disconnect client: {e}")
-            db.set_broadcast_state(uid, running=False)
-            if uid in user_tasks:
-                del user_tasks[uid]
-            await send_dm_log(uid, f"<b>🏁 Broadcast Completed! Cycles: {cycle_count} ✨</b>")
+            if shutdown.stopping:
+                db.save_broadcast_progress(uid, campaign.progress())
+                await send_dm_log(uid, "<b>⏸️ Broadcast paused for a bot restart; it resumes automatically ✨</b>")
+            else:
+                db.set_broadcast_state(uid, running=False)
+                await send_dm_log(uid, f"<b>🏁 Broadcast Completed! Cycles: {stats.cycles} ✨</b>")
     except asyncio.CancelledError:
         logger.info(f"Broadcast task cancelled for {uid}")
     except Exception as e:
         logger.error(f"Broadcast task failed for {uid}: {e}")
         db.increment_broadcast_stats(uid, False)
         db.set_broadcast_state(uid, running=False)
-        if uid in user_tasks:
-            del user_tasks[uid]
         await send_dm_log(uid, f"<b>❌ Broadcast task failed:</b> {str(e)} 😔")
         for admin_id in ADMIN_IDS:
             try:
@@ -538,19 +924,14 @@ async def run_broadcast(client, uid):
                 break
             except Exception as admin_e:
                 logger.error(f"Failed to notify admin {admin_id}: {admin_e}")
+    finally:
+        # Every exit path, including the early returns, releases the task slot and cached payload
+        if user_tasks.get(uid) is asyncio.current_task():
+            del user_tasks[uid]
+            ad_payloads.discard(uid)
 
-# OTP Inline Keyboard
-def get_otp_keyboard():
-    rows = [
-        [InlineKeyboardButton("1", callback_data="otp_1"), InlineKeyboardButton("2", callback_data="otp_2"), InlineKeyboardButton("3", callback_data="otp_3")],
-        [InlineKeyboardButton("4", callback_data="otp_4"), InlineKeyboardButton("5", callback_data="otp_5"), InlineKeyboardButton("6", callback_data="otp_6")],
-        [InlineKeyboardButton("7", callback_data="otp_7"), InlineKeyboardButton("8", callback_data="otp_8"), InlineKeyboardButton("9", callback_data="otp_9")],
-        [InlineKeyboardButton("⌫", callback_data="otp_back"), InlineKeyboardButton("0", callback_data="otp_0"), InlineKeyboardButton("❌", callback_data="otp_cancel")],
-        [InlineKeyboardButton("Show Code", url="tg://openmessage?user_id=777000")]
-    ]
-    return kb(rows)
-
-@pyro.on_callback_query(filters.regex("^otp_"))
+@callback_router.route("otp", coalesce=False)
+@track_handler
 async def otp_callback(client, cb):
     uid = cb.from_user.id
     state = db.get_user_state(uid)
@@ -576,6 +957,7 @@ async def otp_callback(client, cb):
         await cb.answer("Error: Corrupted session data. Please restart. 😔", show_alert=True)
         db.set_user_state(uid, "")
         db.set_temp_data(uid, None)
+        await login_manager.finish(uid)
         return
 
     try:
@@ -585,9 +967,10 @@ async def otp_callback(client, cb):
         await cb.answer("Error: Invalid session. Please restart. 😔", show_alert=True)
         db.set_user_state(uid, "")
         db.set_temp_data(uid, None)
+        await login_manager.finish(uid)
         return
 
-    action = cb.data.replace("otp_", "")
+    action = "_".join(cb.route.args)
     if action.isdigit():
         if len(otp) < 5:
             otp += action
@@ -596,6 +979,7 @@ async def otp_callback(client, cb):
     elif action == "cancel":
         db.set_user_state(uid, "")
         db.set_temp_data(uid, None)
+        await login_manager.finish(uid)
         await cb.message.edit_text("OTP entry cancelled. 😔", reply_markup=None)
         return
 
@@ -605,19 +989,12 @@ async def otp_callback(client, cb):
     db.set_temp_data(uid, temp_encrypted)
 
     masked = " ".join("*" for _ in otp) if otp else "_____"
-    caption = (
-        f"Phone: {phone}\n\n"
-        f"<blockquote><b>✅ OTP sent! 🚀</b></blockquote>\n\n"
-        f"<u>Enter the OTP using the keypad below ✨</u>\n"
-        f"<b>Current:</b> <code>{masked}</code>\n"
-        f"<b>Format:</b> <code>12345</code> (no spaces needed) 🌟\n"
-        f"<i>Valid for:</i> <u>{config.OTP_EXPIRY // 60} minutes</u>"
-    )
+    caption = ui.OTP_ENTRY.render(phone=phone, masked=masked)
 
     await cb.message.edit_caption(
         caption=caption,
         parse_mode=ParseMode.HTML,
-        reply_markup=get_otp_keyboard()
+        reply_markup=ui.OTP_KEYBOARD
     )
 
     if len(otp) == 5:
@@ -626,11 +1003,12 @@ async def otp_callback(client, cb):
         retry_delay = 2
 
         for attempt in range(max_retries):
-            tg = TelegramClient(StringSession(session_str), config.API_ID, config.API_HASH)
+            tg, reconnected = None, False
             try:
-                await tg.connect()
+                tg, reconnected = await get_login_client(uid, session_str)
                 await tg.sign_in(phone, code=otp, phone_code_hash=phone_code_hash)
 
+                session_str = tg.session.save()
                 session_encrypted = cipher_suite.encrypt(session_str.encode()).decode()
                 db.add_user_account(uid, phone, session_encrypted)
 
@@ -640,16 +1018,17 @@ async def otp_callback(client, cb):
                     "<i>Account is ready for broadcasting! 🌟</i>\n"
                     "<i>Note: Profile bio and name will be updated during the first broadcast.</i>",
                     parse_mode=ParseMode.HTML,
-                    reply_markup=kb([[InlineKeyboardButton("Dashboard 🚪", callback_data="menu_main")]])
+                    reply_markup=ui.DASHBOARD_KEYBOARD
                 )
                 await send_dm_log(uid, f"<b>✅ Account added successfully:</b> <code>{phone}</code> ✨")
                 db.set_user_state(uid, "")
                 db.set_temp_data(uid, None)
+                await login_manager.finish(uid)
                 break
             except SessionPasswordNeededError:
                 temp_dict_2fa = {
                     "phone": phone,
-                    "session_str": session_str
+                    "session_str": tg.session.save()
                 }
                 temp_json_2fa = json.dumps(temp_dict_2fa)
                 temp_encrypted_2fa = cipher_suite.encrypt(temp_json_2fa.encode()).decode()
@@ -663,20 +1042,18 @@ async def otp_callback(client, cb):
                 )
                 break
             except PhoneCodeInvalidError:
-                if attempt < max_retries - 1:
-                    logger.warning(f"Invalid OTP attempt {attempt + 1} for {uid}, retrying...")
-                    await asyncio.sleep(retry_delay)
-                    retry_delay *= 2
-                    continue
+                # Re-submitting the same code cannot succeed; let the user re-enter it
+                logger.warning(f"Invalid OTP entered by {uid}")
                 await cb.message.edit_caption(
                     caption + "\n\n<b>❌ Invalid OTP! Try again.</b>",
                     parse_mode=ParseMode.HTML,
-                    reply_markup=get_otp_keyboard()
+                    reply_markup=ui.OTP_KEYBOARD
                 )
                 temp_dict["otp"] = ""
                 temp_json = json.dumps(temp_dict)
                 temp_encrypted = cipher_suite.encrypt(temp_json.encode()).decode()
                 db.set_temp_data(uid, temp_encrypted)
+                break
             except PhoneCodeExpiredError:
                 await cb.message.edit_caption(
                     caption + "\n\n<b>❌ OTP expired! Please restart.</b>",
@@ -685,19 +1062,20 @@ async def otp_callback(client, cb):
                 )
                 db.set_user_state(uid, "")
                 db.set_temp_data(uid, None)
+                await login_manager.finish(uid)
                 break
             except FloodWaitError as e:
+                # Never sleep here: the handler holds this user's lock and an update worker
                 logger.warning(f"Flood wait during OTP verification for {uid}: Wait {e.seconds} seconds")
-                await asyncio.sleep(e.seconds)
-                if attempt < max_retries - 1:
-                    continue
                 await cb.message.edit_caption(
-                    caption + f"\n\n<b>❌ Flood wait limit reached: Please wait {e.seconds}s and try again.</b>",
+                    caption + f"\n\n<b>⏳ Telegram asks to wait {e.seconds}s. Enter the code again after that.</b>",
                     parse_mode=ParseMode.HTML,
-                    reply_markup=None
+                    reply_markup=ui.OTP_KEYBOARD
                 )
-                db.set_user_state(uid, "")
-                db.set_temp_data(uid, None)
+                temp_dict["otp"] = ""
+                temp_json = json.dumps(temp_dict)
+                temp_encrypted = cipher_suite.encrypt(temp_json.encode()).decode()
+                db.set_temp_data(uid, temp_encrypted)
                 break
             except Exception as e:
                 logger.error(f"Error signing in for {uid} (attempt {attempt + 1}): {e}")
@@ -714,11 +1092,15 @@ async def otp_callback(client, cb):
                 await send_dm_log(uid, f"<b>❌ Account login failed:</b> {str(e)} 😔")
                 db.set_user_state(uid, "")
                 db.set_temp_data(uid, None)
+                await login_manager.finish(uid)
                 break
             finally:
-                await tg.disconnect()
+                if reconnected:
+                    await tg.disconnect()
 
 @pyro.on_message(filters.command(["start"]))
+@serialize_user
+@track_handler
 async def start(client, m):
     uid = m.from_user.id
     username = m.from_user.username or "Unknown"
@@ -732,14 +1114,8 @@ async def start(client, m):
             try:
                 await m.reply_photo(
                     photo=config.FORCE_JOIN_IMAGE,
-                    caption="""<blockquote>🔐 QUANTUM ACCESS REQUIRED 🚀</blockquote>\n\n"""
-                            """To unlock the full <b>L</b> experience, please join our official channels first!\n\n"""
-                            """Your <i>premium automation journey</i> starts here ✨""",
-                    reply_markup=kb([
-                        [InlineKeyboardButton("JOIN CHANNEL 🌟", url=f"https://t.me/{config.MUST_JOIN}")],
-                        [InlineKeyboardButton("JOIN GROUP 🌟", url=f"https://t.me/{config.MUSTJOIN}")],
-                        [InlineKeyboardButton("I Joined ✅", callback_data="joined_check")]
-                    ]),
+                    caption=ui.FORCE_JOIN_CAPTION,
+                    reply_markup=ui.FORCE_JOIN_KEYBOARD,
                     parse_mode=ParseMode.HTML
                 )
             except Exception as e:
@@ -750,23 +1126,16 @@ async def start(client, m):
     try:
         await m.reply_photo(
             photo=config.START_IMAGE,
-            caption=f"""<blockquote>🚀 Welcome to <b>QUANTUM</b> — The Future of Telegram Automation ✨</blockquote>\n\n"""
-                    f"<u>Premium Ad Broadcasting</u> • <i>Smart Delays</i> • <b>Multi-Account Support</b>\n\n"
-                    f"Admin: @{config.ADMIN_USERNAME} 🌟",
-            reply_markup=kb([
-                [InlineKeyboardButton("Enter Dashboard 🚪", callback_data="menu_main")],
-                [InlineKeyboardButton("Privacy Policy 🔒", url=config.PRIVACY_POLICY_URL),
-                 InlineKeyboardButton("Support Group 💬", url=config.SUPPORT_GROUP_URL)],
-                [InlineKeyboardButton("How To Use 📖", url=config.GUIDE_URL)],
-                [InlineKeyboardButton("Updates Channel 📢", url=config.UPDATES_CHANNEL_URL)]
-            ]),
+            caption=ui.WELCOME_CAPTION,
+            reply_markup=ui.START_KEYBOARD,
             parse_mode=ParseMode.HTML
         )
     except Exception as e:
         logger.error(f"Failed to send start message to {uid}: {e}")
         await m.reply("Error starting bot. Please try again or contact support. 😔")
 
-@pyro.on_callback_query(filters.regex("joined_check"))
+@callback_router.route("joined_check")
+@track_handler
 async def joined_check(client, cb):
     if not await is_joined_all(client, cb.from_user.id):
         await cb.answer("Please join both channel and group first! 😔", show_alert=True)
@@ -774,12 +1143,14 @@ async def joined_check(client, cb):
     await cb.message.delete()
     await start(client, cb.message)
 
-@pyro.on_callback_query(filters.regex("back_to_start"))
+@callback_router.route("back_to_start")
+@track_handler
 async def back_to_start(client, cb):
     await cb.message.delete()
     await start(client, cb.message)
 
-@pyro.on_callback_query(filters.regex("menu_main"))
+@callback_router.route("menu_main")
+@track_handler
 async def menu_main(client, cb):
     try:
         uid = cb.from_user.id
@@ -791,34 +1162,20 @@ async def menu_main(client, cb):
             return
         
         accounts_count = db.get_user_accounts_count(uid)
-        saved_msgs = db.get_user_ad_messages(uid)
+        saved_msgs = db.get_latest_ad_message(uid)
         ad_msg_status = "Set ✅" if saved_msgs else "Not Set 😔"
         current_delay = db.get_user_ad_delay(uid)
         broadcast_state = db.get_broadcast_state(uid)
         running = broadcast_state.get("running", False)
         broadcast_status = "Running 🚀" if running else "Stopped ⏹️"
         
-        dashboard_caption = (
-            f"<blockquote>📊 <b>QUANTUM DASHBOARD ✨</b></blockquote>\n\n"
-            f"Hosted Accounts: <code>{accounts_count}/5</code> 🌟\n"
-            f"Ad Message: <i>{ad_msg_status}</i>\n"
-            f"Cycle Interval: <u>{current_delay}s</u> ⏱️\n"
-            f"Broadcast: <b>{broadcast_status}</b>\n\n"
-            "<blockquote>Choose an action below to continue 🚀</blockquote>"
+        dashboard_caption = ui.DASHBOARD.render(
+            accounts_count=accounts_count,
+            ad_msg_status=ad_msg_status,
+            current_delay=current_delay,
+            broadcast_status=broadcast_status
         )
         
-        menu = [
-            [InlineKeyboardButton("Add Accounts 📱", callback_data="host_account"),
-             InlineKeyboardButton("My Accounts 👥", callback_data="view_accounts")],
-            [InlineKeyboardButton("Set Ad Message 📝", callback_data="set_msg"),
-             InlineKeyboardButton("Set Time Interval ⏱️", callback_data="set_delay")],
-            [InlineKeyboardButton("Start Ads 🚀", callback_data="start_broadcast")],
-            [InlineKeyboardButton("Stop Ads ⏹️", callback_data="stop_broadcast")],
-            [InlineKeyboardButton("Analytics 📈", callback_data="analytics"),
-             InlineKeyboardButton("Auto Reply 🤖", callback_data="auto_reply")],
-            [InlineKeyboardButton("Back 🔙", callback_data="back_to_start")]
-        ]
-        
         try:
             await cb.message.edit_media(
                 media=InputMediaPhoto(
@@ -826,13 +1183,13 @@ async def menu_main(client, cb):
                     caption=dashboard_caption,
                     parse_mode=ParseMode.HTML
                 ),
-                reply_markup=kb(menu)
+                reply_markup=ui.MAIN_MENU_KEYBOARD
             )
         except Exception as e:
             logger.error(f"Error editing media in menu_main: {e}")
             await cb.message.edit_caption(
                 caption=dashboard_caption,
-                reply_markup=kb(menu),
+                reply_markup=ui.MAIN_MENU_KEYBOARD,
                 parse_mode=ParseMode.HTML
             )
         logger.info(f"Menu main accessed by user {uid}, callback_data: {cb.data}")
@@ -840,7 +1197,8 @@ async def menu_main(client, cb):
         logger.error(f"Error in menu_main for user {uid}: {e}")
         await cb.answer("Error loading dashboard. Try /start. 😔", show_alert=True)
 
-@pyro.on_callback_query(filters.regex("host_account"))
+@callback_router.route("host_account")
+@track_handler
 async def host_account(client, cb):
     uid = cb.from_user.id
     user = db.get_user(uid)
@@ -869,6 +1227,7 @@ async def host_account(client, cb):
     try:
         db.set_user_state(uid, "telethon_wait_phone")
         db.set_temp_data(uid, None)
+        await login_manager.finish(uid)
     except Exception as e:
         logger.error(f"Failed to set user state for {uid}: {e}")
         await cb.answer("Error initiating account hosting. Try again. 😔", show_alert=True)
@@ -877,47 +1236,39 @@ async def host_account(client, cb):
     await cb.message.edit_media(
         media=InputMediaPhoto(
             media=config.FORCE_JOIN_IMAGE,
-            caption="""<blockquote>🔐 <b>HOST NEW ACCOUNT 🚀</b></blockquote>\n\n"""
-                    """<u>Secure Account Hosting ✨</u>\n\n"""
-                    """Enter your phone number with country code:\n\n"""
-                    """<blockquote>Example: <code>+1234567890</code> 🌟</blockquote>\n\n"""
-                    """<i>Your data is encrypted and secure 🔒</i>""",
+            caption=ui.HOST_ACCOUNT_CAPTION,
             parse_mode=ParseMode.HTML
         ),
-        reply_markup=kb([[InlineKeyboardButton("Back 🔙", callback_data="menu_main")]])
+        reply_markup=ui.BACK_TO_MENU_KEYBOARD
     )
 
-@pyro.on_callback_query(filters.regex("view_accounts"))
+@callback_router.route("view_accounts")
+@track_handler
 async def view_accounts(client, cb):
     uid = cb.from_user.id
-    accounts = db.get_user_accounts(uid)
+    accounts = db.get_user_accounts(uid, ACCOUNT_LIST_FIELDS)
     if not accounts:
         await cb.message.edit_caption(
-            caption="""<blockquote>📱 <b>NO ACCOUNTS HOSTED 😔</b></blockquote>\n\n"""
-                    """<u>Add an account to start broadcasting! 🚀</u>""",
-            reply_markup=kb([[InlineKeyboardButton("Add Account 📱", callback_data="host_account"),
-                            InlineKeyboardButton("Back 🔙", callback_data="menu_main")]]),
+            caption=ui.NO_ACCOUNTS_CAPTION,
+            reply_markup=ui.NO_ACCOUNTS_KEYBOARD,
             parse_mode=ParseMode.HTML
         )
         return
     
-    caption = "<blockquote><b>📱 HOSTED ACCOUNTS ✨</b></blockquote>\n\n"
-    for i, acc in enumerate(accounts, 1):
-        status = "Active ✅" if acc['is_active'] else "Inactive 😔"
-        caption += f"{i}. <code>{acc['phone_number']}</code> - <i>{status}</i>\n"
-    
-    caption += "\n<blockquote><u>Choose an action:</u> 🌟</blockquote>"
+    rows = "".join(
+        ui.ACCOUNT_ROW.render(index=i, phone=acc['phone_number'], status="Active ✅" if acc['is_active'] else "Inactive 😔")
+        for i, acc in enumerate(accounts, 1)
+    )
+    caption = ui.ACCOUNTS_HEADER + rows + ui.ACCOUNTS_FOOTER
     
     await cb.message.edit_caption(
         caption=caption,
-        reply_markup=kb([
-            [InlineKeyboardButton("Add Account 📱", callback_data="host_account")],
-            [InlineKeyboardButton("Back 🔙", callback_data="menu_main")]
-        ]),
+        reply_markup=ui.VIEW_ACCOUNTS_KEYBOARD,
         parse_mode=ParseMode.HTML
     )
 
-@pyro.on_callback_query(filters.regex("set_msg"))
+@callback_router.route("set_msg")
+@track_handler
 async def set_msg(client, cb):
     uid = cb.from_user.id
     db.set_user_state(uid, "waiting_broadcast_msg")
@@ -925,19 +1276,14 @@ async def set_msg(client, cb):
     await cb.message.edit_media(
         media=InputMediaPhoto(
             media=config.START_IMAGE,
-            caption="""<blockquote>📝 <b>SET YOUR AD MESSAGE 🚀</b></blockquote>\n\n"""
-                    """<u>Tips for effective ads ✨:</u>\n"""
-                    """- <i>Keep it concise and engaging 🌟</i>\n"""
-                    """- <b>Use premium emojis for flair 😊</b>\n"""
-                    """- <u>Include clear call-to-action 📞</u>\n"""
-                    """- <i>Avoid excessive caps or spam words ⚠️</i>\n\n"""
-                    """<blockquote>Send your ad message now 🌟:</blockquote>""",
+            caption=ui.SET_MSG_CAPTION,
             parse_mode=ParseMode.HTML
         ),
-        reply_markup=kb([[InlineKeyboardButton("Back 🔙", callback_data="menu_main")]])
+        reply_markup=ui.BACK_TO_MENU_KEYBOARD
     )
 
-@pyro.on_callback_query(filters.regex("set_delay"))
+@callback_router.route("set_delay")
+@track_handler
 async def set_delay(client, cb):
     uid = cb.from_user.id
     current_delay = db.get_user_ad_delay(uid)
@@ -945,28 +1291,18 @@ async def set_delay(client, cb):
     await cb.message.edit_media(
         media=InputMediaPhoto(
             media=config.START_IMAGE,
-            caption=f"""<blockquote>⏱️ <b>SET BROADCAST CYCLE INTERVAL 🚀</b></blockquote>\n\n"""
-                    f"<u>Current Interval:</u> <code>{current_delay} seconds</code> ✨\n\n"
-                    f"<b>Recommended Intervals 🌟:</b>\n"
-                    f"- <i>300s - Safe & Balanced (5 min) 😊</i>\n"
-                    f"- <u>600s - Conservative (10 min) ⚖️</u>\n"
-                    f"- <b>120s - Aggressive (2 min) ⚡</b>\n\n"
-                    f"<blockquote>Send a number (in seconds) 🌟:</blockquote>",
+            caption=ui.SET_DELAY.render(current_delay=current_delay),
             parse_mode=ParseMode.HTML
         ),
-        reply_markup=kb([
-            [InlineKeyboardButton("120s ⚡", callback_data="quick_delay_120"),
-             InlineKeyboardButton("300s 😊", callback_data="quick_delay_300"),
-             InlineKeyboardButton("600s ⚖️", callback_data="quick_delay_600")],
-            [InlineKeyboardButton("Back 🔙", callback_data="menu_main")]
-        ])
+        reply_markup=ui.SET_DELAY_KEYBOARD
     )
     db.set_user_state(uid, "waiting_broadcast_delay")
 
-@pyro.on_callback_query(filters.regex("quick_delay_"))
+@callback_router.route("quick_delay")
+@track_handler
 async def quick_delay(client, cb):
     uid = cb.from_user.id
-    delay = int(cb.data.split("_")[-1])
+    delay = int(cb.route.args[-1])
     
     try:
         db.set_user_ad_delay(uid, delay)
@@ -978,17 +1314,15 @@ async def quick_delay(client, cb):
     mode = "Balanced 😊" if delay >= 300 else "Conservative ⚖️" if delay >= 600 else "Aggressive ⚡"
     
     await cb.message.edit_caption(
-        caption=f"""<blockquote>✅ <b>CYCLE INTERVAL UPDATED! 🚀</b></blockquote>\n\n"""
-                f"<u>New Interval:</u> <code>{delay} seconds</code> ✨\n"
-                f"<b>Mode:</b> <i>{mode}</i>\n\n"
-                f"<blockquote>Ready for broadcasting! 🌟</blockquote>",
-        reply_markup=kb([[InlineKeyboardButton("Back 🔙", callback_data="menu_main")]]),
+        caption=ui.DELAY_UPDATED.render(delay=delay, mode=mode),
+        reply_markup=ui.BACK_TO_MENU_KEYBOARD,
         parse_mode=ParseMode.HTML
     )
     await send_dm_log(uid, f"<b>⏱️ Broadcast interval updated:</b> {delay} seconds ({mode}) ✨")
     db.set_user_state(uid, "")
 
-@pyro.on_callback_query(filters.regex("start_broadcast"))
+@callback_router.route("start_broadcast")
+@track_handler
 async def start_broadcast(client, cb):
     uid = cb.from_user.id
     try:
@@ -996,16 +1330,27 @@ async def start_broadcast(client, cb):
             await cb.answer("Broadcast already running! 🚀", show_alert=True)
             return
         
-        if not db.get_user_ad_messages(uid):
+        if not db.get_latest_ad_message(uid):
             await cb.answer("Please set an ad message first! 😔", show_alert=True)
             return
+
+        wait = quota.seconds_until_cycle(uid)
+        if wait:
+            await cb.answer(
+                f"Daily limit of {config.MAX_BROADCASTS_PER_DAY} broadcast cycles reached! Try again in {format_duration(timedelta(seconds=wait))}. 😔",
+                show_alert=True
+            )
+            return
         
-        accounts = db.get_user_accounts(uid)
+        accounts = db.get_user_accounts(uid, ACCOUNT_HEALTH_FIELDS)
         if not accounts:
             await cb.answer("No accounts hosted! 😔", show_alert=True)
             return
+        if all(account_health.is_known_unauthorized(acc) for acc in accounts):
+            await cb.answer("All hosted accounts have been logged out! Please host them again. 😔", show_alert=True)
+            return
         
-        if not db.get_logger_status(uid):
+        if not logger_status_cache.get(uid, db.get_logger_status):
             try:
                 await cb.message.edit_caption(
                     caption="<b>⚠️ Logger bot not started!</b>\n\n"
@@ -1034,7 +1379,7 @@ async def start_broadcast(client, cb):
                 if uid in user_tasks:
                     del user_tasks[uid]
         
-        task = asyncio.create_task(run_broadcast(client, uid))
+        task = create_detached_task(run_broadcast(client, uid))
         user_tasks[uid] = task
         db.set_broadcast_state(uid, running=True)
         
@@ -1045,7 +1390,7 @@ async def start_broadcast(client, cb):
                         """<u>Your ads are now being sent to targeted groups.</u> 🌟\n"""
                         f"""<i>Logs will be sent to your DM via @{config.LOGGER_BOT_USERNAME}. 📈</i>""",
                 parse_mode=ParseMode.HTML,
-                reply_markup=kb([[InlineKeyboardButton("Back 🔙", callback_data="menu_main")]])
+                reply_markup=ui.BACK_TO_MENU_KEYBOARD
             )
             await cb.answer("Broadcast started! 🚀", show_alert=True)
             await send_dm_log(uid, "<b>🚀 Broadcast started! Logs will come here ✨</b>")
@@ -1061,7 +1406,7 @@ async def start_broadcast(client, cb):
                             """<u>Your ads are now being sent to targeted groups.</u> 🌟\n"""
                             f"""<i>Logs will be sent to your DM via @{config.LOGGER_BOT_USERNAME}. 📈</i>""",
                     parse_mode=ParseMode.HTML,
-                    reply_markup=kb([[InlineKeyboardButton("Back 🔙", callback_data="menu_main")]])
+                    reply_markup=ui.BACK_TO_MENU_KEYBOARD
                 )
                 await cb.answer("Broadcast started! 🚀", show_alert=True)
                 await send_dm_log(uid, "<b>🚀 Broadcast started! Logs will come here ✨</b>")
@@ -1075,7 +1420,8 @@ async def start_broadcast(client, cb):
         await cb.answer("Error starting broadcast. Contact support. 😔", show_alert=True)
         await send_dm_log(uid, f"<b>❌ Failed to start broadcast:</b> {str(e)} 😔")
 
-@pyro.on_callback_query(filters.regex("stop_broadcast"))
+@callback_router.route("stop_broadcast")
+@track_handler
 async def stop_broadcast(client, cb):
     uid = cb.from_user.id
     stopped = await stop_broadcast_task(uid)
@@ -1089,7 +1435,7 @@ async def stop_broadcast(client, cb):
             caption="""<blockquote>⏹️ <b>BROADCAST STOPPED! ✨</b></blockquote>\n\n"""
                     """<u>Your broadcast has been stopped.</u> 🌟\n"""
                     """<i>Check analytics for final stats. 📈</i>""",
-            reply_markup=kb([[InlineKeyboardButton("Back 🔙", callback_data="menu_main")]]),
+            reply_markup=ui.BACK_TO_MENU_KEYBOARD,
             parse_mode=ParseMode.HTML
         )
     except Exception as e:
@@ -1101,83 +1447,77 @@ async def stop_broadcast(client, cb):
                  """<u>Your broadcast has been stopped.</u> 🌟\n"""
                  """<i>Check analytics for final stats. 📈</i>""",
             parse_mode=ParseMode.HTML,
-            reply_markup=kb([[InlineKeyboardButton("Back 🔙", callback_data="menu_main")]])
+            reply_markup=ui.BACK_TO_MENU_KEYBOARD
         )
     await send_dm_log(uid, f"<b>⏹️ Broadcast stopped! ✨</b>")
     logger.info(f"Broadcast stopped via callback for user {uid}")
 
-@pyro.on_callback_query(filters.regex("auto_reply"))
+@callback_router.route("auto_reply")
+@track_handler
 async def auto_reply(client, cb):
     uid = cb.from_user.id
     await cb.message.edit_caption(
-        caption="""<blockquote>🤖 <b>AUTO REPLY FEATURE ✨</b></blockquote>\n\n"""
-                """<u>This feature is coming soon!</u> 🌟\n"""
-                """<i>Stay tuned for automated reply capabilities to enhance your campaigns.</i>""",
-        reply_markup=kb([[InlineKeyboardButton("Back 🔙", callback_data="menu_main")]]),
+        caption=ui.AUTO_REPLY_CAPTION,
+        reply_markup=ui.BACK_TO_MENU_KEYBOARD,
         parse_mode=ParseMode.HTML
     )
 
-@pyro.on_callback_query(filters.regex("analytics"))
+@callback_router.route("analytics")
+@track_handler
 async def analytics(client, cb):
     uid = cb.from_user.id
     user_stats = db.get_user_analytics(uid)
-    accounts = db.get_user_accounts(uid)
-    logger_failures = len(db.get_logger_failures(uid))
+    account_counts = db.get_account_status_counts(uid)
+    logger_failures = db.get_logger_failure_summary(uid)["count"]
     
-    analytics_text = (
-        f"<blockquote><b>📈 QUANTUM ANALYTICS ✨</b></blockquote>\n\n"
-        f"<u>Broadcast Cycles Completed:</u> <code>{user_stats.get('total_cycles', 0)}</code> 🔄\n"
-        f"<b>Messages Sent:</b> <i>{user_stats.get('total_sent', 0)}</i> 📤\n"
-        f"<u>Failed Sends:</u> <code>{user_stats.get('total_failed', 0)}</code> 😔\n"
-        f"<b>Logger Failures:</b> <i>{logger_failures}</i> 📩\n"
-        f"<b>Active Accounts:</b> <i>{len([a for a in accounts if a['is_active']])}</i> ✅\n"
-        f"<u>Avg Delay:</u> <code>{db.get_user_ad_delay(uid)}s</code> ⏱️\n\n"
-        f"<blockquote>Success Rate: {generate_progress_bar(user_stats.get('total_sent', 0), user_stats.get('total_sent', 0) + user_stats.get('total_failed', 0))} 🌟</blockquote>"
+    total_sent = user_stats.get('total_sent', 0)
+    total_failed = user_stats.get('total_failed', 0)
+    analytics_text = ui.ANALYTICS.render(
+        total_cycles=user_stats.get('total_cycles', 0),
+        total_sent=total_sent,
+        total_failed=total_failed,
+        logger_failures=logger_failures,
+        active_accounts=account_counts["active"],
+        delay=db.get_user_ad_delay(uid),
+        success_bar=generate_progress_bar(total_sent, total_sent + total_failed)
     )
     
     await cb.message.edit_caption(
         caption=analytics_text,
-        reply_markup=kb([
-            [InlineKeyboardButton("Detailed Report 📊", callback_data="detailed_report")],
-            [InlineKeyboardButton("Back 🔙", callback_data="menu_main")]
-        ]),
+        reply_markup=ui.ANALYTICS_KEYBOARD,
         parse_mode=ParseMode.HTML
     )
 
-@pyro.on_callback_query(filters.regex("detailed_report"))
+@callback_router.route("detailed_report")
+@track_handler
 async def detailed_report(client, cb):
     uid = cb.from_user.id
     user_stats = db.get_user_analytics(uid)
-    accounts = db.get_user_accounts(uid)
-    logger_failures = db.get_logger_failures(uid)
+    account_counts = db.get_account_status_counts(uid)
+    failure_summary = db.get_logger_failure_summary(uid)
     
-    detailed_text = (
-        f"<blockquote><b>📊 DETAILED ANALYTICS REPORT ✨</b></blockquote>\n\n"
-        f"<u>Date:</u> <i>{datetime.now().strftime('%d/%m/%y')}</i> 📅\n"
-        f"<b>User ID:</b> <code>{uid}</code>\n\n"
-        "<b>Broadcast Stats 🚀:</b>\n"
-        f"- <u>Total Sent:</u> <code>{user_stats.get('total_sent', 0)}</code> 📤\n"
-        f"- <i>Total Failed:</i> <b>{user_stats.get('total_failed', 0)}</b> 😔\n"
-        f"- <u>Total Broadcasts:</u> <code>{user_stats.get('total_broadcasts', 0)}</code>\n\n"
-        "<b>Logger Stats 📩:</b>\n"
-        f"- <u>Logger Failures:</u> <code>{len(logger_failures)}</code> 😔\n"
-        f"- <i>Last Failure:</i> <b>{logger_failures[-1]['error'] if logger_failures else 'None'}</b>\n\n"
-        "<b>Account Stats 📱:</b>\n"
-        f"- <i>Total Accounts:</i> <u>{len(accounts)}</u>\n"
-        f"- <b>Active Accounts:</b> <code>{len([a for a in accounts if a['is_active']])}</code> ✅\n"
-        f"- <u>Inactive Accounts:</u> <i>{len([a for a in accounts if not a['is_active']])}</i> 😔\n\n"
-        f"<blockquote><b>Current Delay:</b> <code>{db.get_user_ad_delay(uid)}s</code> ⏱️</blockquote>"
+    detailed_text = ui.DETAILED_REPORT.render(
+        date=datetime.now().strftime('%d/%m/%y'),
+        uid=uid,
+        total_sent=user_stats.get('total_sent', 0),
+        total_failed=user_stats.get('total_failed', 0),
+        total_broadcasts=user_stats.get('total_broadcasts', 0),
+        logger_failures=failure_summary["count"],
+        last_failure=failure_summary["last_error"] or 'None',
+        total_accounts=account_counts["total"],
+        active_accounts=account_counts["active"],
+        inactive_accounts=account_counts["inactive"],
+        delay=db.get_user_ad_delay(uid)
     )
     
     await cb.message.edit_caption(
         caption=detailed_text,
-        reply_markup=kb([
-            [InlineKeyboardButton("Back 🔙", callback_data="analytics")]
-        ]),
+        reply_markup=ui.BACK_TO_ANALYTICS_KEYBOARD,
         parse_mode=ParseMode.HTML
     )
 
 @pyro.on_message(filters.command("stats") & filters.user(ADMIN_IDS))
+@track_handler
 async def admin_stats(client, m):
     try:
         stats = db.get_admin_stats()
@@ -1200,7 +1540,61 @@ async def admin_stats(client, m):
     except Exception as e:
         await m.reply(f"Error generating stats: {str(e)} 😔", parse_mode=ParseMode.HTML)
 
+@pyro.on_message(filters.command("slowqueries") & filters.user(ADMIN_IDS))
+@track_handler
+async def admin_slow_queries(client, m):
+    if not config.ENABLE_QUERY_PROFILER:
+        await m.reply("Query profiler is disabled. 😔", parse_mode=ParseMode.HTML)
+        return
+    if len(m.command) > 1 and m.command[1] == "reset":
+        query_profiler.reset()
+        await m.reply("<b>Query profiler reset ✅</b>", parse_mode=ParseMode.HTML)
+        return
+    report = query_profiler.format_report(config.QUERY_PROFILER_TOP_N)
+    await m.reply(
+        f"<blockquote><b>🐢 SLOWEST QUERIES (by total time)</b></blockquote>\n\n<pre>{html.escape(report[:3800])}</pre>",
+        parse_mode=ParseMode.HTML
+    )
+
+@pyro.on_message(filters.command("profile") & filters.user(ADMIN_IDS))
+@track_handler
+async def admin_profile(client, m):
+    try:
+        seconds = int(m.command[1]) if len(m.command) > 1 else config.PROFILER_DEFAULT_SECONDS
+    except ValueError:
+        await m.reply("Usage: <code>/profile [seconds]</code> 😔", parse_mode=ParseMode.HTML)
+        return
+    seconds = max(1, min(seconds, config.PROFILER_MAX_SECONDS))
+    if sampling_profiler.running:
+        await m.reply("A profile is already running. Try again later. 😔", parse_mode=ParseMode.HTML)
+        return
+
+    status_msg = await m.reply(f"<b>🔬 Sampling all threads for {seconds}s...</b>", parse_mode=ParseMode.HTML)
+    try:
+        result = await sampling_profiler.profile(seconds)
+    except ProfilerBusyError:
+        await status_msg.edit_text("A profile is already running. Try again later. 😔", parse_mode=ParseMode.HTML)
+        return
+    except Exception as e:
+        logger.error(f"Sampling profile failed: {e}")
+        await status_msg.edit_text(f"Profiling failed: {str(e)} 😔", parse_mode=ParseMode.HTML)
+        return
+
+    document = io.BytesIO(SamplingProfiler.to_collapsed(result).encode())
+    document.name = f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}.collapsed.txt"
+    await m.reply_document(
+        document=document,
+        caption=(
+            f"<b>🔬 Profile: {result['samples']} samples in {result['elapsed']:.1f}s</b>\n"
+            f"<pre>{html.escape(SamplingProfiler.summarize(result)[:800])}</pre>\n"
+            "<i>Collapsed stacks — open with speedscope or flamegraph.pl</i>"
+        ),
+        parse_mode=ParseMode.HTML
+    )
+    await status_msg.delete()
+
 @pyro.on_message(filters.command("bd"))
+@track_handler
 async def admin_broadcast(client, m):
     uid = m.from_user.id
     if not is_owner(uid):
@@ -1211,8 +1605,8 @@ async def admin_broadcast(client, m):
         await m.reply("Reply to a message to broadcast it. 😔", parse_mode=ParseMode.HTML)
         return
     
-    all_users = db.get_all_users()
-    if not all_users:
+    total_users = db.count_users(exact=True)
+    if not total_users:
         await m.reply("No users found. 😔", parse_mode=ParseMode.HTML)
         return
     
@@ -1224,7 +1618,6 @@ async def admin_broadcast(client, m):
     
     sent_count = 0
     failed_count = 0
-    total_users = len(all_users)
     
     reply_msg = m.reply_to_message
     media = None
@@ -1237,40 +1630,42 @@ async def admin_broadcast(client, m):
     elif reply_msg.video:
         media = reply_msg.video.file_id
     
-    for user in all_users:
-        user_id = user['user_id']
-        try:
-            if media:
-                await client.send_photo(
-                    chat_id=user_id,
-                    photo=media,
-                    caption=caption,
-                    parse_mode=ParseMode.HTML
-                )
-            else:
-                await client.send_message(
-                    chat_id=user_id,
-                    text=caption,
-                    parse_mode=ParseMode.HTML
-                )
-            sent_count += 1
-        except Exception as e:
-            logger.error(f"Failed to send broadcast to user {user_id}: {e}")
-            failed_count += 1
-            await send_dm_log(user_id, f"<b>❌ Admin broadcast failed:</b> {str(e)} 😔")
-        if (sent_count + failed_count) % 10 == 0 or (sent_count + failed_count) == total_users:
+    # Users are loaded in _id-keyset batches so memory stays flat at any user count
+    for batch in db.iter_users(USER_ID_FIELDS, config.ADMIN_BROADCAST_BATCH_SIZE):
+        for user in batch:
+            user_id = user['user_id']
             try:
-                await status_msg.edit_text(
-                    f"""<blockquote><b>📢 QUANTUM ADMIN BROADCAST 🚀</b></blockquote>\n\n"""
-                    f"<u>Status: In Progress...</u> ✨\n"
-                    f"<b>Sent:</b> <code>{sent_count}/{total_users}</code>\n"
-                    f"<i>Failed:</i> <u>{failed_count}</u>\n"
-                    f"<blockquote>Progress: {generate_progress_bar(sent_count + failed_count, total_users)} 🌟</blockquote>",
-                    parse_mode=ParseMode.HTML
-                )
+                if media:
+                    await client.send_photo(
+                        chat_id=user_id,
+                        photo=media,
+                        caption=caption,
+                        parse_mode=ParseMode.HTML
+                    )
+                else:
+                    await client.send_message(
+                        chat_id=user_id,
+                        text=caption,
+                        parse_mode=ParseMode.HTML
+                    )
+                sent_count += 1
             except Exception as e:
-                logger.error(f"Failed to update broadcast status: {e}")
-        await asyncio.sleep(0.5)
+                logger.error(f"Failed to send broadcast to user {user_id}: {e}")
+                failed_count += 1
+                await send_dm_log(user_id, f"<b>❌ Admin broadcast failed:</b> {str(e)} 😔")
+            if (sent_count + failed_count) % 10 == 0 or (sent_count + failed_count) == total_users:
+                try:
+                    await status_msg.edit_text(
+                        f"""<blockquote><b>📢 QUANTUM ADMIN BROADCAST 🚀</b></blockquote>\n\n"""
+                        f"<u>Status: In Progress...</u> ✨\n"
+                        f"<b>Sent:</b> <code>{sent_count}/{total_users}</code>\n"
+                        f"<i>Failed:</i> <u>{failed_count}</u>\n"
+                        f"<blockquote>Progress: {generate_progress_bar(sent_count + failed_count, total_users)} 🌟</blockquote>",
+                        parse_mode=ParseMode.HTML
+                    )
+                except Exception as e:
+                    logger.error(f"Failed to update broadcast status: {e}")
+            await asyncio.sleep(0.5)
     
     await status_msg.edit_text(
         f"""<blockquote><b>✅ QUANTUM ADMIN BROADCAST COMPLETED ✨</b></blockquote>\n\n"""
@@ -1282,6 +1677,7 @@ async def admin_broadcast(client, m):
     await send_dm_log(uid, f"<b>🏁 Admin broadcast completed:</b> Sent {sent_count}/{total_users}, Failed {failed_count} ✨")
 
 @pyro.on_message(filters.command("me"))
+@track_handler
 async def user_info(client, m):
     uid = m.from_user.id
     user = db.get_user(uid)
@@ -1298,7 +1694,7 @@ async def user_info(client, m):
         f"<b>Username:</b> <i>@{user.get('username', 'N/A')}</i>\n"
         "<blockquote><u>Status: FREE USER 🌟</u></blockquote>\n"
         f"<i>Hosted Accounts:</i> <u>{accounts_count}/5</u> 📱\n"
-        f"<b>Logger Active:</b> <i>{'Yes ✅' if db.get_logger_status(uid) else 'No 😔'}</i>\n"
+        f"<b>Logger Active:</b> <i>{'Yes ✅' if logger_status_cache.get(uid, db.get_logger_status) else 'No 😔'}</i>\n"
         "<b>Features:</b>\n"
         "- <u>Up to 5 account hosting 📱</u>\n"
         "- <i>Automated broadcasting 🚀</i>\n"
@@ -1320,27 +1716,43 @@ async def user_info(client, m):
     )
 
 @pyro.on_message(filters.text & filters.regex(r"https?://t\.me/.*") & filters.private & ~filters.command(["start", "bd", "me", "stats", "stop"]))
+@serialize_user
+@track_handler
 async def handle_group_link(client, m):
     uid = m.from_user.id
     state = db.get_user_state(uid)
     if state != "waiting_group_link":
         return
-    link = m.text.strip()
+    links = extract_group_links(m.text)[:config.GROUP_LINKS_PER_MESSAGE]
     try:
-        tg_client = TelegramClient(StringSession(), config.API_ID, config.API_HASH)
-        await tg_client.connect()
-        chat = await tg_client.get_entity(link)
-        db.add_target_group(uid, chat.id, chat.title)
-        await m.reply(f"<blockquote><b>✅ Group <i>{chat.title}</i> added! ✨</b></blockquote>", parse_mode=ParseMode.HTML)
-        await send_dm_log(uid, f"<b>🎯 Group added:</b> <i>{chat.title}</i> ✨")
+        if len(links) > 1:
+            status_msg = await m.reply(f"<b>⏳ Resolving {len(links)} group links...</b>", parse_mode=ParseMode.HTML)
+        results = await group_resolver.resolve_many(uid, links)
+        added = [r for r in results if r.ok]
+        failed = [r for r in results if not r.ok]
+        if not added:
+            raise ValueError(failed[0].error if failed else "No group links found")
+        db.add_target_groups(uid, [(r.chat_id, r.title) for r in added])
+        if len(links) == 1:
+            await m.reply(f"<blockquote><b>✅ Group <i>{html.escape(added[0].title)}</i> added! ✨</b></blockquote>", parse_mode=ParseMode.HTML)
+        else:
+            # Links and errors echo user-supplied text
+            failed_lines = "".join(f"\n- <code>{html.escape(r.link)}</code>: <i>{html.escape(r.error)}</i>" for r in failed[:10])
+            await status_msg.edit_text(
+                f"<blockquote><b>✅ {len(added)}/{len(links)} groups added! ✨</b></blockquote>"
+                + (f"\n\n<b>Failed:</b>{failed_lines}" if failed else ""),
+                parse_mode=ParseMode.HTML
+            )
+        await send_dm_log(uid, f"<b>🎯 Groups added:</b> <i>{html.escape(', '.join(r.title for r in added[:20]))}</i> ✨")
         db.set_user_state(uid, "")
-        await tg_client.disconnect()
     except Exception as e:
-        await m.reply(f"<blockquote><b>❌ Failed to add group:</b> <i>{str(e)}</i> 😔</blockquote>", parse_mode=ParseMode.HTML)
-        await send_dm_log(uid, f"<b>❌ Failed to add group:</b> {str(e)} 😔")
+        await m.reply(f"<blockquote><b>❌ Failed to add group:</b> <i>{html.escape(str(e))}</i> 😔</blockquote>", parse_mode=ParseMode.HTML)
+        await send_dm_log(uid, f"<b>❌ Failed to add group:</b> {html.escape(str(e))} 😔")
         logger.error(f"Failed to add group for {uid}: {e}")
 
 @pyro.on_message(filters.text & filters.private & ~filters.command(["start", "bd", "me", "stats", "stop"]))
+@serialize_user
+@track_handler
 async def handle_text_message(client, m):
     uid = m.from_user.id
     state = db.get_user_state(uid)
@@ -1349,6 +1761,7 @@ async def handle_text_message(client, m):
     if state == "waiting_broadcast_msg":
         try:
             db.add_user_ad_message(uid, text, datetime.now())
+            ad_payloads.publish(uid, text)
             db.set_user_state(uid, "")
             await m.reply(
                 f"<blockquote><b>✅ AD MESSAGE SET! 🚀</b></blockquote>\n\n"
@@ -1356,7 +1769,7 @@ async def handle_text_message(client, m):
                 f"<b>Ready to broadcast! 🌟</b>\n"
                 f"<i>Start your campaign from the dashboard.</i>",
                 parse_mode=ParseMode.HTML,
-                reply_markup=kb([[InlineKeyboardButton("Dashboard 🚪", callback_data="menu_main")]])
+                reply_markup=ui.DASHBOARD_KEYBOARD
             )
             await send_dm_log(uid, f"<b>📝 Ad message updated:</b> <code>{text[:50]}{'...' if len(text) > 50 else ''}</code> ✨")
             logger.info(f"Ad message set for user {uid}: {text[:50]}...")
@@ -1368,7 +1781,7 @@ async def handle_text_message(client, m):
                 f"<u>Error:</u> <i>{str(e)}</i>\n"
                 f"<b>Contact:</b> <code>@{config.ADMIN_USERNAME}</code>",
                 parse_mode=ParseMode.HTML,
-                reply_markup=kb([[InlineKeyboardButton("Dashboard 🚪", callback_data="menu_main")]])
+                reply_markup=ui.DASHBOARD_KEYBOARD
             )
             await send_dm_log(uid, f"<b>❌ Failed to set ad message:</b> {str(e)} 😔")
     elif state == "waiting_broadcast_delay":
@@ -1380,7 +1793,7 @@ async def handle_text_message(client, m):
                     f"<u>Minimum interval is 60 seconds.</u> 🌟\n"
                     f"<i>Please enter a valid number.</i>",
                     parse_mode=ParseMode.HTML,
-                    reply_markup=kb([[InlineKeyboardButton("Back 🔙", callback_data="menu_main")]])
+                    reply_markup=ui.BACK_TO_MENU_KEYBOARD
                 )
                 return
             db.set_user_ad_delay(uid, delay)
@@ -1392,7 +1805,7 @@ async def handle_text_message(client, m):
                 f"<b>Mode:</b> <i>{mode}</i>\n\n"
                 f"<blockquote>Ready for broadcasting! 🌟</blockquote>",
                 parse_mode=ParseMode.HTML,
-                reply_markup=kb([[InlineKeyboardButton("Dashboard 🚪", callback_data="menu_main")]])
+                reply_markup=ui.DASHBOARD_KEYBOARD
             )
             await send_dm_log(uid, f"<b>⏱️ Broadcast interval updated:</b> {delay} seconds ({mode}) ✨")
             logger.info(f"Broadcast delay set for user {uid}: {delay}s")
@@ -1402,7 +1815,7 @@ async def handle_text_message(client, m):
                 f"<u>Please enter a number (in seconds).</u> 🌟\n"
                 f"<i>Example: <code>300</code> for 5 minutes.</i>",
                 parse_mode=ParseMode.HTML,
-                reply_markup=kb([[InlineKeyboardButton("Back 🔙", callback_data="menu_main")]])
+                reply_markup=ui.BACK_TO_MENU_KEYBOARD
             )
         except Exception as e:
             logger.error(f"Failed to set broadcast delay for user {uid}: {e}")
@@ -1412,7 +1825,7 @@ async def handle_text_message(client, m):
                 f"<u>Error:</u> <i>{str(e)}</i>\n"
                 f"<b>Contact:</b> <code>@{config.ADMIN_USERNAME}</code>",
                 parse_mode=ParseMode.HTML,
-                reply_markup=kb([[InlineKeyboardButton("Dashboard 🚪", callback_data="menu_main")]])
+                reply_markup=ui.DASHBOARD_KEYBOARD
             )
             await send_dm_log(uid, f"<b>❌ Failed to set broadcast interval:</b> {str(e)} 😔")
     elif state == "telethon_wait_phone":
@@ -1422,7 +1835,7 @@ async def handle_text_message(client, m):
                 f"<u>Please use international format.</u> 🌟\n"
                 f"<i>Example: <code>+1234567890</code></i>",
                 parse_mode=ParseMode.HTML,
-                reply_markup=kb([[InlineKeyboardButton("Back 🔙", callback_data="menu_main")]])
+                reply_markup=ui.BACK_TO_MENU_KEYBOARD
             )
             return
         status_msg = await m.reply(
@@ -1432,15 +1845,13 @@ async def handle_text_message(client, m):
             parse_mode=ParseMode.HTML
         )
         try:
-            tg = TelegramClient(StringSession(), config.API_ID, config.API_HASH)
-            await tg.connect()
-            sent_code = await tg.send_code_request(text)
-            session_str = tg.session.save()
+            login = await login_manager.begin(uid, text)
+            session_str = login.client.session.save()
 
             temp_dict = {
                 "phone": text,
                 "session_str": session_str,
-                "phone_code_hash": sent_code.phone_code_hash,
+                "phone_code_hash": login.phone_code_hash,
                 "otp": ""
             }
 
@@ -1450,13 +1861,9 @@ async def handle_text_message(client, m):
             db.set_user_state(uid, "telethon_wait_otp")
 
             await status_msg.edit(
-                f"<blockquote><b>✅ OTP sent to <code>{text}</code>! 🚀</b></blockquote>\n\n"
-                f"<u>Enter the OTP using the keypad below ✨</u>\n"
-                f"<b>Current:</b> <code>_____</code>\n"
-                f"<b>Format:</b> <code>12345</code> (no spaces needed) 🌟\n"
-                f"<i>Valid for:</i> <u>{config.OTP_EXPIRY // 60} minutes</u>",
+                ui.OTP_SENT.render(phone=text),
                 parse_mode=ParseMode.HTML,
-                reply_markup=get_otp_keyboard()
+                reply_markup=ui.OTP_KEYBOARD
             )
             await send_dm_log(uid, f"<b>📱 OTP requested for phone number:</b> <code>{text}</code> ✨")
         except PhoneNumberInvalidError:
@@ -1464,7 +1871,7 @@ async def handle_text_message(client, m):
                 f"<blockquote><b>❌ Invalid phone number! 😔</b></blockquote>\n\n"
                 f"<u>Please check the number and try again.</u> 🌟",
                 parse_mode=ParseMode.HTML,
-                reply_markup=kb([[InlineKeyboardButton("Back 🔙", callback_data="menu_main")]])
+                reply_markup=ui.BACK_TO_MENU_KEYBOARD
             )
         except Exception as e:
             logger.error(f"Failed to send OTP for {uid}: {e}")
@@ -1474,11 +1881,9 @@ async def handle_text_message(client, m):
                 f"<u>Error:</u> <i>{str(e)}</i>\n"
                 f"<b>Contact:</b> <code>@{config.ADMIN_USERNAME}</code>",
                 parse_mode=ParseMode.HTML,
-                reply_markup=kb([[InlineKeyboardButton("Back 🔙", callback_data="menu_main")]])
+                reply_markup=ui.BACK_TO_MENU_KEYBOARD
             )
             await send_dm_log(uid, f"<b>❌ Failed to send OTP for phone:</b> {str(e)} 😔")
-        finally:
-            await tg.disconnect()
     elif state == "telethon_wait_password":
         temp_encrypted = db.get_temp_data(uid)
         if not temp_encrypted:
@@ -1486,7 +1891,7 @@ async def handle_text_message(client, m):
                 f"<blockquote><b>❌ Session expired! 😔</b></blockquote>\n\n"
                 f"<u>Please restart the process.</u> 🌟",
                 parse_mode=ParseMode.HTML,
-                reply_markup=kb([[InlineKeyboardButton("Back 🔙", callback_data="menu_main")]])
+                reply_markup=ui.BACK_TO_MENU_KEYBOARD
             )
             db.set_user_state(uid, "")
             return
@@ -1502,16 +1907,17 @@ async def handle_text_message(client, m):
                 f"<blockquote><b>❌ Corrupted session data! 😔</b></blockquote>\n\n"
                 f"<u>Please restart the process.</u> 🌟",
                 parse_mode=ParseMode.HTML,
-                reply_markup=kb([[InlineKeyboardButton("Back 🔙", callback_data="menu_main")]])
+                reply_markup=ui.BACK_TO_MENU_KEYBOARD
             )
             db.set_user_state(uid, "")
             db.set_temp_data(uid, None)
             return
 
-        tg = TelegramClient(StringSession(session_str), config.API_ID, config.API_HASH)
+        tg, reconnected = None, False
         try:
-            await tg.connect()
+            tg, reconnected = await get_login_client(uid, session_str)
             await tg.sign_in(password=text)
+            session_str = tg.session.save()
             session_encrypted = cipher_suite.encrypt(session_str.encode()).decode()
             db.add_user_account(uid, phone, session_encrypted)
             await m.reply(
@@ -1520,45 +1926,156 @@ async def handle_text_message(client, m):
                 "<i>Account is ready for broadcasting! 🌟</i>\n"
                 "<i>Note: Profile bio and name will be updated during the first broadcast.</i>",
                 parse_mode=ParseMode.HTML,
-                reply_markup=kb([[InlineKeyboardButton("Dashboard 🚪", callback_data="menu_main")]])
+                reply_markup=ui.DASHBOARD_KEYBOARD
             )
             await send_dm_log(uid, f"<b>✅ Account added successfully:</b> <code>{phone}</code> ✨")
             db.set_user_state(uid, "")
             db.set_temp_data(uid, None)
+            await login_manager.finish(uid)
         except PasswordHashInvalidError:
             await m.reply(
                 f"<blockquote><b>❌ Invalid password! 😔</b></blockquote>\n\n"
                 f"<u>Please try again.</u> 🌟",
                 parse_mode=ParseMode.HTML,
-                reply_markup=kb([[InlineKeyboardButton("Back 🔙", callback_data="menu_main")]])
+                reply_markup=ui.BACK_TO_MENU_KEYBOARD
             )
         except Exception as e:
             logger.error(f"Failed to sign in with password for {uid}: {e}")
             db.set_user_state(uid, "")
             db.set_temp_data(uid, None)
+            await login_manager.finish(uid)
             await m.reply(
                 f"<blockquote><b>❌ Login failed! 😔</b></blockquote>\n\n"
                 f"<u>Error:</u> <i>{str(e)}</i>\n"
                 f"<b>Contact:</b> <code>@{config.ADMIN_USERNAME}</code>",
                 parse_mode=ParseMode.HTML,
-                reply_markup=kb([[InlineKeyboardButton("Dashboard 🚪", callback_data="menu_main")]])
+                reply_markup=ui.DASHBOARD_KEYBOARD
             )
             await send_dm_log(uid, f"<b>❌ Account login failed:</b> {str(e)} 😔")
         finally:
-            await tg.disconnect()
+            if reconnected:
+                await tg.disconnect()
     else:
         await m.reply(
             f"<blockquote><b>🚀 Welcome back! ✨</b></blockquote>\n\n"
             f"<u>Use the dashboard to manage your campaigns.</u> 🌟",
             parse_mode=ParseMode.HTML,
-            reply_markup=kb([[InlineKeyboardButton("Dashboard 🚪", callback_data="menu_main")]])
+            reply_markup=ui.DASHBOARD_KEYBOARD
         )
 
+async def resume_interrupted_campaigns():
+    """Restart campaigns that a previous shutdown paused, from their saved position."""
+    for state in db.get_interrupted_broadcasts():
+        uid = state["user_id"]
+        if uid in user_tasks:
+            continue
+        db.set_broadcast_state(uid, running=True)
+        user_tasks[uid] = create_detached_task(run_broadcast(pyro, uid, state.get("progress")))
+        logger.info(f"Resumed interrupted broadcast for {uid}")
+
+async def stop_background_tasks():
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+
+async def drain_campaigns():
+    """Let every campaign finish its in-flight send; run_broadcast then saves its progress."""
+    tasks = list(user_tasks.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await broadcast_scheduler.stop()
+
+async def flush_quota():
+    await quota.sync()
+
+async def flush_logs():
+    for handler in logging.getLogger().handlers:
+        handler.flush()
+
+async def disconnect_clients():
+    await asyncio.gather(hosted_client_pool.close_all(), login_manager.close_all(), return_exceptions=True)
+
+async def stop_services(metrics_server):
+    services = [pyro.stop(), logger_client.stop()]
+    if metrics_server:
+        services.append(metrics_server.stop())
+    if config.ENABLE_LOOP_MONITOR:
+        services.append(loop_monitor.stop())
+    await asyncio.gather(*services, return_exceptions=True)
+
+async def close_database():
+    await asyncio.to_thread(db.close)
+
+async def connect_database():
+    global database_failed
+    try:
+        await asyncio.to_thread(db.connect)
+    except Exception:
+        database_failed = True
+        raise
+    finally:
+        # Released on failure too, so gated updates are dropped instead of waiting forever
+        database_ready.set()
+
+async def start_metrics_server():
+    """Start the metrics endpoint, returning None if the port is unavailable."""
+    server = metrics.create_metrics_server()
+    health.register(server)
+    try:
+        await server.start()
+        return server
+    except OSError as e:
+        logger.error(f"Failed to start metrics endpoint: {e}")
+        return None
+
+async def warm_up():
+    """Prime per-user caches for campaigns about to resume, then resume them."""
+    for state in db.get_interrupted_broadcasts():
+        logger_status_cache.get(state["user_id"], db.get_logger_status)
+        ad_payloads.get(state["user_id"])
+    await resume_interrupted_campaigns()
+
 # Run both bots
 async def main():
-    await pyro.start()
-    await logger_client.start()
+    # Database, both bot logins and the metrics endpoint are independent network waits
+    phases = [
+        ("database", connect_database),
+        ("bot", pyro.start),
+        ("logger bot", logger_client.start)
+    ]
+    if config.ENABLE_METRICS:
+        phases.append(("metrics", start_metrics_server))
+    try:
+        results = await startup.parallel(*phases)
+    except Exception:
+        logger.error("Startup failed; stopping the bots and exiting")
+        await stop_services(None)
+        raise
+    metrics_server = results[3] if config.ENABLE_METRICS else None
+    if config.ENABLE_LOOP_MONITOR:
+        loop_monitor.start(enable_debug=config.ENABLE_SLOW_CALLBACK_DEBUG)
+    if config.ENABLE_QUERY_PROFILER:
+        background_tasks.append(asyncio.create_task(run_explain_loop(db.db, config.QUERY_EXPLAIN_INTERVAL, config.QUERY_PROFILER_TOP_N)))
+    background_tasks.append(asyncio.create_task(hosted_client_pool.run_reaper()))
+    background_tasks.append(asyncio.create_task(login_manager.run_reaper()))
+    background_tasks.append(asyncio.create_task(account_health.run()))
+    background_tasks.append(asyncio.create_task(db.run_retention()))
+    background_tasks.append(asyncio.create_task(quota.run()))
+    if change_listener:
+        background_tasks.append(asyncio.create_task(change_listener.run()))
+    await startup.phase("warm-up", warm_up)
+    startup.done()
+
+    shutdown.add_phase("stop background tasks", stop_background_tasks, 5)
+    shutdown.add_phase("drain campaigns", drain_campaigns)
+    shutdown.add_phase("flush quota usage", flush_quota, 3)
+    shutdown.add_phase("flush logs", flush_logs, 2)
+    shutdown.add_phase("disconnect clients", disconnect_clients, 10)
+    shutdown.add_phase("stop bots", lambda: stop_services(metrics_server), 10)
+    shutdown.add_phase("close database", close_database, 5)
     await idle()
+    await shutdown.run()
 
 if __name__ == "__main__":
     pyro.run(main())
\ No newline at end of file
@@ -0,0 +1,420 @@
+import asyncio
+import functools
+import inspect
+import logging
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+import config
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    """Render a Prometheus label set like {a="1",b="2"}."""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    """Base class for a labelled metric family."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Optional[List[str]] = None, registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames or ())
+        self._lock = threading.Lock()
+        self._children: Dict[Tuple[str, ...], object] = {}
+        (registry or REGISTRY).register(self)
+
+    def labels(self, *values, **kwargs):
+        """Return the child metric for the given label values."""
+        if kwargs:
+            values = tuple(str(kwargs[name]) for name in self.labelnames)
+        else:
+            values = tuple(str(v) for v in values)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}")
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def _default(self):
+        return self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def collect(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    def _render_child(self, values, child) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.get())}"]
+
+
+class _Value:
+    """Thread-safe float holder used by counters and gauges."""
+
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+        self._function = None
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self._value += amount
+
+    def dec(self, amount: float = 1.0):
+        with self._lock:
+            self._value -= amount
+
+    def set(self, value: float):
+        with self._lock:
+            self._value = float(value)
+
+    def set_function(self, function: Callable[[], float]):
+        self._function = function
+
+    def get(self) -> float:
+        if self._function is not None:
+            try:
+                return float(self._function())
+            except Exception as e:
+                logger.error(f"Metric callback failed: {e}")
+                return 0.0
+        return self._value
+
+
+class Counter(_Metric):
+    """Monotonically increasing counter."""
+
+    kind = "counter"
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+
+class Gauge(_Metric):
+    """Value that can go up and down, or be computed on scrape."""
+
+    kind = "gauge"
+
+    def _new_child(self):
+        return _Value()
+
+    def set(self, value: float):
+        self._default().set(value)
+
+    def inc(self, amount: float = 1.0):
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1.0):
+        self._default().dec(amount)
+
+    def set_function(self, function: Callable[[], float]):
+        self._default().set_function(function)
+
+
+class _HistogramValue:
+    """Cumulative bucket counts plus sum for one label set."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self.total += value
+            self.count += 1
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    self.counts[i] += 1
+                    break
+
+    def time(self):
+        return _Timer(self)
+
+
+class _Timer:
+    def __init__(self, target):
+        self._target = target
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._target.observe(time.perf_counter() - self._start)
+
+
+class Histogram(_Metric):
+    """Latency histogram with fixed upper bounds."""
+
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=None, buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value: float):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+    def _render_child(self, values, child) -> List[str]:
+        lines = []
+        cumulative = 0
+        with child._lock:
+            counts, total, count = list(child.counts), child.total, child.count
+        for bound, bucket_count in zip(self.buckets, counts):
+            cumulative += bucket_count
+            labels = _format_labels(self.labelnames, values, f'le="{_format_value(bound)}"')
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, values)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds metric families and renders the Prometheus text exposition."""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric):
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+HANDLER_LATENCY = Histogram(
+    "quantum_handler_latency_seconds", "Latency of Pyrogram handlers.", ["handler"]
+)
+HANDLER_ERRORS = Counter(
+    "quantum_handler_errors_total", "Unhandled exceptions raised by Pyrogram handlers.", ["handler"]
+)
+DB_CALL_LATENCY = Histogram(
+    "quantum_db_call_latency_seconds", "Latency of EnhancedDatabaseManager calls.", ["method"]
+)
+DB_CALL_ERRORS = Counter(
+    "quantum_db_call_errors_total", "Exceptions raised by EnhancedDatabaseManager calls.", ["method"]
+)
+MONGO_COMMAND_LATENCY = Histogram(
+    "quantum_mongo_command_latency_seconds", "Server round-trip of MongoDB commands.", ["collection", "command"]
+)
+BROADCAST_SENDS = Counter(
+    "quantum_broadcast_sends_total", "Ad messages delivered by run_broadcast."
+)
+BROADCAST_FAILURES = Counter(
+    "quantum_broadcast_failures_total", "Ad messages that failed in run_broadcast."
+)
+BROADCAST_FLOODWAIT_SECONDS = Counter(
+    "quantum_broadcast_floodwait_seconds_total", "FloodWait seconds imposed on broadcasting accounts."
+)
+QUEUE_DEPTH = Gauge(
+    "quantum_queue_depth", "Items waiting in internal work queues.", ["queue"]
+)
+LIVE_BROADCAST_TASKS = Gauge(
+    "quantum_live_broadcast_tasks", "Broadcast tasks currently held in user_tasks."
+)
+LOOP_LAG = Histogram(
+    "quantum_event_loop_lag_seconds", "Event-loop scheduling lag measured by the watchdog.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+LOOP_STALLS = Counter(
+    "quantum_event_loop_stalls_total", "Heartbeats that woke up later than the lag threshold."
+)
+LOOP_SLOW_CALLBACKS = Counter(
+    "quantum_event_loop_slow_callbacks_total", "Callbacks reported slow by asyncio debug mode."
+)
+
+
+def track_handler(func):
+    """Record latency and errors of an async Pyrogram handler under its function name."""
+    latency = HANDLER_LATENCY.labels(func.__name__)
+    errors = HANDLER_ERRORS.labels(func.__name__)
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        except Exception:
+            errors.inc()
+            raise
+        finally:
+            latency.observe(time.perf_counter() - start)
+
+    return wrapper
+
+
+def _timed_iteration(iterator, latency, errors):
+    """Yield from iterator, observing only the time spent producing items once it is done."""
+    elapsed = 0.0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                elapsed += time.perf_counter() - start
+            yield item
+    finally:
+        iterator.close()
+        latency.observe(elapsed)
+
+
+def _timed_call(name, method):
+    latency = DB_CALL_LATENCY.labels(name)
+    errors = DB_CALL_ERRORS.labels(name)
+
+    if inspect.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def async_wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await method(*args, **kwargs)
+            except Exception:
+                errors.inc()
+                raise
+            finally:
+                latency.observe(time.perf_counter() - start)
+
+        return async_wrapper
+
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            result = method(*args, **kwargs)
+        except Exception:
+            errors.inc()
+            latency.observe(time.perf_counter() - start)
+            raise
+        if inspect.isgenerator(result):
+            # iter_* methods return lazy generators; the queries run as they are consumed
+            return _timed_iteration(result, latency, errors)
+        latency.observe(time.perf_counter() - start)
+        return result
+
+    return wrapper
+
+
+def instrument_db(db):
+    """Wrap every public method of a database manager instance with latency tracking.
+
+    Async methods are timed until they complete and generators over the
+    time spent producing their items, not just the call that creates them.
+    """
+    for name in dir(type(db)):
+        if name.startswith("_"):
+            continue
+        method = getattr(db, name)
+        if callable(method):
+            setattr(db, name, _timed_call(name, method))
+    return db
+
+
+class MetricsServer:
+    """Minimal asyncio HTTP server exposing text endpoints on a local port."""
+
+    def __init__(self, host: str, port: int, routes: Optional[Dict[str, Callable]] = None):
+        self.host = host
+        self.port = port
+        self.routes = dict(routes or {})
+        self._server = None
+
+    def add_route(self, path: str, handler: Callable):
+        """Register a handler returning (status, content_type, body) or an awaitable of it."""
+        self.routes[path] = handler
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        logger.info(f"HTTP endpoint listening on {self.host}:{self.port} ({', '.join(self.routes)})")
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+                pass
+            parts = request_line.decode("latin-1").split()
+            path = parts[1].split("?", 1)[0] if len(parts) >= 2 else ""
+            handler = self.routes.get(path)
+            if not parts or parts[0] != "GET":
+                status, content_type, body = 405, "text/plain", "method not allowed\n"
+            elif handler is None:
+                status, content_type, body = 404, "text/plain", "not found\n"
+            else:
+                result = handler()
+                if asyncio.iscoroutine(result):
+                    result = await result
+                status, content_type, body = result
+            payload = body.encode()
+            reason = {200: "OK", 404: "Not Found", 405: "Method Not Allowed", 503: "Service Unavailable"}.get(status, "OK")
+            writer.write(
+                f"HTTP/1.1 {status} {reason}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode() + payload
+            )
+            await writer.drain()
+        except Exception as e:
+            logger.error(f"HTTP endpoint request failed: {e}")
+        finally:
+            writer.close()
+
+
+def metrics_route():
+    return 200, "text/plain; version=0.0.4; charset=utf-8", REGISTRY.render()
+
+
+def create_metrics_server() -> MetricsServer:
+    """Build the metrics server from config."""
+    return MetricsServer(config.METRICS_HOST, config.METRICS_PORT, {"/metrics": metrics_route})
@@ -0,0 +1,221 @@
+import asyncio
+import json
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+from pymongo import monitoring
+import config
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Commands worth profiling; handshakes, pings and explain runs are ignored
+TRACKED_COMMANDS = {
+    "find", "insert", "update", "delete", "aggregate",
+    "count", "findAndModify", "distinct", "getMore",
+}
+
+
+def normalize_shape(value):
+    """Replace literal values with '?' so queries differing only by parameters group together."""
+    if isinstance(value, dict):
+        return {k: normalize_shape(v) for k, v in value.items()}
+    if isinstance(value, list):
+        if any(isinstance(v, (dict, list)) for v in value):
+            return [normalize_shape(v) for v in value]
+        return "?"
+    return "?"
+
+
+def _command_parts(name: str, command: dict) -> Tuple[str, dict, Optional[dict]]:
+    """Return (collection, shape, explainable sample) for a tracked command."""
+    if name == "getMore":
+        return str(command.get("collection")), {}, None
+    collection = str(command.get(name))
+    if name == "find":
+        shape = {"filter": normalize_shape(command.get("filter", {})), "sort": command.get("sort")}
+        sample = {"find": collection, "filter": command.get("filter", {})}
+        if command.get("sort"):
+            sample["sort"] = command["sort"]
+        return collection, shape, sample
+    if name in ("update", "delete"):
+        key = "updates" if name == "update" else "deletes"
+        statements = command.get(key) or [{}]
+        first = statements[0]
+        shape = {"q": normalize_shape(first.get("q", {}))}
+        return collection, shape, {name: collection, key: [first]}
+    if name == "aggregate":
+        pipeline = command.get("pipeline", [])
+        return collection, {"pipeline": normalize_shape(pipeline)}, {
+            "aggregate": collection, "pipeline": pipeline, "cursor": {}
+        }
+    if name == "count":
+        return collection, {"query": normalize_shape(command.get("query", {}))}, {
+            "count": collection, "query": command.get("query", {})
+        }
+    if name == "findAndModify":
+        shape = {"query": normalize_shape(command.get("query", {})), "sort": command.get("sort")}
+        return collection, shape, {
+            "find": collection, "filter": command.get("query", {}), "sort": command.get("sort") or {}
+        }
+    if name == "distinct":
+        return collection, {"key": command.get("key"), "query": normalize_shape(command.get("query", {}))}, None
+    # insert has no query shape worth grouping on
+    return collection, {}, None
+
+
+def _has_collscan(plan) -> bool:
+    if isinstance(plan, dict):
+        if plan.get("stage") == "COLLSCAN":
+            return True
+        return any(_has_collscan(v) for v in plan.values())
+    if isinstance(plan, list):
+        return any(_has_collscan(v) for v in plan)
+    return False
+
+
+def _find_winning_plans(doc) -> List[dict]:
+    plans = []
+    if isinstance(doc, dict):
+        for key, value in doc.items():
+            if key == "winningPlan":
+                plans.append(value)
+            else:
+                plans.extend(_find_winning_plans(value))
+    elif isinstance(doc, list):
+        for value in doc:
+            plans.extend(_find_winning_plans(value))
+    return plans
+
+
+class QueryStats:
+    """Aggregated timings for one (collection, operation, shape) group."""
+
+    __slots__ = ("collection", "operation", "shape", "count", "errors", "total_ms",
+                 "max_ms", "sample", "collscan", "explained")
+
+    def __init__(self, collection, operation, shape, sample):
+        self.collection = collection
+        self.operation = operation
+        self.shape = shape
+        self.count = 0
+        self.errors = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.sample = sample
+        self.collscan = None
+        self.explained = False
+
+    @property
+    def avg_ms(self) -> float:
+        return self.total_ms / self.count if self.count else 0.0
+
+
+class QueryProfiler(monitoring.CommandListener):
+    """pymongo command listener that aggregates per-query-shape timings and logs slow queries."""
+
+    def __init__(self, slow_query_ms: float = 100.0):
+        self.slow_query_ms = slow_query_ms
+        self._inflight: Dict[Tuple, Tuple[str, str, str, Optional[dict]]] = {}
+        self._stats: Dict[Tuple[str, str, str], QueryStats] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        if event.command_name not in TRACKED_COMMANDS:
+            return
+        try:
+            collection, shape, sample = _command_parts(event.command_name, event.command)
+            shape_key = json.dumps(shape, default=str)
+        except Exception as e:
+            logger.error(f"Failed to normalize {event.command_name} command: {e}")
+            return
+        with self._lock:
+            self._inflight[(event.connection_id, event.request_id)] = (
+                collection, event.command_name, shape_key, sample
+            )
+
+    def succeeded(self, event):
+        self._finish(event, failed=False)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
+
+    def _finish(self, event, failed: bool):
+        if event.command_name not in TRACKED_COMMANDS:
+            return
+        with self._lock:
+            entry = self._inflight.pop((event.connection_id, event.request_id), None)
+            if entry is None:
+                return
+            collection, operation, shape_key, sample = entry
+            duration_ms = event.duration_micros / 1000
+            key = (collection, operation, shape_key)
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = QueryStats(collection, operation, shape_key, sample)
+            stats.count += 1
+            stats.total_ms += duration_ms
+            stats.max_ms = max(stats.max_ms, duration_ms)
+            if failed:
+                stats.errors += 1
+        metrics.MONGO_COMMAND_LATENCY.labels(collection, operation).observe(duration_ms / 1000)
+        if duration_ms >= self.slow_query_ms:
+            logger.warning(f"Slow query {duration_ms:.1f}ms: {collection}.{operation} {shape_key}")
+
+    def top(self, limit: int = 10) -> List[QueryStats]:
+        """Query groups ordered by total time spent."""
+        with self._lock:
+            stats = list(self._stats.values())
+        return sorted(stats, key=lambda s: s.total_ms, reverse=True)[:limit]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def explain_top(self, database, limit: int = 10) -> int:
+        """Run queryPlanner explains for the heaviest unexplained shapes and flag COLLSCANs."""
+        explained = 0
+        for stats in self.top(limit):
+            if stats.explained or not stats.sample:
+                continue
+            try:
+                result = database.command("explain", stats.sample, verbosity="queryPlanner")
+                stats.collscan = any(_has_collscan(plan) for plan in _find_winning_plans(result))
+                stats.explained = True
+                explained += 1
+                if stats.collscan:
+                    logger.warning(f"COLLSCAN plan for {stats.collection}.{stats.operation} {stats.shape}")
+            except Exception as e:
+                logger.error(f"Explain failed for {stats.collection}.{stats.operation}: {e}")
+                stats.explained = True
+        return explained
+
+    def format_report(self, limit: int = 10) -> str:
+        """Plain-text top-N report for the admin command."""
+        rows = self.top(limit)
+        if not rows:
+            return "No queries recorded yet."
+        lines = []
+        for i, s in enumerate(rows, 1):
+            plan = "COLLSCAN" if s.collscan else ("indexed" if s.collscan is False else "unexplained")
+            lines.append(
+                f"{i}. {s.collection}.{s.operation} [{plan}]\n"
+                f"   n={s.count} err={s.errors} avg={s.avg_ms:.1f}ms max={s.max_ms:.1f}ms total={s.total_ms:.0f}ms\n"
+                f"   {s.shape[:300]}"
+            )
+        return "\n".join(lines)
+
+
+query_profiler = QueryProfiler(config.MONGO_SLOW_QUERY_MS)
+
+
+async def run_explain_loop(database, interval: float, limit: int):
+    """Periodically explain the heaviest query shapes off the event loop."""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            explained = await asyncio.to_thread(query_profiler.explain_top, database, limit)
+            if explained:
+                logger.info(f"Explained {explained} query shapes")
+        except Exception as e:
+            logger.error(f"Explain loop failed: {e}")
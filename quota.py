@@ -0,0 +1,141 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+WINDOW_HOURS = 24
+
+
+def current_hour() -> int:
+    """Wall-clock hour number, shared by every instance writing quota_usage."""
+    return int(time.time() // 3600)
+
+
+class UserUsage:
+    """Cycle counts for one user in a ring of hourly buckets covering the last 24 hours."""
+
+    __slots__ = ("hours", "counts", "pending")
+
+    def __init__(self):
+        self.hours = [0] * WINDOW_HOURS
+        self.counts = [0] * WINDOW_HOURS
+        # Cycles recorded here but not yet written to MongoDB, by hour
+        self.pending: Dict[int, int] = {}
+
+    def total(self, now_hour: int) -> int:
+        oldest = now_hour - WINDOW_HOURS + 1
+        return sum(count for hour, count in zip(self.hours, self.counts) if hour >= oldest)
+
+    def add(self, hour: int, count: int = 1):
+        slot = hour % WINDOW_HOURS
+        if self.hours[slot] != hour:
+            self.hours[slot] = hour
+            self.counts[slot] = 0
+        self.counts[slot] += count
+
+    def oldest_used_hour(self, now_hour: int):
+        oldest = now_hour - WINDOW_HOURS + 1
+        used = [hour for hour, count in zip(self.hours, self.counts) if hour >= oldest and count]
+        return min(used) if used else None
+
+    def replace(self, stored: Dict[int, int]):
+        """Reset the buckets to the stored totals plus cycles not yet written."""
+        self.hours = [0] * WINDOW_HOURS
+        self.counts = [0] * WINDOW_HOURS
+        for hour, count in stored.items():
+            self.add(hour, count)
+        for hour, count in self.pending.items():
+            self.add(hour, count)
+
+
+class QuotaEngine:
+    """Enforces broadcast cycles per rolling 24 hours and groups per cycle without per-send queries.
+
+    The daily unit is a broadcast cycle of at most ``max_groups_per_cycle``
+    sends, so a user reaches at most ``max_cycles_per_day`` times that many
+    groups a day; a campaign with a short delay uses its cycles up early and
+    then waits for the oldest hour to leave the window.
+
+    Checks and increments only touch in-memory hourly buckets. Every
+    ``sync_interval`` seconds the pending increments are written to the
+    quota_usage collection with atomic ``$inc`` upserts and the buckets of
+    active users are reloaded from it, so limits survive restarts and are
+    shared between instances with at most one interval of drift.
+    """
+
+    def __init__(self, db, max_cycles_per_day: int, max_groups_per_cycle: int, sync_interval: float = 30.0):
+        self.db = db
+        self.max_cycles_per_day = max_cycles_per_day
+        self.max_groups_per_cycle = max_groups_per_cycle
+        self.sync_interval = sync_interval
+        self._usage: Dict[int, UserUsage] = {}
+
+    def __len__(self):
+        return len(self._usage)
+
+    def _get(self, user_id: int) -> UserUsage:
+        usage = self._usage.get(user_id)
+        if usage is None:
+            usage = self._usage[user_id] = UserUsage()
+            usage.replace(self.db.get_quota_usage(user_id, current_hour() - WINDOW_HOURS + 1))
+        return usage
+
+    def cycles_used(self, user_id: int) -> int:
+        return self._get(user_id).total(current_hour())
+
+    def seconds_until_cycle(self, user_id: int) -> float:
+        """0 if the user may start a broadcast cycle now, else seconds until a slot frees up."""
+        usage = self._get(user_id)
+        now_hour = current_hour()
+        if usage.total(now_hour) < self.max_cycles_per_day:
+            return 0.0
+        oldest = usage.oldest_used_hour(now_hour)
+        return max((oldest + WINDOW_HOURS) * 3600 - time.time(), 1.0)
+
+    def record_cycle(self, user_id: int):
+        usage = self._get(user_id)
+        hour = current_hour()
+        usage.add(hour)
+        usage.pending[hour] = usage.pending.get(hour, 0) + 1
+
+    def cycle_full(self, sends: int) -> bool:
+        return sends >= self.max_groups_per_cycle
+
+    async def sync(self):
+        """Write pending increments and reload every tracked user's window from MongoDB."""
+        increments: List[Tuple[int, int, int]] = []
+        for user_id, usage in self._usage.items():
+            increments.extend((user_id, hour, count) for hour, count in usage.pending.items())
+            usage.pending = {}
+        user_ids = list(self._usage)
+        if not user_ids:
+            return
+        since_hour = current_hour() - WINDOW_HOURS + 1
+        try:
+            if increments:
+                await asyncio.to_thread(self.db.add_quota_usage, increments)
+            stored = await asyncio.to_thread(self.db.get_quota_usage_bulk, user_ids, since_hour)
+        except Exception as e:
+            # Put the increments back so the next sync retries them
+            for user_id, hour, count in increments:
+                usage = self._usage.get(user_id)
+                if usage is not None:
+                    usage.pending[hour] = usage.pending.get(hour, 0) + count
+            logger.error(f"Quota sync failed: {e}")
+            return
+        now_hour = current_hour()
+        for user_id in user_ids:
+            usage = self._usage.get(user_id)
+            if usage is None:
+                continue
+            usage.replace(stored.get(user_id, {}))
+            if not usage.pending and not usage.total(now_hour):
+                # Nothing left in the window; reload on next use
+                del self._usage[user_id]
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            await self.sync()
@@ -0,0 +1,72 @@
+from collections import deque
+from telethon import utils as telethon_utils
+
+# Projections for the documents the broadcast engine loads
+BROADCAST_ACCOUNT_FIELDS = {
+    "phone_number": 1, "session_string": 1, "is_active": 1,
+    "health_status": 1, "health_checked_at": 1
+}
+TARGET_GROUP_FIELDS = {"_id": 0, "group_id": 1, "group_name": 1}
+# Screens that list or count accounts never need the encrypted session string
+ACCOUNT_LIST_FIELDS = {"phone_number": 1, "is_active": 1}
+ACCOUNT_HEALTH_FIELDS = {"is_active": 1, "health_status": 1, "health_checked_at": 1}
+POOL_ACCOUNT_FIELDS = {"phone_number": 1, "session_string": 1, "is_active": 1}
+USER_BROWSER_FIELDS = {"user_id": 1, "username": 1, "first_name": 1}
+USER_ID_FIELDS = {"_id": 1, "user_id": 1}
+
+ERROR_SAMPLE_SIZE = 5
+
+
+class AccountRecord:
+    """A connected hosted account; the session string is not kept once connected."""
+
+    __slots__ = ("account_id", "phone_number", "client")
+
+    def __init__(self, account_id, phone_number: str, client):
+        self.account_id = account_id
+        self.phone_number = phone_number
+        self.client = client
+
+
+class TargetGroupRecord:
+    __slots__ = ("peer", "group_id", "group_name")
+
+    def __init__(self, peer, group_id: int, group_name: str):
+        self.peer = peer
+        self.group_id = group_id
+        self.group_name = group_name
+
+    @classmethod
+    def from_doc(cls, doc) -> "TargetGroupRecord":
+        group_id = int(doc["group_id"])
+        # Ids are stored marked (get_peer_id): -N is a basic group, -100N a channel/supergroup.
+        # An unmarked id cannot be told apart, so Telethon resolves it from the entity cache.
+        peer = telethon_utils.get_peer(group_id) if group_id < 0 else group_id
+        return cls(peer, group_id, doc.get("group_name") or str(group_id))
+
+
+class CampaignStats:
+    """Per-campaign counters with a bounded sample of the current cycle's errors."""
+
+    __slots__ = ("sent", "failed", "cycles", "error_count", "recent_errors")
+
+    def __init__(self):
+        self.sent = 0
+        self.failed = 0
+        self.cycles = 0
+        self.error_count = 0
+        self.recent_errors = deque(maxlen=ERROR_SAMPLE_SIZE)
+
+    def record_error(self, summary: str):
+        self.failed += 1
+        self.error_count += 1
+        self.recent_errors.append(summary)
+
+    def take_error_summary(self) -> str:
+        """Describe and reset the errors collected since the last call, or '' if none."""
+        if not self.error_count:
+            return ""
+        summary = f"{self.error_count} failures - {', '.join(self.recent_errors)}"
+        self.error_count = 0
+        self.recent_errors.clear()
+        return summary
@@ -0,0 +1,99 @@
+import asyncio
+import collections
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Dict
+import config
+
+logger = logging.getLogger(__name__)
+
+
+class ProfilerBusyError(RuntimeError):
+    """Raised when a profile is requested while another one is running."""
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _collapse(frame, thread_name: str) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.append(thread_name)
+    return ";".join(reversed(labels))
+
+
+class SamplingProfiler:
+    """Time-bounded stack sampler covering every thread of the running process.
+
+    Samples ``sys._current_frames()`` at a fixed interval from a background
+    thread, so the event loop thread and any worker threads are captured
+    without instrumenting the code. Output is in the collapsed-stack format
+    consumed by flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._running = False
+
+    @property
+    def running(self) -> bool:
+        return self._running
+
+    def sample(self, duration: float) -> Dict[str, object]:
+        """Block the calling thread for ``duration`` seconds collecting stack samples."""
+        with self._lock:
+            if self._running:
+                raise ProfilerBusyError("A profile is already running")
+            self._running = True
+        try:
+            own_ident = threading.get_ident()
+            stacks = collections.Counter()
+            samples = 0
+            started = time.perf_counter()
+            deadline = started + duration
+            while time.perf_counter() < deadline:
+                names = {t.ident: t.name for t in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == own_ident:
+                        continue
+                    stacks[_collapse(frame, names.get(ident, f"thread-{ident}"))] += 1
+                samples += 1
+                time.sleep(self.interval)
+            return {
+                "stacks": stacks,
+                "samples": samples,
+                "elapsed": time.perf_counter() - started,
+            }
+        finally:
+            self._running = False
+
+    async def profile(self, duration: float) -> Dict[str, object]:
+        """Run a profile off the event loop so the loop itself gets sampled."""
+        return await asyncio.to_thread(self.sample, duration)
+
+    @staticmethod
+    def to_collapsed(result: Dict[str, object]) -> str:
+        """Render samples as 'frame;frame;frame count' lines, heaviest first."""
+        stacks = result["stacks"]
+        return "\n".join(f"{stack} {count}" for stack, count in stacks.most_common()) + "\n"
+
+    @staticmethod
+    def summarize(result: Dict[str, object], top: int = 5) -> str:
+        """Short text summary of the hottest leaf frames."""
+        leaves = collections.Counter()
+        for stack, count in result["stacks"].items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        lines = [f"{count * 100 / total:5.1f}% {frame}" for frame, count in leaves.most_common(top)]
+        return "\n".join(lines)
+
+
+sampling_profiler = SamplingProfiler(config.PROFILER_SAMPLE_INTERVAL)
@@ -0,0 +1,43 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class ShutdownCoordinator:
+    """Runs the registered shutdown phases in order within one overall deadline.
+
+    ``stopping`` flips as soon as shutdown begins so handlers can refuse new
+    work. Each phase gets at most its own timeout and never more than what is
+    left of the deadline; a phase that fails or overruns is logged and the
+    next one still runs, so the Mongo client is always closed last.
+    """
+
+    def __init__(self, deadline: float = 25.0):
+        self.deadline = deadline
+        self.stopping = False
+        self._phases: List[Tuple[str, Callable[[], Awaitable], Optional[float]]] = []
+
+    def add_phase(self, name: str, func: Callable[[], Awaitable], timeout: Optional[float] = None):
+        self._phases.append((name, func, timeout))
+
+    async def run(self):
+        if self.stopping:
+            return
+        self.stopping = True
+        started = time.monotonic()
+        logger.info(f"Shutting down: {len(self._phases)} phases, {self.deadline:.0f}s deadline")
+        for name, func, timeout in self._phases:
+            remaining = self.deadline - (time.monotonic() - started)
+            budget = max(min(timeout, remaining) if timeout is not None else remaining, 0.1)
+            phase_started = time.monotonic()
+            try:
+                await asyncio.wait_for(func(), budget)
+                logger.info(f"Shutdown phase '{name}' done in {time.monotonic() - phase_started:.2f}s")
+            except asyncio.TimeoutError:
+                logger.error(f"Shutdown phase '{name}' exceeded {budget:.1f}s, continuing")
+            except Exception as e:
+                logger.error(f"Shutdown phase '{name}' failed: {e}")
+        logger.info(f"Shutdown complete in {time.monotonic() - started:.2f}s")
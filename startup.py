@@ -0,0 +1,47 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+Phase = Tuple[str, Callable[[], Awaitable]]
+
+
+class StartupSequencer:
+    """Runs startup phases, concurrently where they are independent, and times each one.
+
+    ``timings`` keeps the seconds spent per phase in completion order so the
+    breakdown can be logged once startup is done and inspected afterwards.
+    """
+
+    def __init__(self, started: float = None):
+        self.timings: Dict[str, float] = {}
+        self.started = started if started is not None else time.perf_counter()
+        self.finished = None
+
+    def record(self, name: str, seconds: float):
+        self.timings[name] = seconds
+
+    async def phase(self, name: str, func: Callable[[], Awaitable]) -> Any:
+        phase_started = time.perf_counter()
+        try:
+            return await func()
+        finally:
+            self.record(name, time.perf_counter() - phase_started)
+
+    async def parallel(self, *phases: Phase) -> List[Any]:
+        """Run phases concurrently; the first failure propagates once all have settled."""
+        results = await asyncio.gather(*(self.phase(name, func) for name, func in phases), return_exceptions=True)
+        for (name, _), result in zip(phases, results):
+            if isinstance(result, BaseException):
+                logger.error(f"Startup phase '{name}' failed: {result}")
+                raise result
+        return results
+
+    def done(self):
+        self.finished = time.perf_counter()
+        logger.info(f"Startup complete in {self.finished - self.started:.2f}s ({self.report()})")
+
+    def report(self) -> str:
+        return ", ".join(f"{name} {seconds:.2f}s" for name, seconds in self.timings.items())
@@ -0,0 +1,231 @@
+import logging
+from functools import lru_cache
+from string import Formatter
+from typing import Tuple
+from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
+import config
+
+logger = logging.getLogger(__name__)
+
+
+# Inline keyboard helper
+def kb(rows):
+    if not isinstance(rows, list) or not all(isinstance(row, list) for row in rows):
+        logger.error("Invalid rows format for InlineKeyboardMarkup")
+        raise ValueError("Rows must be a list of lists")
+    return InlineKeyboardMarkup(rows)
+
+
+class CaptionTemplate:
+    """Caption split once into literal text and named fields.
+
+    ``render`` only substitutes the variable fields, and results are
+    memoized per (template, values) in a small shared LRU.
+    """
+
+    __slots__ = ("name", "_parts", "fields")
+
+    def __init__(self, name: str, text: str):
+        self.name = name
+        self._parts = [(literal, field) for literal, field, _, _ in Formatter().parse(text)]
+        self.fields = tuple(dict.fromkeys(field for _, field in self._parts if field))
+
+    def render(self, **values) -> str:
+        return _render(self, tuple(values[field] for field in self.fields))
+
+    def _substitute(self, values: Tuple) -> str:
+        lookup = dict(zip(self.fields, values))
+        return "".join(literal + (str(lookup[field]) if field else "") for literal, field in self._parts)
+
+    def __repr__(self):
+        return f"CaptionTemplate({self.name!r})"
+
+
+@lru_cache(maxsize=config.UI_RENDER_CACHE_SIZE)
+def _render(template: CaptionTemplate, values: Tuple) -> str:
+    return template._substitute(values)
+
+
+def render_cache_info():
+    return _render.cache_info()
+
+
+# Static keyboards, built once at import
+BACK_TO_MENU_KEYBOARD = kb([[InlineKeyboardButton("Back 🔙", callback_data="menu_main")]])
+DASHBOARD_KEYBOARD = kb([[InlineKeyboardButton("Dashboard 🚪", callback_data="menu_main")]])
+BACK_TO_ANALYTICS_KEYBOARD = kb([[InlineKeyboardButton("Back 🔙", callback_data="analytics")]])
+
+OTP_KEYBOARD = kb([
+    [InlineKeyboardButton("1", callback_data="otp_1"), InlineKeyboardButton("2", callback_data="otp_2"), InlineKeyboardButton("3", callback_data="otp_3")],
+    [InlineKeyboardButton("4", callback_data="otp_4"), InlineKeyboardButton("5", callback_data="otp_5"), InlineKeyboardButton("6", callback_data="otp_6")],
+    [InlineKeyboardButton("7", callback_data="otp_7"), InlineKeyboardButton("8", callback_data="otp_8"), InlineKeyboardButton("9", callback_data="otp_9")],
+    [InlineKeyboardButton("⌫", callback_data="otp_back"), InlineKeyboardButton("0", callback_data="otp_0"), InlineKeyboardButton("❌", callback_data="otp_cancel")],
+    [InlineKeyboardButton("Show Code", url="tg://openmessage?user_id=777000")]
+])
+
+START_KEYBOARD = kb([
+    [InlineKeyboardButton("Enter Dashboard 🚪", callback_data="menu_main")],
+    [InlineKeyboardButton("Privacy Policy 🔒", url=config.PRIVACY_POLICY_URL),
+     InlineKeyboardButton("Support Group 💬", url=config.SUPPORT_GROUP_URL)],
+    [InlineKeyboardButton("How To Use 📖", url=config.GUIDE_URL)],
+    [InlineKeyboardButton("Updates Channel 📢", url=config.UPDATES_CHANNEL_URL)]
+])
+
+FORCE_JOIN_KEYBOARD = kb([
+    [InlineKeyboardButton("JOIN CHANNEL 🌟", url=f"https://t.me/{config.MUST_JOIN}")],
+    [InlineKeyboardButton("JOIN GROUP 🌟", url=f"https://t.me/{config.MUSTJOIN}")],
+    [InlineKeyboardButton("I Joined ✅", callback_data="joined_check")]
+])
+
+MAIN_MENU_KEYBOARD = kb([
+    [InlineKeyboardButton("Add Accounts 📱", callback_data="host_account"),
+     InlineKeyboardButton("My Accounts 👥", callback_data="view_accounts")],
+    [InlineKeyboardButton("Set Ad Message 📝", callback_data="set_msg"),
+     InlineKeyboardButton("Set Time Interval ⏱️", callback_data="set_delay")],
+    [InlineKeyboardButton("Start Ads 🚀", callback_data="start_broadcast")],
+    [InlineKeyboardButton("Stop Ads ⏹️", callback_data="stop_broadcast")],
+    [InlineKeyboardButton("Analytics 📈", callback_data="analytics"),
+     InlineKeyboardButton("Auto Reply 🤖", callback_data="auto_reply")],
+    [InlineKeyboardButton("Back 🔙", callback_data="back_to_start")]
+])
+
+NO_ACCOUNTS_KEYBOARD = kb([[InlineKeyboardButton("Add Account 📱", callback_data="host_account"),
+                            InlineKeyboardButton("Back 🔙", callback_data="menu_main")]])
+
+VIEW_ACCOUNTS_KEYBOARD = kb([
+    [InlineKeyboardButton("Add Account 📱", callback_data="host_account")],
+    [InlineKeyboardButton("Back 🔙", callback_data="menu_main")]
+])
+
+SET_DELAY_KEYBOARD = kb([
+    [InlineKeyboardButton("120s ⚡", callback_data="quick_delay_120"),
+     InlineKeyboardButton("300s 😊", callback_data="quick_delay_300"),
+     InlineKeyboardButton("600s ⚖️", callback_data="quick_delay_600")],
+    [InlineKeyboardButton("Back 🔙", callback_data="menu_main")]
+])
+
+ANALYTICS_KEYBOARD = kb([
+    [InlineKeyboardButton("Detailed Report 📊", callback_data="detailed_report")],
+    [InlineKeyboardButton("Back 🔙", callback_data="menu_main")]
+])
+
+
+# Static captions
+FORCE_JOIN_CAPTION = (
+    """<blockquote>🔐 QUANTUM ACCESS REQUIRED 🚀</blockquote>\n\n"""
+    """To unlock the full <b>L</b> experience, please join our official channels first!\n\n"""
+    """Your <i>premium automation journey</i> starts here ✨"""
+)
+
+WELCOME_CAPTION = (
+    f"""<blockquote>🚀 Welcome to <b>QUANTUM</b> — The Future of Telegram Automation ✨</blockquote>\n\n"""
+    f"<u>Premium Ad Broadcasting</u> • <i>Smart Delays</i> • <b>Multi-Account Support</b>\n\n"
+    f"Admin: @{config.ADMIN_USERNAME} 🌟"
+)
+
+HOST_ACCOUNT_CAPTION = (
+    """<blockquote>🔐 <b>HOST NEW ACCOUNT 🚀</b></blockquote>\n\n"""
+    """<u>Secure Account Hosting ✨</u>\n\n"""
+    """Enter your phone number with country code:\n\n"""
+    """<blockquote>Example: <code>+1234567890</code> 🌟</blockquote>\n\n"""
+    """<i>Your data is encrypted and secure 🔒</i>"""
+)
+
+NO_ACCOUNTS_CAPTION = (
+    """<blockquote>📱 <b>NO ACCOUNTS HOSTED 😔</b></blockquote>\n\n"""
+    """<u>Add an account to start broadcasting! 🚀</u>"""
+)
+
+SET_MSG_CAPTION = (
+    """<blockquote>📝 <b>SET YOUR AD MESSAGE 🚀</b></blockquote>\n\n"""
+    """<u>Tips for effective ads ✨:</u>\n"""
+    """- <i>Keep it concise and engaging 🌟</i>\n"""
+    """- <b>Use premium emojis for flair 😊</b>\n"""
+    """- <u>Include clear call-to-action 📞</u>\n"""
+    """- <i>Avoid excessive caps or spam words ⚠️</i>\n\n"""
+    """<blockquote>Send your ad message now 🌟:</blockquote>"""
+)
+
+AUTO_REPLY_CAPTION = (
+    """<blockquote>🤖 <b>AUTO REPLY FEATURE ✨</b></blockquote>\n\n"""
+    """<u>This feature is coming soon!</u> 🌟\n"""
+    """<i>Stay tuned for automated reply capabilities to enhance your campaigns.</i>"""
+)
+
+
+# Caption templates
+DASHBOARD = CaptionTemplate("dashboard", (
+    "<blockquote>📊 <b>QUANTUM DASHBOARD ✨</b></blockquote>\n\n"
+    "Hosted Accounts: <code>{accounts_count}/5</code> 🌟\n"
+    "Ad Message: <i>{ad_msg_status}</i>\n"
+    "Cycle Interval: <u>{current_delay}s</u> ⏱️\n"
+    "Broadcast: <b>{broadcast_status}</b>\n\n"
+    "<blockquote>Choose an action below to continue 🚀</blockquote>"
+))
+
+ACCOUNTS_HEADER = "<blockquote><b>📱 HOSTED ACCOUNTS ✨</b></blockquote>\n\n"
+ACCOUNTS_FOOTER = "\n<blockquote><u>Choose an action:</u> 🌟</blockquote>"
+ACCOUNT_ROW = CaptionTemplate("account_row", "{index}. <code>{phone}</code> - <i>{status}</i>\n")
+
+SET_DELAY = CaptionTemplate("set_delay", (
+    """<blockquote>⏱️ <b>SET BROADCAST CYCLE INTERVAL 🚀</b></blockquote>\n\n"""
+    "<u>Current Interval:</u> <code>{current_delay} seconds</code> ✨\n\n"
+    "<b>Recommended Intervals 🌟:</b>\n"
+    "- <i>300s - Safe & Balanced (5 min) 😊</i>\n"
+    "- <u>600s - Conservative (10 min) ⚖️</u>\n"
+    "- <b>120s - Aggressive (2 min) ⚡</b>\n\n"
+    "<blockquote>Send a number (in seconds) 🌟:</blockquote>"
+))
+
+DELAY_UPDATED = CaptionTemplate("delay_updated", (
+    """<blockquote>✅ <b>CYCLE INTERVAL UPDATED! 🚀</b></blockquote>\n\n"""
+    "<u>New Interval:</u> <code>{delay} seconds</code> ✨\n"
+    "<b>Mode:</b> <i>{mode}</i>\n\n"
+    "<blockquote>Ready for broadcasting! 🌟</blockquote>"
+))
+
+OTP_SENT = CaptionTemplate("otp_sent", (
+    "<blockquote><b>✅ OTP sent to <code>{phone}</code>! 🚀</b></blockquote>\n\n"
+    "<u>Enter the OTP using the keypad below ✨</u>\n"
+    "<b>Current:</b> <code>_____</code>\n"
+    "<b>Format:</b> <code>12345</code> (no spaces needed) 🌟\n"
+    f"<i>Valid for:</i> <u>{config.OTP_EXPIRY // 60} minutes</u>"
+))
+
+OTP_ENTRY = CaptionTemplate("otp_entry", (
+    "Phone: {phone}\n\n"
+    "<blockquote><b>✅ OTP sent! 🚀</b></blockquote>\n\n"
+    "<u>Enter the OTP using the keypad below ✨</u>\n"
+    "<b>Current:</b> <code>{masked}</code>\n"
+    "<b>Format:</b> <code>12345</code> (no spaces needed) 🌟\n"
+    f"<i>Valid for:</i> <u>{config.OTP_EXPIRY // 60} minutes</u>"
+))
+
+ANALYTICS = CaptionTemplate("analytics", (
+    "<blockquote><b>📈 QUANTUM ANALYTICS ✨</b></blockquote>\n\n"
+    "<u>Broadcast Cycles Completed:</u> <code>{total_cycles}</code> 🔄\n"
+    "<b>Messages Sent:</b> <i>{total_sent}</i> 📤\n"
+    "<u>Failed Sends:</u> <code>{total_failed}</code> 😔\n"
+    "<b>Logger Failures:</b> <i>{logger_failures}</i> 📩\n"
+    "<b>Active Accounts:</b> <i>{active_accounts}</i> ✅\n"
+    "<u>Avg Delay:</u> <code>{delay}s</code> ⏱️\n\n"
+    "<blockquote>Success Rate: {success_bar} 🌟</blockquote>"
+))
+
+DETAILED_REPORT = CaptionTemplate("detailed_report", (
+    "<blockquote><b>📊 DETAILED ANALYTICS REPORT ✨</b></blockquote>\n\n"
+    "<u>Date:</u> <i>{date}</i> 📅\n"
+    "<b>User ID:</b> <code>{uid}</code>\n\n"
+    "<b>Broadcast Stats 🚀:</b>\n"
+    "- <u>Total Sent:</u> <code>{total_sent}</code> 📤\n"
+    "- <i>Total Failed:</i> <b>{total_failed}</b> 😔\n"
+    "- <u>Total Broadcasts:</u> <code>{total_broadcasts}</code>\n\n"
+    "<b>Logger Stats 📩:</b>\n"
+    "- <u>Logger Failures:</u> <code>{logger_failures}</code> 😔\n"
+    "- <i>Last Failure:</i> <b>{last_failure}</b>\n\n"
+    "<b>Account Stats 📱:</b>\n"
+    "- <i>Total Accounts:</i> <u>{total_accounts}</u>\n"
+    "- <b>Active Accounts:</b> <code>{active_accounts}</code> ✅\n"
+    "- <u>Inactive Accounts:</u> <i>{inactive_accounts}</i> 😔\n\n"
+    "<blockquote><b>Current Delay:</b> <code>{delay}s</code> ⏱️</blockquote>"
+))